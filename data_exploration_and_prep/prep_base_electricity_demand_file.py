@@ -4,7 +4,7 @@ import pandas as pd
 import plotly.express as px
 import numpy as np
 
-from constants import BASE_YEAR_HOURLY_INDEX
+from constants import BASE_YEAR_HOURLY_INDEX, BASE_YEAR_HALF_HOURLY_INDEX
 
 # Read in profiles and reformat ready to wrangle into a year of data
 # https://www.elexon.co.uk/operations-settlement/profiling/
@@ -30,39 +30,52 @@ df_hourly_day = df_half_hourly_day.resample('1H').sum() / 2
 pd.testing.assert_series_equal(left=df_hourly_day.mean(),
                                right=df_half_hourly_day.mean())  # average power should be the same
 
-# go back to only time in the index as will need it without the date to merge into the year
-df_hourly_day.index = df_hourly_day.index.time
-df_hourly_day.index.name = 'time'
-
-# Split out season and day of the week to make it easier to match on them
-df_hourly_day.columns = df_hourly_day.columns.str.split(' ', expand=True)
-df_hourly_day.columns.set_names(['season_group', 'day_of_week_group'], inplace=True)
-series_hourly_day = df_hourly_day.stack([0, 1])
-series_hourly_day.name = 'consumption_kWh'
-df_hourly_day_transformed = series_hourly_day.reset_index()
-# Reorder cols to make understanding df easier
-df_hourly_day_transformed = df_hourly_day_transformed[['season_group', 'day_of_week_group', 'time',
-                                                       'consumption_kWh']]
-
-# Set up whole year df
-df_hourly_year = pd.DataFrame(index=BASE_YEAR_HOURLY_INDEX, columns=['season_group'], data=0)
-df_hourly_year['day_of_week_group'] = df_hourly_year.index.dayofweek.map(DAY_OF_WEEK_MAPPER)
-for season, start_date in SEASON_FIRST_DAY_MAPPER.items():
-    df_hourly_year.loc[df_hourly_year.index >= start_date, 'season_group'] = season
-df_hourly_year['season_group'] = df_hourly_year['season_group'].map(SEASON_MAPPER)
-df_hourly_year['time'] = df_hourly_year.index.time
-df_hourly_year['datetime'] = df_hourly_year.index
-
-df_merged = pd.merge(left=df_hourly_year, right=df_hourly_day_transformed, how='left',
-                     on=['season_group', 'day_of_week_group', 'time'])
-df_merged.set_index('datetime', inplace=True)
-
-# normalize so demand profile sums to 1
-hourly_kwh_series = df_merged['consumption_kWh']
-hourly_kwh_series_normalized = hourly_kwh_series / hourly_kwh_series.sum()
+
+def normalized_profile_for_year(df_day_kwh: pd.DataFrame, year_index: pd.DatetimeIndex) -> pd.Series:
+    """ Lays the day profiles for each season and day of the week out over the year, at the resolution of both"""
+    df_day_kwh = df_day_kwh.copy()
+    # go back to only time in the index as will need it without the date to merge into the year
+    df_day_kwh.index = df_day_kwh.index.time
+    df_day_kwh.index.name = 'time'
+
+    # Split out season and day of the week to make it easier to match on them
+    df_day_kwh.columns = df_day_kwh.columns.str.split(' ', expand=True)
+    df_day_kwh.columns.set_names(['season_group', 'day_of_week_group'], inplace=True)
+    series_day = df_day_kwh.stack([0, 1])
+    series_day.name = 'consumption_kWh'
+    df_day_transformed = series_day.reset_index()
+    # Reorder cols to make understanding df easier
+    df_day_transformed = df_day_transformed[['season_group', 'day_of_week_group', 'time', 'consumption_kWh']]
+
+    # Set up whole year df
+    df_year = pd.DataFrame(index=year_index, columns=['season_group'], data=0)
+    df_year['day_of_week_group'] = df_year.index.dayofweek.map(DAY_OF_WEEK_MAPPER)
+    for season, start_date in SEASON_FIRST_DAY_MAPPER.items():
+        df_year.loc[df_year.index >= start_date, 'season_group'] = season
+    df_year['season_group'] = df_year['season_group'].map(SEASON_MAPPER)
+    df_year['time'] = df_year.index.time
+    df_year['datetime'] = df_year.index
+
+    df_merged = pd.merge(left=df_year, right=df_day_transformed, how='left',
+                         on=['season_group', 'day_of_week_group', 'time'])
+    df_merged.set_index('datetime', inplace=True)
+
+    # normalize so demand profile sums to 1
+    kwh_series = df_merged['consumption_kWh']
+    kwh_series_normalized = kwh_series / kwh_series.sum()
+    np.testing.assert_almost_equal(kwh_series_normalized.sum(), 1.0)
+    return kwh_series_normalized
+
+
+hourly_kwh_series_normalized = normalized_profile_for_year(df_hourly_day, BASE_YEAR_HOURLY_INDEX)
 assert (hourly_kwh_series_normalized.sum() == 1.0)
 
 fig = px.line(hourly_kwh_series_normalized)
 fig.show()
 
 pd.to_pickle(hourly_kwh_series_normalized, "../data/normalized_hourly_base_electricity_demand_profile_2013.pkl")
+
+# And at the resolution of the source data, for the half-hourly mode of the model
+half_hourly_kwh_series_normalized = normalized_profile_for_year(df_half_hourly_day / 2, BASE_YEAR_HALF_HOURLY_INDEX)
+pd.to_pickle(half_hourly_kwh_series_normalized,
+             "../data/normalized_half_hourly_base_electricity_demand_profile_2013.pkl")
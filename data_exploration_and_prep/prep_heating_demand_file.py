@@ -7,6 +7,11 @@ COLS_TO_KEEP = ['Normalised_ASHP_heat', 'Normalised_Resistance_heater_heat', 'No
 df_half_hourly = pd.read_csv(filepath_or_buffer=HEATING_PROFILES_CSV, index_col='index', usecols=['index'] + COLS_TO_KEEP)
 
 df_half_hourly.index = pd.to_datetime(df_half_hourly.index)
+assert len(df_half_hourly) == 17520
+# Keep the half-hourly profiles too, for the half-hourly mode of the model
+df_half_hourly_normalized = df_half_hourly/df_half_hourly.sum()
+pd.to_pickle(df_half_hourly_normalized, "../data/half_hourly_heating_demand_profiles_2013.pkl")
+
 df_hourly = df_half_hourly.resample('1H').sum()
 np.testing.assert_almost_equal(df_hourly.sum().sum(), df_half_hourly.sum().sum())
 assert len(df_hourly) == 8760
@@ -0,0 +1,300 @@
+""" Evaluate many household scenarios at once.
+
+Each scenario is a row and each hour a column, so net demand, the import/export split, bills, carbon and solar
+self-use for N scenarios are worked out as (N x hours) array operations instead of N separate House objects.
+The sums follow building_model.House and retrofit.Retrofit, so results match them to floating point tolerance.
+"""
+from dataclasses import dataclass
+from typing import List, Sequence
+
+import numpy as np
+
+import constants
+from battery import BatterySpecs
+from building_model import HeatingSystem, House
+from consumption import steps_per_hour_of
+from fuels import Fuel
+from tariffs import HourlyPrices
+
+CHUNK_SIZE = 16  # scenarios per block of hourly arrays. Small blocks (~1MB each) stay in CPU cache so run fastest
+# Batteries step through the year one hour at a time, so need far bigger blocks (~35MB each) for each step to be worth
+# a numpy call
+BATTERY_CHUNK_SIZE = 512
+
+
+@dataclass
+class ProfileSet:
+    """ Hourly profiles for N scenarios, stored as a few distinct shapes that are each scaled per scenario"""
+    shapes: np.ndarray  # (number of distinct shapes, hours)
+    shape_index: np.ndarray  # (N,) which shape each scenario uses
+    scale: np.ndarray  # (N,) what each scenario's shape is multiplied by
+
+    @classmethod
+    def from_profiles(cls, profiles: Sequence[np.ndarray]) -> 'ProfileSet':
+        """ One unscaled profile per scenario. Profiles that are the same array are only stored once"""
+        positions = {}
+        shape_index = np.empty(len(profiles), dtype=np.intp)
+        for row, profile in enumerate(profiles):
+            shape_index[row] = positions.setdefault(id(profile), len(positions))
+        shapes = {position: profiles[row] for row, position in enumerate(shape_index)}
+        return cls(shapes=np.stack([shapes[position] for position in range(len(positions))]),
+                   shape_index=shape_index,
+                   scale=np.ones(len(profiles)))
+
+    def hourly_kwh(self, rows: slice, out: np.ndarray, scale: np.ndarray | None = None) -> np.ndarray:
+        """ Fills out, which must have one row per scenario in rows, and returns it"""
+        np.take(self.shapes, self.shape_index[rows], axis=0, out=out)
+        out *= (self.scale[rows] if scale is None else scale[rows])[:, np.newaxis]
+        return out
+
+    @property
+    def annual_sums(self) -> np.ndarray:
+        return self.scale * self.shapes.sum(axis=1)[self.shape_index]
+
+
+@dataclass
+class Scenarios:
+    """ Inputs for N household scenarios, one entry per scenario in each array.
+
+    Heating is in kWh of the heating fuel, i.e. after the efficiency has been applied. Generation is positive.
+    Tariffs are in pence like building_model.Tariff, and the heating ones are ignored when heating is electric.
+    When elec_hourly_prices is set, every scenario pays those hourly rates instead of the flat unit rates.
+    When batteries is set, each scenario's net electricity demand is run through its battery, if it has one.
+    """
+    base_demand: ProfileSet
+    heating_consumption: ProfileSet
+    heating_fuel_names: np.ndarray
+    generation: ProfileSet
+    elec_p_per_day: np.ndarray
+    elec_p_per_unit_import: np.ndarray
+    elec_p_per_unit_export: np.ndarray
+    heating_p_per_day: np.ndarray
+    heating_p_per_unit_import: np.ndarray
+    upfront_cost: np.ndarray | None = None
+    upfront_cost_after_grants: np.ndarray | None = None
+    elec_hourly_prices: HourlyPrices | None = None
+    batteries: BatterySpecs | None = None
+
+    def __len__(self):
+        return len(self.heating_fuel_names)
+
+    @classmethod
+    def from_houses(cls, houses: List['House']) -> 'Scenarios':
+        """ Mostly for checking against House. Hourly arrays shared between houses are only stored once"""
+        heating_fuel_names = np.array([house.heating_system.fuel.name for house in houses])
+        heating_tariffs = [house.tariffs.get(house.heating_system.fuel.name) for house in houses]
+        hourly_prices = {id(house.tariffs['electricity'].hourly_prices): house.tariffs['electricity'].hourly_prices
+                         for house in houses}
+        if len(hourly_prices) > 1:
+            raise ValueError("All houses in a batch must be on the same hourly electricity prices, or none")
+        batteries = [house.battery for house in houses]
+        return cls(
+            base_demand=ProfileSet.from_profiles([house.base_consumption.overall.hourly_profile_kwh_array
+                                                  for house in houses]),
+            heating_consumption=ProfileSet.from_profiles([house.heating_consumption.overall.hourly_profile_kwh_array
+                                                          for house in houses]),
+            heating_fuel_names=heating_fuel_names,
+            generation=ProfileSet.from_profiles([house.solar_install.generation.exported.hourly_profile_kwh_array
+                                                 for house in houses]),
+            elec_p_per_day=np.array([house.tariffs['electricity'].p_per_day for house in houses]),
+            elec_p_per_unit_import=np.array([house.tariffs['electricity'].p_per_unit_import for house in houses]),
+            elec_p_per_unit_export=np.array([house.tariffs['electricity'].p_per_unit_export for house in houses]),
+            heating_p_per_day=np.array([tariff.p_per_day if tariff else 0.0 for tariff in heating_tariffs]),
+            heating_p_per_unit_import=np.array([tariff.p_per_unit_import if tariff else 0.0
+                                                for tariff in heating_tariffs]),
+            upfront_cost=np.array([house.upfront_cost for house in houses], dtype=float),
+            upfront_cost_after_grants=np.array([house.upfront_cost_after_grants for house in houses], dtype=float),
+            elec_hourly_prices=next(iter(hourly_prices.values()), None),
+            batteries=BatterySpecs.from_batteries(batteries) if any(batteries) else None)
+
+    @classmethod
+    def from_options(cls, building_types: Sequence[str], heating_system_names: Sequence[str],
+                     generation_kwh_per_kwp: np.ndarray, site_index: np.ndarray, capacity_kwp: np.ndarray,
+                     tariff: constants.TariffConstants = constants.STANDARD_TARIFF,
+                     heating_efficiencies: np.ndarray | None = None,
+                     elec_hourly_prices: HourlyPrices | None = None,
+                     batteries: BatterySpecs | None = None) -> 'Scenarios':
+        """ Set up from the default building and heating constants, e.g. for a grid of options.
+
+        generation_kwh_per_kwp holds one hourly profile for each site, for a 1 kWp install, and site_index says
+        which site each scenario is at.
+        """
+        building_types = np.asarray(building_types)
+        heating_system_names = np.asarray(heating_system_names)
+        number_of_scenarios = len(building_types)
+
+        heating_names = list(constants.DEFAULT_HEATING_CONSTANTS.keys())
+        heating_index = np.array([heating_names.index(name) for name in heating_system_names], dtype=np.intp)
+        heating_constants = [constants.DEFAULT_HEATING_CONSTANTS[name] for name in heating_names]
+        if heating_efficiencies is None:
+            heating_efficiencies = np.array([heating_constants[i].efficiency for i in heating_index])
+        annual_heat_demand = np.array([constants.BUILDING_TYPE_OPTIONS[name].annual_heat_demand_kWh
+                                       for name in building_types])
+        annual_base_demand = np.array([constants.BUILDING_TYPE_OPTIONS[name].annual_base_electricity_demand_kWh
+                                       for name in building_types], dtype=float)
+        heating_fuel_names = np.array([heating_constants[i].fuel.name for i in heating_index])
+
+        heating_p_per_unit_by_fuel = {'gas': tariff.p_per_kwh_gas, 'oil': tariff.p_per_L_oil, 'electricity': 0.0}
+        heating_p_per_day_by_fuel = {'gas': tariff.p_per_day_gas, 'oil': 0.0, 'electricity': 0.0}
+
+        return cls(
+            base_demand=ProfileSet(shapes=constants.NORMALIZED_HOURLY_BASE_DEMAND.to_numpy()[np.newaxis, :],
+                                   shape_index=np.zeros(number_of_scenarios, dtype=np.intp),
+                                   scale=annual_base_demand),
+            heating_consumption=ProfileSet(
+                shapes=np.stack([HeatingSystem.from_constants(name=name, parameters=parameters
+                                                              ).normalized_consumption_profile
+                                 for name, parameters in zip(heating_names, heating_constants)]),
+                shape_index=heating_index,
+                scale=annual_heat_demand / heating_efficiencies),
+            heating_fuel_names=heating_fuel_names,
+            generation=ProfileSet(shapes=np.atleast_2d(generation_kwh_per_kwp),
+                                  shape_index=np.asarray(site_index, dtype=np.intp),
+                                  scale=np.asarray(capacity_kwp, dtype=float)),
+            elec_p_per_day=np.full(number_of_scenarios, tariff.p_per_day_elec),
+            elec_p_per_unit_import=np.full(number_of_scenarios, tariff.p_per_kwh_elec_import),
+            elec_p_per_unit_export=np.full(number_of_scenarios, tariff.p_per_kwh_elec_export),
+            heating_p_per_day=np.array([heating_p_per_day_by_fuel[fuel] for fuel in heating_fuel_names]),
+            heating_p_per_unit_import=np.array([heating_p_per_unit_by_fuel[fuel] for fuel in heating_fuel_names]),
+            elec_hourly_prices=elec_hourly_prices,
+            batteries=batteries)
+
+
+@dataclass
+class BatchResults:
+    """ Annual results for each scenario, named to match the House properties they correspond to"""
+    electricity_imported_kwh: np.ndarray
+    electricity_exported_kwh: np.ndarray
+    heating_fuel_kwh: np.ndarray  # zero where heating is electric, as then it is part of electricity imports
+    annual_bill_electricity: np.ndarray
+    annual_bill_heating_fuel: np.ndarray
+    total_annual_bill: np.ndarray
+    total_annual_tco2: np.ndarray
+    percent_self_use_of_solar: np.ndarray
+    upfront_cost: np.ndarray | None = None
+    upfront_cost_after_grants: np.ndarray | None = None
+
+
+def evaluate(scenarios: Scenarios, chunk_size: int | None = None) -> BatchResults:
+    """ chunk_size defaults to CHUNK_SIZE, or BATTERY_CHUNK_SIZE if there are batteries"""
+    if chunk_size is None:
+        chunk_size = CHUNK_SIZE if scenarios.batteries is None else BATTERY_CHUNK_SIZE
+    number_of_scenarios = len(scenarios)
+    steps_in_year = scenarios.base_demand.shapes.shape[1]  # hours, or half hours
+    steps_per_hour = steps_per_hour_of(steps_in_year)
+    days_in_year = steps_in_year / (24 * steps_per_hour)
+    fuels = {fuel.name: fuel for fuel in constants.FUELS}
+    electric_heating = scenarios.heating_fuel_names == constants.ELECTRICITY.name
+
+    # Only the electricity balance needs hourly arrays; other heating fuels are never exported
+    electric_heating_scale = np.where(electric_heating, scenarios.heating_consumption.scale, 0.0)
+    imported_kwh = np.empty(number_of_scenarios)
+    exported_kwh = np.empty(number_of_scenarios)
+    prices = scenarios.elec_hourly_prices
+    if prices is not None:
+        prices = prices.at_resolution(steps_per_hour)
+    import_cost_p = np.empty(number_of_scenarios)
+    export_income_p = np.empty(number_of_scenarios)
+    hourly_carbon = constants.ELECTRICITY.hourly_tco2_per_kwh is not None
+    electricity_tco2 = np.empty(number_of_scenarios)
+    net_buffer = np.empty((min(chunk_size, number_of_scenarios), steps_in_year))
+    term_buffer = np.empty_like(net_buffer)
+    for start in range(0, number_of_scenarios, chunk_size):
+        rows = slice(start, min(start + chunk_size, number_of_scenarios))
+        net_kwh = scenarios.base_demand.hourly_kwh(rows, out=net_buffer[:rows.stop - start])
+        term_kwh = term_buffer[:rows.stop - start]
+        net_kwh -= scenarios.generation.hourly_kwh(rows, out=term_kwh)
+        if electric_heating[rows].any():
+            net_kwh += scenarios.heating_consumption.hourly_kwh(rows, out=term_kwh, scale=electric_heating_scale)
+        if scenarios.batteries is not None:
+            scenarios.batteries.dispatch(net_kwh, rows=rows, steps_per_hour=steps_per_hour, out=net_kwh)
+        net_sum_kwh = net_kwh.sum(axis=1)
+        if hourly_carbon:  # imports less exports, hour by hour
+            electricity_tco2[rows] = constants.ELECTRICITY.calculate_annual_tco2_from_profile(net_kwh, steps_per_hour)
+        if prices is not None:
+            net_export_value_p = prices.export_income_p(net_kwh)
+        imported_kwh[rows] = np.maximum(net_kwh, 0.0, out=net_kwh).sum(axis=1)
+        exported_kwh[rows] = imported_kwh[rows] - net_sum_kwh  # exports are what imports leave out of the net total
+        if prices is not None:  # one matrix product per chunk against the shared rates
+            import_cost_p[rows] = prices.import_cost_p(net_kwh)
+            # exports are imports less net demand hour by hour, so are priced the same way
+            export_income_p[rows] = prices.export_income_p(net_kwh) - net_export_value_p
+
+    base_kwh = scenarios.base_demand.annual_sums
+    heating_kwh = scenarios.heating_consumption.annual_sums
+    generation_kwh = scenarios.generation.annual_sums
+
+    if prices is None:
+        import_cost_p = imported_kwh * scenarios.elec_p_per_unit_import
+        export_income_p = exported_kwh * scenarios.elec_p_per_unit_export
+    annual_import_cost = (days_in_year * scenarios.elec_p_per_day + import_cost_p) / 100
+    income_exports = export_income_p / 100
+    annual_bill_electricity = annual_import_cost - income_exports
+
+    heating_fuel_kwh = np.where(electric_heating, 0.0, heating_kwh)
+    heating_fuel_units = heating_fuel_kwh.copy()
+    heating_fuel_tco2 = np.zeros(number_of_scenarios)
+    for fuel_name in np.unique(scenarios.heating_fuel_names[~electric_heating]):
+        fuel: Fuel = fuels[fuel_name]
+        uses_fuel = scenarios.heating_fuel_names == fuel_name
+        heating_fuel_units[uses_fuel] = fuel.convert_kwh_to_fuel_units(heating_fuel_kwh[uses_fuel])
+        heating_fuel_tco2[uses_fuel] = fuel.calculate_annual_tco2(heating_fuel_kwh[uses_fuel])
+    annual_bill_heating_fuel = np.where(
+        electric_heating, 0.0,
+        (days_in_year * scenarios.heating_p_per_day + heating_fuel_units * scenarios.heating_p_per_unit_import) / 100)
+
+    if not hourly_carbon:
+        electricity_tco2 = constants.ELECTRICITY.calculate_annual_tco2(imported_kwh - exported_kwh)
+
+    electricity_pre_solar_kwh = base_kwh + np.where(electric_heating, heating_kwh, 0.0)
+    has_solar = generation_kwh > 0
+    percent_self_use_of_solar = np.divide(electricity_pre_solar_kwh - imported_kwh, generation_kwh,
+                                          out=np.zeros(number_of_scenarios), where=has_solar)
+
+    return BatchResults(electricity_imported_kwh=imported_kwh,
+                        electricity_exported_kwh=exported_kwh,
+                        heating_fuel_kwh=heating_fuel_kwh,
+                        annual_bill_electricity=annual_bill_electricity,
+                        annual_bill_heating_fuel=annual_bill_heating_fuel,
+                        total_annual_bill=annual_bill_electricity + annual_bill_heating_fuel,
+                        total_annual_tco2=electricity_tco2 + heating_fuel_tco2,
+                        percent_self_use_of_solar=percent_self_use_of_solar,
+                        upfront_cost=scenarios.upfront_cost,
+                        upfront_cost_after_grants=scenarios.upfront_cost_after_grants)
+
+
+class BatchRetrofit:
+    """ retrofit.Retrofit for arrays of scenarios: row i of upgrade is compared with row i of baseline"""
+
+    def __init__(self, baseline: BatchResults, upgrade: BatchResults):
+        self.baseline = baseline
+        self.upgrade = upgrade
+
+    @property
+    def bill_savings_absolute(self) -> np.ndarray:
+        return self.baseline.total_annual_bill - self.upgrade.total_annual_bill
+
+    @property
+    def bill_savings_pct(self) -> np.ndarray:
+        return self.bill_savings_absolute / self.baseline.total_annual_bill
+
+    @property
+    def carbon_savings_absolute(self) -> np.ndarray:
+        return self.baseline.total_annual_tco2 - self.upgrade.total_annual_tco2
+
+    @property
+    def carbon_savings_pct(self) -> np.ndarray:
+        return self.carbon_savings_absolute / self.baseline.total_annual_tco2
+
+    @property
+    def incremental_cost(self) -> np.ndarray:
+        if self.upgrade.upfront_cost_after_grants is None or self.baseline.upfront_cost is None:
+            raise ValueError("Upfront costs are needed to calculate incremental cost")
+        return self.upgrade.upfront_cost_after_grants - self.baseline.upfront_cost
+
+    @property
+    def simple_payback(self) -> np.ndarray:
+        savings = self.bill_savings_absolute
+        payback = np.divide(self.incremental_cost, savings, out=np.full(len(savings), np.nan), where=savings > 0)
+        payback[payback < 0] = 0  # case where incremental cost is negative
+        return payback
@@ -0,0 +1,125 @@
+""" Home batteries: charged from surplus solar, discharged to cover demand, step by step through the year.
+
+dispatch() works on a (houses x steps) array of net demand and steps through the year once for all the houses
+together, so a fleet of houses costs about the same number of numpy calls as a single house. Charging and discharging
+each lose the square root of the round trip efficiency, and the battery is never run below its reserve. Each year
+starts with the battery at its reserve.
+"""
+from dataclasses import dataclass
+from typing import Sequence
+
+import numpy as np
+
+import constants
+from constants import BatteryConstants
+from consumption import Consumption, ConsumptionStream
+from reactive import Tracked
+
+HOUSES_PER_DISPATCH = 1024  # houses stepped through together. ~70MB of hourly float64 a year for each of in and out
+
+
+@dataclass
+class Battery(Tracked):
+    capacity_kwh: float
+    max_power_kw: float | None = None  # BatteryConstants.MAX_POWER_KW_PER_KWH of the capacity if not given
+    round_trip_efficiency: float = BatteryConstants.ROUND_TRIP_EFFICIENCY
+    reserve_fraction: float = BatteryConstants.RESERVE_FRACTION
+    lifetime = BatteryConstants.LIFETIME
+
+    @property
+    def power_kw(self) -> float:
+        if self.max_power_kw is None:
+            return self.capacity_kwh * BatteryConstants.MAX_POWER_KW_PER_KWH
+        return self.max_power_kw
+
+    @property
+    def upfront_cost(self) -> int:
+        if self.capacity_kwh <= 0:
+            return 0
+        return int(round(BatteryConstants.INSTALL_COST + self.capacity_kwh * BatteryConstants.COST_PER_KWH, -2))
+
+    def apply_to(self, consumption: Consumption) -> Consumption:
+        """ Electricity consumption as seen by the grid once the battery has soaked up surplus and covered demand"""
+        overall = consumption.overall
+        grid_kwh = dispatch(overall.hourly_profile_kwh_array, capacity_kwh=self.capacity_kwh,
+                            max_power_kw=self.power_kw, round_trip_efficiency=self.round_trip_efficiency,
+                            reserve_fraction=self.reserve_fraction, steps_per_hour=overall.steps_per_hour)
+        return Consumption.from_stream(ConsumptionStream.from_array(profile_kwh=grid_kwh, index=overall.index,
+                                                                    fuel=overall.fuel))
+
+
+@dataclass
+class BatterySpecs:
+    """ A battery for each of N houses, one entry per house in each array. Zero capacity means no battery"""
+    capacity_kwh: np.ndarray
+    max_power_kw: np.ndarray
+    round_trip_efficiency: np.ndarray
+    reserve_fraction: np.ndarray
+
+    def __len__(self):
+        return len(self.capacity_kwh)
+
+    @classmethod
+    def from_batteries(cls, batteries: Sequence[Battery | None]) -> 'BatterySpecs':
+        batteries = [battery if battery is not None else Battery(capacity_kwh=0.0) for battery in batteries]
+        return cls(capacity_kwh=np.array([battery.capacity_kwh for battery in batteries], dtype=float),
+                   max_power_kw=np.array([battery.power_kw for battery in batteries], dtype=float),
+                   round_trip_efficiency=np.array([battery.round_trip_efficiency for battery in batteries]),
+                   reserve_fraction=np.array([battery.reserve_fraction for battery in batteries]))
+
+    def dispatch(self, net_kwh: np.ndarray, rows: slice = slice(None), steps_per_hour: int = constants.HOURLY,
+                 out: np.ndarray | None = None) -> np.ndarray:
+        """ dispatch() for the houses in rows, whose net demand is net_kwh"""
+        return dispatch(net_kwh, capacity_kwh=self.capacity_kwh[rows], max_power_kw=self.max_power_kw[rows],
+                        round_trip_efficiency=self.round_trip_efficiency[rows],
+                        reserve_fraction=self.reserve_fraction[rows], steps_per_hour=steps_per_hour, out=out)
+
+
+def dispatch(net_kwh: np.ndarray, capacity_kwh: float | np.ndarray, max_power_kw: float | np.ndarray,
+             round_trip_efficiency: float | np.ndarray = BatteryConstants.ROUND_TRIP_EFFICIENCY,
+             reserve_fraction: float | np.ndarray = BatteryConstants.RESERVE_FRACTION,
+             steps_per_hour: int = constants.HOURLY, out: np.ndarray | None = None) -> np.ndarray:
+    """ Energy from (positive) or to (negative) the grid each step once the battery has run, the same shape as
+    net_kwh, which is demand less generation for one house (steps,) or many (houses, steps). Battery parameters are
+    one value for every house or one per house. out can be net_kwh itself, to overwrite it"""
+    net_kwh = np.asarray(net_kwh, dtype=np.float64)
+    net_by_house = np.atleast_2d(net_kwh)
+    number_of_houses = len(net_by_house)
+    if out is None:
+        out = np.empty_like(net_kwh)
+    grid_by_house = np.atleast_2d(out)
+    for start in range(0, number_of_houses, HOUSES_PER_DISPATCH):
+        rows = slice(start, min(start + HOUSES_PER_DISPATCH, number_of_houses))
+
+        def per_house(value):
+            return np.broadcast_to(np.asarray(value, dtype=np.float64), (number_of_houses,))[rows].copy()
+
+        _dispatch_houses(net_by_house[rows], capacity_kwh=per_house(capacity_kwh),
+                         max_step_kwh=per_house(max_power_kw) / steps_per_hour,
+                         one_way_efficiency=np.sqrt(per_house(round_trip_efficiency)),
+                         reserve_kwh=per_house(capacity_kwh) * per_house(reserve_fraction), out=grid_by_house[rows])
+    return out
+
+
+def _dispatch_houses(net_kwh: np.ndarray, capacity_kwh: np.ndarray, max_step_kwh: np.ndarray,
+                     one_way_efficiency: np.ndarray, reserve_kwh: np.ndarray, out: np.ndarray):
+    """ Steps through time for all the houses at once.
+
+    Each step either charges or discharges, whichever the sign of the net demand says, so in terms of the energy
+    stored the step is: add what the surplus (less losses) would put in, or take away what the demand (plus losses)
+    would take out, limited by the inverter in both cases, then clip between the reserve and the capacity. That clip
+    is the only work done per step, on one contiguous time major row. Flows to and from the grid follow from the
+    changes in stored energy afterwards, and are written to out."""
+    change_kwh = np.clip(-net_kwh.T, -max_step_kwh, max_step_kwh)  # time major copy, limited by the inverter
+    # stored energy gained per kWh in, or lost per kWh out. A step's change in storage has the sign of its request
+    efficiency = np.where(change_kwh > 0, one_way_efficiency, 1 / one_way_efficiency)
+    change_kwh *= efficiency
+    stored_kwh = np.empty((len(change_kwh) + 1, len(reserve_kwh)))
+    stored_kwh[0] = reserve_kwh
+    for before, change, after in zip(stored_kwh[:-1], change_kwh, stored_kwh[1:]):
+        np.add(before, change, out=after)
+        np.minimum(after, capacity_kwh, out=after)  # two passes are quicker than np.clip's one
+        np.maximum(after, reserve_kwh, out=after)
+    np.subtract(stored_kwh[1:], stored_kwh[:-1], out=change_kwh)
+    change_kwh /= efficiency
+    np.add(net_kwh, change_kwh.T, out=out)
@@ -0,0 +1,150 @@
+""" Bounded replacement for functools.cache, for long-running servers.
+
+Entries are dropped least recently used first once the cached values take more than max_bytes, and are recomputed
+once they are older than ttl_seconds, so memory stays flat however many sites are looked up over days of uptime.
+Arguments must be immutable (numbers, strings, tuples or frozen dataclasses) so a key can't change after it is stored.
+"""
+import dataclasses
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from functools import update_wrapper
+from numbers import Number
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple
+
+import numpy as np
+
+
+class CacheInfo(NamedTuple):
+    """ Same first fields as functools' cache_info, plus evictions and memory use"""
+    hits: int
+    misses: int
+    maxsize: int | None
+    currsize: int
+    evictions: int
+    expirations: int
+    size_bytes: int
+    max_bytes: int
+
+
+@dataclasses.dataclass
+class _Entry:
+    value: Any
+    size_bytes: int
+    created: float
+    hits: int = 0
+
+
+def size_of(value: Any) -> int:
+    """ Bytes held by a cached value. Arrays count their data, tuples their items"""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, tuple):
+        return sys.getsizeof(value) + sum(size_of(item) for item in value)
+    return sys.getsizeof(value)
+
+
+def is_immutable(value: Any) -> bool:
+    if value is None or isinstance(value, (Number, str, bytes)):
+        return True
+    if isinstance(value, tuple):
+        return all(is_immutable(item) for item in value)
+    return dataclasses.is_dataclass(value) and value.__dataclass_params__.frozen
+
+
+class BoundedCache:
+
+    def __init__(self, func: Callable, max_bytes: int, ttl_seconds: float | None = None, maxsize: int | None = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.func = func
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.maxsize = maxsize
+        self.clock = clock
+        self._entries: OrderedDict[Tuple, _Entry] = OrderedDict()  # least recently used first
+        self._size_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        update_wrapper(self, func)
+        _registry.add(self)
+
+    def __call__(self, *args, **kwargs):
+        key = args + tuple(sorted(kwargs.items()))
+        if not is_immutable(key):
+            raise TypeError(f"{self.__name__} can only cache immutable arguments, got {key}")
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._has_expired(entry):
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                entry.hits += 1
+                self.hits += 1
+                return entry.value
+            self.misses += 1
+        # Computed outside the lock, so a slow API call doesn't hold up lookups for other sites
+        value = self.func(*args, **kwargs)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(value=value, size_bytes=size_of(value), created=self.clock())
+            self._size_bytes += self._entries[key].size_bytes
+            self._evict_least_recently_used()
+        return value
+
+    def _has_expired(self, entry: _Entry) -> bool:
+        return self.ttl_seconds is not None and self.clock() - entry.created > self.ttl_seconds
+
+    def _remove(self, key: Tuple):
+        self._size_bytes -= self._entries.pop(key).size_bytes
+
+    def _evict_least_recently_used(self):
+        # Always keeps the newest entry, even if it alone is over budget
+        while len(self._entries) > 1 and (self._size_bytes > self.max_bytes
+                                          or (self.maxsize is not None and len(self._entries) > self.maxsize)):
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def cache_info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(hits=self.hits, misses=self.misses, maxsize=self.maxsize, currsize=len(self._entries),
+                             evictions=self.evictions, expirations=self.expirations, size_bytes=self._size_bytes,
+                             max_bytes=self.max_bytes)
+
+    def cache_clear(self):
+        """ Empties the cache and resets the counts, like functools' cache_clear"""
+        with self._lock:
+            self._entries.clear()
+            self._size_bytes = 0
+            self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def dump(self) -> List[Dict[str, Any]]:
+        """ One row per entry, least recently used first"""
+        now = self.clock()
+        with self._lock:
+            return [{'key': key, 'size_bytes': entry.size_bytes, 'age_seconds': now - entry.created, 'hits': entry.hits}
+                    for key, entry in self._entries.items()]
+
+
+_registry: 'weakref.WeakSet[BoundedCache]' = weakref.WeakSet()
+
+
+def bounded_cache(max_bytes: int, ttl_seconds: float | None = None, maxsize: int | None = None
+                  ) -> Callable[[Callable], BoundedCache]:
+    """ Decorator, e.g. @bounded_cache(max_bytes=64 * 1024 ** 2, ttl_seconds=24 * 3600)"""
+    def decorator(func: Callable) -> BoundedCache:
+        return BoundedCache(func, max_bytes=max_bytes, ttl_seconds=ttl_seconds, maxsize=maxsize)
+    return decorator
+
+
+def dump_caches() -> Dict[str, Dict[str, Any]]:
+    """ For admins: what every bounded cache in this process holds, and how well it is doing"""
+    return {f"{cache.__module__}.{cache.__qualname__}": {'info': cache.cache_info()._asdict(), 'entries': cache.dump()}
+            for cache in _registry}
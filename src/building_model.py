@@ -1,19 +1,35 @@
+import copy
 from dataclasses import dataclass
-from functools import cached_property
 from typing import Dict
 
+import numpy as np
 import pandas as pd
 
 import constants
-from consumption import Consumption
+import heat_pump
+import instrumentation
+from battery import Battery
+from consumption import Consumption, steps_per_hour_of
+from reactive import Tracked, derived, clear_derived_values
 from solar import Solar
 from fuels import Fuel
+from tariffs import HourlyPrices
+
+# The inputs each derived House value can depend on. Derived values are recomputed only when one of these changes
+ENERGY_INPUTS = ('envelope', 'heating_system', 'solar_install', 'battery')
+BILL_INPUTS = ENERGY_INPUTS + ('tariffs',)
 
 
 class House:
-    """ Stores info on consumption and bills """
+    """ Stores info on consumption and bills.
+
+    Derived values declare which of the inputs they depend on and are cached until one of those inputs is edited,
+    so there is no need to clear anything by hand after changing the envelope, heating system, solar, battery or
+    tariffs.
+    """
 
-    def __init__(self, envelope: 'BuildingEnvelope', heating_system: 'HeatingSystem', solar_install: 'Solar' = None):
+    def __init__(self, envelope: 'BuildingEnvelope', heating_system: 'HeatingSystem', solar_install: 'Solar' = None,
+                 battery: 'Battery' = None):
 
         self.envelope = envelope
         # Set up initial values for heating system and tariffs but allow to be modified by the user later
@@ -23,6 +39,7 @@ class House:
         if solar_install is None:
             solar_install = Solar.create_zero_area_instance()
         self.solar_install = solar_install
+        self.battery = battery  # None for no battery
 
         self.lifetime = (heating_system.lifetime + solar_install.lifetime) / 2  # very rough approach
 
@@ -30,20 +47,57 @@ class House:
 
     @classmethod
     def set_up_from_heating_name(cls, envelope: 'BuildingEnvelope', heating_name: str) -> 'House':
+        """ Heating demand is at the same resolution as the envelope's base demand"""
         heating_system = HeatingSystem.from_constants(name=heating_name,
-                                                      parameters=constants.DEFAULT_HEATING_CONSTANTS[heating_name])
+                                                      parameters=constants.DEFAULT_HEATING_CONSTANTS[heating_name],
+                                                      steps_per_hour=steps_per_hour_of(len(envelope.base_demand)))
         return cls(envelope=envelope, heating_system=heating_system)
 
-    @property
+    def variant(self, heating_system: 'HeatingSystem' = None, solar_install: 'Solar' = None,
+                battery: 'Battery' = None) -> 'House':
+        """ This house with a different heating system, solar install and/or battery.
+
+        The envelope, tariffs and any values already calculated from unchanged inputs (e.g. base consumption) are
+        shared with this house rather than copied, so variants are cheap to make.
+        """
+        house = copy.copy(self)
+        # Own dict so the variant's recalculated values don't overwrite this house's, but the values are shared
+        house._derived_values = dict(self.__dict__.get('_derived_values', {}))
+        if heating_system is not None:
+            house.heating_system = heating_system
+            house.clear_cost_overwrite()  # cost overwrites were for the old heating system
+        if solar_install is not None:
+            house.solar_install = solar_install
+        if battery is not None:
+            house.battery = battery
+        house.lifetime = (house.heating_system.lifetime + house.solar_install.lifetime) / 2
+        return house
+
+    def results_per_solar_year(self) -> pd.DataFrame:
+        """ Bill, carbon and self use as if the solar install generated as it did in each year of its ensemble.
+        One row per year, so the spread across years can be reported. Empty unless ensemble_years is set"""
+        results = {}
+        for year in self.solar_install.solar_years:
+            house = self.variant(solar_install=self.solar_install.for_ensemble_year(year))
+            results[year] = {'total_annual_bill': house.total_annual_bill,
+                             'total_annual_tco2': house.total_annual_tco2,
+                             'percent_self_use_of_solar': house.percent_self_use_of_solar}
+        results_df = pd.DataFrame.from_dict(results, orient='index',
+                                            columns=['total_annual_bill', 'total_annual_tco2',
+                                                     'percent_self_use_of_solar'])
+        results_df.index.name = 'solar_year'
+        return results_df
+
+    @derived('envelope')
     def base_consumption(self) -> Consumption:
         # Base demand is always electricity (lighting/plug loads etc.)
         return Consumption(hourly_profile_kwh=self.envelope.base_demand, fuel=constants.ELECTRICITY)
 
-    @property
+    @derived('envelope', 'solar_install')
     def electricity_consumption_excluding_heating(self) -> Consumption:
         return self.base_consumption.add(self.solar_install.generation)
 
-    @cached_property
+    @derived('envelope', 'heating_system')
     def heating_consumption(self) -> Consumption:
         return self.heating_system.calculate_consumption(self.envelope.annual_heating_demand)
 
@@ -55,20 +109,28 @@ class House:
             has_multiple_fuels = True
         return has_multiple_fuels
 
-    @property
-    def consumption_per_fuel(self) -> Dict[str, 'Consumption']:
-
+    @derived('envelope', 'heating_system', 'solar_install')
+    def electricity_consumption_excluding_battery(self) -> Consumption:
+        """ Net electricity demand that any battery is run against"""
         match self.heating_system.fuel:
-            case self.base_consumption.fuel:  # only one fuel (electricity)
-                consumption_dict = {'electricity': self.electricity_consumption_excluding_heating.add(
-                    self.heating_consumption)}
+            case self.base_consumption.fuel:
+                return self.electricity_consumption_excluding_heating.add(self.heating_consumption)
             case _:
-                consumption_dict = {'electricity': self.electricity_consumption_excluding_heating,
-                                    self.heating_consumption.fuel.name: self.heating_consumption}
+                return self.electricity_consumption_excluding_heating
+
+    @derived(*ENERGY_INPUTS)
+    def consumption_per_fuel(self) -> Dict[str, 'Consumption']:
+
+        electricity_consumption = self.electricity_consumption_excluding_battery
+        if self.battery is not None:
+            electricity_consumption = self.battery.apply_to(electricity_consumption)
+        consumption_dict = {'electricity': electricity_consumption}
+        if self.heating_system.fuel != self.base_consumption.fuel:  # a second fuel for heating
+            consumption_dict[self.heating_consumption.fuel.name] = self.heating_consumption
 
         return consumption_dict
 
-    @cached_property
+    @derived(*ENERGY_INPUTS)
     def annual_consumption_per_fuel_kwh(self) -> Dict[str, float]:
         return {fuel: consumption.overall.annual_sum_kwh
                 for fuel, consumption in self.consumption_per_fuel.items()}
@@ -77,7 +139,7 @@ class House:
     def total_annual_consumption_kwh(self) -> float:
         return sum(self.annual_consumption_per_fuel_kwh.values())
 
-    @cached_property
+    @derived(*ENERGY_INPUTS)
     def percent_self_use_of_solar(self) -> float:
         if self.solar_install.capacity_kwp > 0:
             elec_consumption_pre_solar = self.base_consumption.overall.annual_sum_kwh
@@ -89,7 +151,7 @@ class House:
             self_use = 0
         return self_use
 
-    @property
+    @derived(*BILL_INPUTS)
     def annual_bill_import_and_export_per_fuel(self) -> Dict[str, Dict[str, float]]:
         bills_imported_and_exported = {}
         for fuel_name, consumption in self.consumption_per_fuel.items():
@@ -98,7 +160,7 @@ class House:
             bills_imported_and_exported[fuel_name] = inner_dict
         return bills_imported_and_exported
 
-    @property
+    @derived(*BILL_INPUTS)
     def annual_bill_per_fuel(self) -> Dict[str, float]:
         bills_dict = {}
         for fuel_name, consumption in self.consumption_per_fuel.items():
@@ -106,22 +168,22 @@ class House:
                                      - self.annual_bill_import_and_export_per_fuel[fuel_name]['exported'])
         return bills_dict
 
-    @cached_property
+    @derived(*BILL_INPUTS)
     def total_annual_bill(self) -> float:
         return sum(self.annual_bill_per_fuel.values())
 
-    @property
+    @derived(*ENERGY_INPUTS)
     def annual_tco2_per_fuel(self) -> Dict[str, float]:
         carbon_dict = {}
         for fuel_name, consumption in self.consumption_per_fuel.items():
             carbon_dict[fuel_name] = consumption.overall.annual_sum_tco2
         return carbon_dict
 
-    @cached_property
+    @derived(*ENERGY_INPUTS)
     def total_annual_tco2(self) -> float:
         return sum(self.annual_tco2_per_fuel.values())
 
-    @cached_property
+    @derived(*BILL_INPUTS)
     def energy_and_bills_df(self) -> pd.DataFrame:
 
         """ To make it easy to plot the results using plotly"""
@@ -146,11 +208,8 @@ class House:
         return df
 
     def clear_cached_properties(self):
-        cls = self.__class__
-        attrs = [a for a in dir(self) if isinstance(getattr(cls, a, cls), cached_property)]
-        for a in attrs:
-            if a in self.__dict__.keys():
-                del self.__dict__[a]
+        """ Not needed after edits to the inputs, which are picked up automatically. Forces a full recalculation"""
+        clear_derived_values(self)
 
     @property
     def heating_system_upfront_cost(self) -> int:
@@ -173,6 +232,8 @@ class House:
     @property
     def upfront_cost(self) -> int:
         cost = self.heating_system_upfront_cost + self.solar_install.upfront_cost
+        if self.battery is not None:
+            cost += self.battery.upfront_cost
         rounded_cost = round(cost, -2)
         return rounded_cost
 
@@ -182,28 +243,39 @@ class House:
 
 
 @dataclass
-class Tariff:
+class Tariff(Tracked):
     fuel: constants.Fuel
     p_per_day: float
     p_per_unit_import: float  # unit defined by the fuel
     p_per_unit_export: float = 0.0
+    hourly_prices: HourlyPrices | None = None  # replaces the flat unit rates when set, e.g. for Economy 7
 
+    @instrumentation.timed('tariff.costing')
     def calculate_annual_import_cost(self, consumption: 'Consumption') -> float:
         """ Calculate the annual cost of the import consumption of a certain fuel with this tariff"""
         if self.fuel.name != consumption.fuel.name:
             raise ValueError("To calculate annual costs the tariff fuel must match the consumption fuel, they are"
                              f"{self.fuel} and {consumption.fuel}")
         cost_p_per_day = consumption.overall.days_in_year * self.p_per_day
-        cost_p_imports = consumption.imported.annual_sum_fuel_units * self.p_per_unit_import
+        if self.hourly_prices is None:
+            cost_p_imports = consumption.imported.annual_sum_fuel_units * self.p_per_unit_import
+        else:
+            prices = self.hourly_prices.at_resolution(consumption.imported.steps_per_hour)
+            cost_p_imports = prices.import_cost_p(consumption.imported.hourly_profile_fuel_units_array)
         annual_import_cost = (cost_p_per_day + cost_p_imports) / 100
         return annual_import_cost
 
+    @instrumentation.timed('tariff.costing')
     def calculate_annual_export_cost(self, consumption: 'Consumption') -> float:
         """ Calculate the annual cost of the export of a certain fuel with this tariff"""
         if self.fuel.name != consumption.fuel.name:
             raise ValueError("To calculate annual costs the tariff fuel must match the consumption fuel, they are"
                              f"{self.fuel} and {consumption.fuel}")
-        income_exports = consumption.exported.annual_sum_fuel_units * self.p_per_unit_export / 100
+        if self.hourly_prices is None:
+            income_exports = consumption.exported.annual_sum_fuel_units * self.p_per_unit_export / 100
+        else:
+            prices = self.hourly_prices.at_resolution(consumption.exported.steps_per_hour)
+            income_exports = prices.export_income_p(consumption.exported.hourly_profile_fuel_units_array) / 100
         return income_exports
 
     def calculate_annual_net_cost(self, consumption: 'Consumption') -> float:
@@ -239,12 +311,15 @@ class Tariff:
 
 
 @dataclass
-class HeatingSystem:
+class HeatingSystem(Tracked):
     name: str
     efficiency: float
     fuel: constants.Fuel
-    hourly_normalized_demand_profile: pd.Series
+    hourly_normalized_demand_profile: pd.Series  # or half-hourly
+    cop_model: str | None = None  # heat pumps only. efficiency is then the seasonal COP at the default flow temp
+    flow_temperature_c: float = heat_pump.DEFAULT_FLOW_TEMPERATURE_C
     lifetime = constants.HEATING_SYSTEM_LIFETIME
+    untracked_attributes = ('grant',)  # doesn't change energy use or bills
 
     def __post_init__(self):
         self.grant = constants.HEATING_SYSTEM_GRANTS[self.name]
@@ -252,17 +327,48 @@ class HeatingSystem:
             raise ValueError(f"fuel must be one of {constants.FUELS}")
 
     @classmethod
-    def from_constants(cls, name, parameters: constants.HeatingConstants):
+    def from_constants(cls, name, parameters: constants.HeatingConstants, steps_per_hour: int = constants.HOURLY):
+        if steps_per_hour == constants.HALF_HOURLY:
+            profile = parameters.normalized_half_hourly_heat_demand_profile
+        else:
+            profile = parameters.normalized_hourly_heat_demand_profile
         return cls(name=name,
                    efficiency=parameters.efficiency,
                    fuel=parameters.fuel,
-                   hourly_normalized_demand_profile=parameters.normalized_hourly_heat_demand_profile)
+                   hourly_normalized_demand_profile=profile,
+                   cop_model=parameters.cop_model)
+
+    @derived('cop_model', 'flow_temperature_c', 'hourly_normalized_demand_profile')
+    def relative_cop(self) -> np.ndarray | None:
+        """ Hourly COP as a multiple of efficiency, the seasonal COP. Calibrated so its demand weighted average is 1
+        at heat_pump.DEFAULT_FLOW_TEMPERATURE_C, so a higher flow temperature lowers it all year. None if not a heat
+        pump, or if there are no measured temperatures to work out the hourly COP from"""
+        if self.cop_model is None or not heat_pump.has_measured_temperatures():
+            return None
+        demand = self.hourly_normalized_demand_profile.to_numpy()
+        steps_per_hour = steps_per_hour_of(len(demand))
+        calibration_cop = heat_pump.hourly_cop(self.cop_model, flow_temperature_c=heat_pump.DEFAULT_FLOW_TEMPERATURE_C,
+                                               steps_per_hour=steps_per_hour)
+        cop = heat_pump.hourly_cop(self.cop_model, flow_temperature_c=self.flow_temperature_c,
+                                   steps_per_hour=steps_per_hour)
+        return cop / heat_pump.seasonal_cop(calibration_cop, heat_demand=demand)
+
+    @property
+    def normalized_consumption_profile(self) -> np.ndarray:
+        """ Fuel used each hour per kWh of annual heat demand, before dividing by efficiency. For heat pumps the
+        hourly COP is applied element-wise, so relatively more is used when it is cold outside"""
+        demand = self.hourly_normalized_demand_profile.to_numpy()
+        if self.relative_cop is None:
+            return demand
+        return demand / self.relative_cop
 
     def calculate_consumption(self, annual_space_heating_demand_kwh: float) -> Consumption:
         try:
-            profile_kwh = self.hourly_normalized_demand_profile / self.efficiency * annual_space_heating_demand_kwh
+            annual_consumption_kwh = annual_space_heating_demand_kwh / self.efficiency
         except ZeroDivisionError:  # should only happen fleetingly when heating system state hasn't caught up
-            profile_kwh = self.hourly_normalized_demand_profile * 0
+            annual_consumption_kwh = 0
+        profile_kwh = pd.Series(self.normalized_consumption_profile * annual_consumption_kwh,
+                                index=self.hourly_normalized_demand_profile.index)
         consumption = Consumption(hourly_profile_kwh=profile_kwh, fuel=self.fuel)
         return consumption
 
@@ -272,7 +378,7 @@ class HeatingSystem:
 
 
 @dataclass()
-class BuildingEnvelope:
+class BuildingEnvelope(Tracked):
     """ Stores info on the building and its energy demand"""
 
     def __init__(self, house_type: str, annual_heating_demand: float, base_electricity_demand_profile_kwh: pd.Series):
@@ -282,10 +388,15 @@ class BuildingEnvelope:
         self.units: str = 'kwh'
 
     @classmethod
-    def from_building_type_constants(cls, building_type_constants: constants.BuildingTypeConstants
-                                     ) -> "BuildingEnvelope":
+    def from_building_type_constants(cls, building_type_constants: constants.BuildingTypeConstants,
+                                     steps_per_hour: int = constants.HOURLY) -> "BuildingEnvelope":
+        """ Half-hourly if steps_per_hour is constants.HALF_HOURLY, e.g. to compare with smart meter data"""
+        if steps_per_hour == constants.HALF_HOURLY:
+            normalized_profile = building_type_constants.normalized_half_hourly_base_electricity_demand_profile_kWh
+        else:
+            normalized_profile = building_type_constants.normalized_base_electricity_demand_profile_kWh
         base_electricity_demand_profile = (building_type_constants.annual_base_electricity_demand_kWh
-                                           * building_type_constants.normalized_base_electricity_demand_profile_kWh)
+                                           * normalized_profile)
         return cls(house_type=building_type_constants.name,
                    annual_heating_demand=building_type_constants.annual_heat_demand_kWh,
                    base_electricity_demand_profile_kwh=base_electricity_demand_profile)
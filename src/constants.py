@@ -3,17 +3,28 @@ from dataclasses import dataclass
 import pandas as pd
 from pathlib import Path
 
-from fuels import Fuel
+from fuels import Fuel, load_grid_carbon_intensity_if_usable
 
 THIS_FILE = Path(__file__)
 
 # Use same year as solar year
 BASE_YEAR_HOURLY_INDEX = pd.date_range(start="2013-01-01", end="2014-01-01", freq="1H", inclusive="left")
+BASE_YEAR_HALF_HOURLY_INDEX = pd.date_range(start="2013-01-01", end="2014-01-01", freq="30min", inclusive="left")
+# Resolutions profiles can be at, as steps per hour. Hourly unless half-hourly data (e.g. smart meters) is needed
+HOURLY = 1
+HALF_HOURLY = 2
+FREQUENCIES = {HOURLY: "1H", HALF_HOURLY: "30min"}
 EMPTY_TIMESERIES = pd.Series(index=BASE_YEAR_HOURLY_INDEX, data=0)
 
 KWH_PER_LITRE_OF_OIL = 10.35  # https://www.thegreenage.co.uk/is-heating-oil-a-cheap-way-to-heat-my-home/
 ELEC_TCO2_PER_KWH = 186 / 10 ** 6
-ELECTRICITY = Fuel("electricity", tco2_per_kwh=ELEC_TCO2_PER_KWH)
+# Half-hourly intensity from https://data.nationalgrideso.com/carbon-intensity1/historic-generation-mix, for the year
+# ELEC_TCO2_PER_KWH is an average of. Not shipped, so unless it is added electricity carbon uses the average
+GRID_CARBON_INTENSITY_PATH = THIS_FILE.parent.parent / 'data/df_fuel_ckan.csv'
+GRID_CARBON_INTENSITY_YEAR = 2022
+ELECTRICITY = Fuel("electricity", tco2_per_kwh=ELEC_TCO2_PER_KWH,
+                   hourly_tco2_per_kwh=load_grid_carbon_intensity_if_usable(GRID_CARBON_INTENSITY_PATH,
+                                                                            year=GRID_CARBON_INTENSITY_YEAR))
 GAS_TCO2_PER_KWH = 202 / 10 ** 6
 GAS = Fuel(name="gas", tco2_per_kwh=GAS_TCO2_PER_KWH)
 OIL_TCO2_PER_KWH = 260 / 10 ** 6
@@ -27,11 +38,24 @@ class BuildingTypeConstants:
     name: str
     annual_base_electricity_demand_kWh: float
     normalized_base_electricity_demand_profile_kWh: pd.Series
+    normalized_half_hourly_base_electricity_demand_profile_kWh: pd.Series
     annual_heat_demand_kWh: float
 
 
+def read_half_hourly_profiles(path: Path, hourly_profiles: pd.Series | pd.DataFrame) -> pd.Series | pd.DataFrame:
+    """ Half-hourly profiles written by the prep scripts, or if those haven't been rerun since they started writing
+    them, the hourly profiles with each hour split evenly between its half hours"""
+    if path.exists():
+        return pd.read_pickle(path)
+    return hourly_profiles.reindex(BASE_YEAR_HALF_HOURLY_INDEX, method='ffill') / 2
+
+
 elec_path = Path(THIS_FILE.parent.parent / 'data/normalized_hourly_base_electricity_demand_profile_2013.pkl')
 NORMALIZED_HOURLY_BASE_DEMAND: pd.Series = pd.read_pickle(elec_path)
+half_hourly_elec_path = Path(THIS_FILE.parent.parent
+                             / 'data/normalized_half_hourly_base_electricity_demand_profile_2013.pkl')
+NORMALIZED_HALF_HOURLY_BASE_DEMAND: pd.Series = read_half_hourly_profiles(half_hourly_elec_path,
+                                                                          NORMALIZED_HOURLY_BASE_DEMAND)
 # Based on elexon profiling data https://www.elexon.co.uk/operations-settlement/profiling/
 # Data processing done in data_exploration_and_prep folder
 
@@ -41,21 +65,25 @@ BUILDING_TYPE_OPTIONS = {
         name="Terrace",
         annual_base_electricity_demand_kWh=2890,  # used value for terrace - small up to 70m2
         normalized_base_electricity_demand_profile_kWh=NORMALIZED_HOURLY_BASE_DEMAND,
+        normalized_half_hourly_base_electricity_demand_profile_kWh=NORMALIZED_HALF_HOURLY_BASE_DEMAND,
         annual_heat_demand_kWh=9900),  # order here defines dropdown order and default, so most common first
     "Semi-detached": BuildingTypeConstants(
         name="Semi-detached",
         annual_base_electricity_demand_kWh=3850,
         normalized_base_electricity_demand_profile_kWh=NORMALIZED_HOURLY_BASE_DEMAND,
+        normalized_half_hourly_base_electricity_demand_profile_kWh=NORMALIZED_HALF_HOURLY_BASE_DEMAND,
         annual_heat_demand_kWh=10600),
     "Flat": BuildingTypeConstants(
         name="Flat",
         annual_base_electricity_demand_kWh=2830,
         normalized_base_electricity_demand_profile_kWh=NORMALIZED_HOURLY_BASE_DEMAND,
+        normalized_half_hourly_base_electricity_demand_profile_kWh=NORMALIZED_HALF_HOURLY_BASE_DEMAND,
         annual_heat_demand_kWh=6600),
     "Detached": BuildingTypeConstants(
         name="Detached",
         annual_base_electricity_demand_kWh=4150,
         normalized_base_electricity_demand_profile_kWh=NORMALIZED_HOURLY_BASE_DEMAND,
+        normalized_half_hourly_base_electricity_demand_profile_kWh=NORMALIZED_HALF_HOURLY_BASE_DEMAND,
         annual_heat_demand_kWh=14000)
 }
 
@@ -71,11 +99,16 @@ class HeatingConstants:
     efficiency: float
     fuel: Fuel
     normalized_hourly_heat_demand_profile: pd.Series
+    normalized_half_hourly_heat_demand_profile: pd.Series
+    cop_model: str | None = None  # heat pumps only, name of one of heat_pump.COP_MODELS
     #  Not splitting space and water heating because hourly demand profiles are combined
 
 
 heat_path = Path(THIS_FILE.parent.parent / 'data/hourly_heating_demand_profiles_2013.pkl')
 NORMALIZED_HOURLY_HEAT_DEMAND_DF: pd.DataFrame = pd.read_pickle(heat_path)
+half_hourly_heat_path = Path(THIS_FILE.parent.parent / 'data/half_hourly_heating_demand_profiles_2013.pkl')
+NORMALIZED_HALF_HOURLY_HEAT_DEMAND_DF: pd.DataFrame = read_half_hourly_profiles(half_hourly_heat_path,
+                                                                                NORMALIZED_HOURLY_HEAT_DEMAND_DF)
 # based on data from https://ukerc.rl.ac.uk/DC/cgi-bin/edc_search.pl?WantComp=165
 # processed in data_exploration_and_prep
 
@@ -83,20 +116,28 @@ DEFAULT_HEATING_CONSTANTS = {
     "Gas boiler": HeatingConstants(
         efficiency=0.84,
         fuel=GAS,
-        normalized_hourly_heat_demand_profile=NORMALIZED_HOURLY_HEAT_DEMAND_DF['Normalised_Gas_boiler_heat']),
+        normalized_hourly_heat_demand_profile=NORMALIZED_HOURLY_HEAT_DEMAND_DF['Normalised_Gas_boiler_heat'],
+        normalized_half_hourly_heat_demand_profile=NORMALIZED_HALF_HOURLY_HEAT_DEMAND_DF[
+            'Normalised_Gas_boiler_heat']),
     "Oil boiler": HeatingConstants(
         efficiency=0.84,
         fuel=OIL,
-        normalized_hourly_heat_demand_profile=NORMALIZED_HOURLY_HEAT_DEMAND_DF['Normalised_Gas_boiler_heat']),
+        normalized_hourly_heat_demand_profile=NORMALIZED_HOURLY_HEAT_DEMAND_DF['Normalised_Gas_boiler_heat'],
+        normalized_half_hourly_heat_demand_profile=NORMALIZED_HALF_HOURLY_HEAT_DEMAND_DF[
+            'Normalised_Gas_boiler_heat']),
     "Direct electric": HeatingConstants(
         efficiency=1.0,
         fuel=ELECTRICITY,
         normalized_hourly_heat_demand_profile=NORMALIZED_HOURLY_HEAT_DEMAND_DF[
+            'Normalised_Resistance_heater_heat'],
+        normalized_half_hourly_heat_demand_profile=NORMALIZED_HALF_HOURLY_HEAT_DEMAND_DF[
             'Normalised_Resistance_heater_heat']),
     "Heat pump": HeatingConstants(
         efficiency=3.0,
         fuel=ELECTRICITY,
-        normalized_hourly_heat_demand_profile=NORMALIZED_HOURLY_HEAT_DEMAND_DF['Normalised_ASHP_heat']),
+        normalized_hourly_heat_demand_profile=NORMALIZED_HOURLY_HEAT_DEMAND_DF['Normalised_ASHP_heat'],
+        normalized_half_hourly_heat_demand_profile=NORMALIZED_HALF_HOURLY_HEAT_DEMAND_DF['Normalised_ASHP_heat'],
+        cop_model='Air source'),
 }
 
 RPI_ratio_oct_21_to_oct_22 = 356.2/312.0
@@ -182,12 +223,26 @@ class SolarConstants:
     COST_PER_KWP_MORE_THAN_4_KW = 1616
     LIFETIME = 25
 
-    PERCENT_SQUARE_USABLE = 0.8  # complete guess - only used when shape drawn isn't rectangular
+    PERCENT_SQUARE_USABLE = 0.8  # complete guess - only a rough check now that other shapes are packed
 
     API_YEAR = 2013
     # Was 202 Based on quick comparison of years for one location in the uk.
     # If you don't pass years to the API it gives you all hours from first to last year they have data for.
     SYSTEM_LOSS = 14  # percentage loss in the system - the PVGIS documentation suggests 14 %
+    ENSEMBLE_YEARS = (2005, 2020)  # years of PVGIS-SARAH2 data, fetched together when a spread is wanted
+    PVGIS_TILE_DEGREES = 0.01  # ~1km. PVGIS profiles are fetched at the nodes of a grid this size and shared
+    PVGIS_TILE_TOLERANCE_DEGREES = 0.0025  # sites this close to a node use its profile, others blend the nearest 4
+
+
+class BatteryConstants:
+    # Typical lithium iron phosphate home battery, e.g. 5kWh with a 2.5kW inverter
+    ROUND_TRIP_EFFICIENCY = 0.9
+    RESERVE_FRACTION = 0.1  # kept back to protect the cells and for power cuts
+    MAX_POWER_KW_PER_KWH = 0.5  # charge and discharge rate, unless the battery says otherwise
+    COST_PER_KWH = 500
+    INSTALL_COST = 1500  # inverter and fitting, on top of the cost of the capacity
+    LIFETIME = 10
+    SIZING_SWEEP_KWH = tuple(range(0, 21))  # capacities compared when sizing a battery
 
 
 CLASS_NAME_OF_SIDEBAR_DIV = "\"css-1f8pn94 edgvbvh3\""
@@ -1,89 +1,233 @@
-import copy
-from dataclasses import dataclass
+from typing import Dict, Tuple
 
+import numpy as np
 import pandas as pd
 
 import constants
+import instrumentation
 from fuels import Fuel
 
+# One validated index per calendar year and resolution, shared by every stream for that year
+_INDEXES: Dict[Tuple[int, int], pd.DatetimeIndex] = {
+    (constants.BASE_YEAR_HOURLY_INDEX.year[0], constants.HOURLY): constants.BASE_YEAR_HOURLY_INDEX,
+    (constants.BASE_YEAR_HALF_HOURLY_INDEX.year[0], constants.HALF_HOURLY): constants.BASE_YEAR_HALF_HOURLY_INDEX}
+_STEPS_PER_HOUR_BY_LENGTH = {hours * steps_per_hour: steps_per_hour
+                             for steps_per_hour in constants.FREQUENCIES for hours in (8760, 8760 + 24)}
+
+
+def steps_per_hour_of(number_of_steps: int) -> int:
+    """ Resolution of a whole year profile, from how many values it has"""
+    if number_of_steps not in _STEPS_PER_HOUR_BY_LENGTH:
+        raise ValueError(f"{number_of_steps} values isn't a whole year at any of the resolutions "
+                         f"{list(constants.FREQUENCIES.values())}")
+    return _STEPS_PER_HOUR_BY_LENGTH[number_of_steps]
+
+
+def validate_index(index: pd.Index):
+    """ Check index is hourly or half-hourly datetime values for one whole year"""
+    assert isinstance(index, pd.DatetimeIndex), "hourly_profile_kwh index must be datetime"
+    assert len(set(index.year)) == 1  # only one year
+    assert index.month[0] == 1
+    assert index.month[-1] == 12
+    assert index.day[0] == 1
+    assert index.day[-1] == 31
+    assert index.hour[0] == 0 and index.minute[0] == 0  # start at 0.00
+    assert len(index) in _STEPS_PER_HOUR_BY_LENGTH
+    steps_per_hour = steps_per_hour_of(len(index))
+    assert index.hour[-1] == 23 and index.minute[-1] == 60 - 60 // steps_per_hour  # end at 23.00 or 23.30
+
+
+def get_index(year: int, steps_per_hour: int = constants.HOURLY) -> pd.DatetimeIndex:
+    """ Shared index for a whole calendar year. Built and validated the first time it is asked for"""
+    if (year, steps_per_hour) not in _INDEXES:
+        index = pd.date_range(start=f"{year}-01-01", end=f"{year + 1}-01-01",
+                              freq=constants.FREQUENCIES[steps_per_hour], inclusive="left")
+        validate_index(index)
+        _INDEXES[year, steps_per_hour] = index
+    return _INDEXES[year, steps_per_hour]
+
+
+def get_hourly_index(year: int) -> pd.DatetimeIndex:
+    return get_index(year, steps_per_hour=constants.HOURLY)
+
+
+def shared_index_for(index: pd.Index) -> pd.DatetimeIndex:
+    """ Swap an index for the shared index of its year, validating it only if it isn't already the shared one"""
+    if isinstance(index, pd.DatetimeIndex) and len(index) in _STEPS_PER_HOUR_BY_LENGTH:
+        shared = get_index(index[0].year, steps_per_hour=steps_per_hour_of(len(index)))
+        if index is shared or index.equals(shared):
+            return shared
+    validate_index(index)
+    return index
+
+
+def resample_kwh(kwh: np.ndarray, steps_per_hour: int, to_steps_per_hour: int) -> np.ndarray:
+    """ Energy per step at another resolution, along the last axis. Going finer splits each step evenly"""
+    if to_steps_per_hour == steps_per_hour:
+        return kwh
+    if to_steps_per_hour < steps_per_hour:
+        ratio = steps_per_hour // to_steps_per_hour
+        return kwh.reshape(*kwh.shape[:-1], -1, ratio).sum(axis=-1)
+    ratio = to_steps_per_hour // steps_per_hour
+    return np.repeat(kwh / ratio, ratio, axis=-1)
+
+
+def resample_rates(rates: np.ndarray, steps_per_hour: int, to_steps_per_hour: int) -> np.ndarray:
+    """ Prices, or anything else per kWh, at another resolution. Coarser steps take the mean, which costs
+    consumption the same as splitting it evenly over the finer steps would"""
+    if to_steps_per_hour == steps_per_hour:
+        return rates
+    if to_steps_per_hour < steps_per_hour:
+        ratio = steps_per_hour // to_steps_per_hour
+        return rates.reshape(*rates.shape[:-1], -1, ratio).mean(axis=-1)
+    return np.repeat(rates, to_steps_per_hour // steps_per_hour, axis=-1)
+
 
-@dataclass
 class ConsumptionStream:
+    """ Hourly (or half-hourly) profile of one fuel over one whole year.
+
+    Values are stored as a float64 numpy array that points at a shared, pre-validated index, so adding and
+    splitting streams doesn't rebuild or re-check a pandas index. The pandas view is only built when asked for.
+    Streams at different resolutions can be added, giving a stream at the finer one. A stream at another
+    resolution is made once and reused until the values change.
+    """
 
-    hourly_profile_kwh: pd.Series  # series index must be hourly datetime values for one whole year
-    fuel: Fuel = constants.ELECTRICITY
-
-    def __post_init__(self):
-        """ Check index is of correct form"""
-        # TODO: ask Archy how to do this better
-        assert isinstance(self.hourly_profile_kwh.index, pd.DatetimeIndex), "hourly_profile_kwh index must be datetime"
-        assert len(set(self.hourly_profile_kwh.index.year)) == 1  # only one year
-        assert self.hourly_profile_kwh.index.month[0] == 1
-        assert self.hourly_profile_kwh.index.month[-1] == 12
-        assert self.hourly_profile_kwh.index.day[0] == 1
-        assert self.hourly_profile_kwh.index.day[-1] == 31
-        assert self.hourly_profile_kwh.index.hour[0] == 0  # start at 0.00
-        assert self.hourly_profile_kwh.index.hour[-1] == 23  # end at 23.00
-        assert len(self.hourly_profile_kwh) == 8760 or len(self.hourly_profile_kwh) == 8760 + 24
-
-        self.year = self.hourly_profile_kwh.index.year[0]
-        self.hours_in_year = len(self.hourly_profile_kwh)
+    def __init__(self, hourly_profile_kwh: pd.Series, fuel: Fuel = constants.ELECTRICITY):
+        # series index must be hourly datetime values for one whole year
+        self.fuel = fuel
+        self.hourly_profile_kwh = hourly_profile_kwh
+
+    @classmethod
+    def from_array(cls, profile_kwh: np.ndarray, index: pd.DatetimeIndex, fuel: Fuel = constants.ELECTRICITY
+                   ) -> 'ConsumptionStream':
+        """ Skips validation so index must already be a validated one, e.g. from get_index"""
+        stream = cls.__new__(cls)
+        stream.fuel = fuel
+        stream._set_profile(profile_kwh=profile_kwh, index=index)
+        return stream
+
+    def _set_profile(self, profile_kwh: np.ndarray, index: pd.DatetimeIndex):
+        assert len(profile_kwh) == len(index)
+        # Read only view, so the values can only change through the setter, which bumps version. Made once here so
+        # every caller gets the same array, e.g. for batch.ProfileSet to spot shared profiles
+        self._profile_kwh = profile_kwh.view()
+        self._profile_kwh.setflags(write=False)
+        self.version = getattr(self, 'version', 0) + 1  # lets anything derived from the values know they changed
+        self.index = index
+        self.year = index[0].year
+        self.steps_per_hour = steps_per_hour_of(len(index))
+        self.hours_in_year = len(index) // self.steps_per_hour
         self.days_in_year = self.hours_in_year/24
         self.leap_year = True if self.hours_in_year == 8760 + 24 else False
+        self._resampled: Dict[int, Tuple[int, ConsumptionStream]] = {}
+
+    @property
+    def hourly_profile_kwh(self) -> pd.Series:
+        """ Read only pandas view onto the stored array. To change the values set a new profile"""
+        return pd.Series(self._profile_kwh, index=self.index, copy=False)
+
+    @hourly_profile_kwh.setter
+    def hourly_profile_kwh(self, value: pd.Series):
+        index = shared_index_for(value.index)
+        self._set_profile(profile_kwh=np.asarray(value, dtype=np.float64), index=index)
+
+    @property
+    def hourly_profile_kwh_array(self) -> np.ndarray:
+        """ The stored array, read only like hourly_profile_kwh"""
+        return self._profile_kwh
 
     @property
-    def hourly_profile_fuel_units(self):
-        export_profile_fuel_units = self.fuel.convert_kwh_to_fuel_units(self.hourly_profile_kwh)
-        return export_profile_fuel_units
+    def hourly_profile_fuel_units(self) -> pd.Series:
+        profile_fuel_units = self.fuel.convert_kwh_to_fuel_units(self._profile_kwh)
+        return pd.Series(profile_fuel_units, index=self.index)
+
+    @property
+    def hourly_profile_fuel_units_array(self) -> np.ndarray:
+        return self.fuel.convert_kwh_to_fuel_units(self._profile_kwh)
 
     @property
     def annual_sum_kwh(self) -> float:
-        annual_sum = self.hourly_profile_kwh.sum()
+        annual_sum = self._profile_kwh.sum()
         return annual_sum
 
     @property
     def annual_sum_fuel_units(self) -> float:
-        annual_sum = self.hourly_profile_fuel_units.sum()
+        annual_sum = self.hourly_profile_fuel_units_array.sum()
         return annual_sum
 
     @property
     def annual_sum_tco2(self) -> float:
-        annual_tco2 = self.fuel.calculate_annual_tco2(self.annual_sum_kwh)
+        annual_tco2 = self.fuel.calculate_annual_tco2_from_profile(self._profile_kwh, self.steps_per_hour)
         return annual_tco2
 
+    def at_resolution(self, steps_per_hour: int) -> 'ConsumptionStream':
+        """ This stream with steps_per_hour values an hour, e.g. constants.HALF_HOURLY"""
+        if steps_per_hour == self.steps_per_hour:
+            return self
+        if steps_per_hour not in self._resampled or self._resampled[steps_per_hour][0] != self.version:
+            profile_kwh = resample_kwh(self._profile_kwh, self.steps_per_hour, steps_per_hour)
+            resampled = ConsumptionStream.from_array(profile_kwh=profile_kwh,
+                                                     index=get_index(self.year, steps_per_hour), fuel=self.fuel)
+            self._resampled[steps_per_hour] = (self.version, resampled)
+        return self._resampled[steps_per_hour][1]
+
     def add(self, other: 'ConsumptionStream') -> 'ConsumptionStream':
-        if self.year == other.year:
-            combined_hourly_profile_kwh = self.hourly_profile_kwh + other.hourly_profile_kwh
-            combined = ConsumptionStream(hourly_profile_kwh=combined_hourly_profile_kwh, fuel=self.fuel)
-        else:
+        if self.year != other.year:
             raise ValueError("The year must be the same to be able to sum two profiles")
+        if self.steps_per_hour != other.steps_per_hour:
+            steps_per_hour = max(self.steps_per_hour, other.steps_per_hour)
+            return self.at_resolution(steps_per_hour).add(other.at_resolution(steps_per_hour))
+        combined_profile_kwh = self._profile_kwh + other.hourly_profile_kwh_array
+        combined = ConsumptionStream.from_array(profile_kwh=combined_profile_kwh, index=self.index, fuel=self.fuel)
         return combined
 
 
 class Consumption:
     """ In 'overall' imports are positive and exports negative. In their respective streams they are both positive"""
+
+    splits_computed = 0  # count of import/export splits across all instances, to check they aren't being repeated
+
     def __init__(self, hourly_profile_kwh: pd.Series, fuel: constants.Fuel = constants.ELECTRICITY):
         self.overall = ConsumptionStream(hourly_profile_kwh=hourly_profile_kwh, fuel=fuel)
         self.fuel = fuel
+        # the overall stream and its version it was split from, as overall can be replaced by another stream
+        self._split: Tuple[ConsumptionStream, int, ConsumptionStream, ConsumptionStream] | None = None
+
+    @classmethod
+    def from_stream(cls, overall: ConsumptionStream) -> 'Consumption':
+        consumption = cls.__new__(cls)
+        consumption.overall = overall
+        consumption.fuel = overall.fuel
+        consumption._split = None
+        return consumption
 
     @property
     def imported(self) -> ConsumptionStream:
-        imported = copy.deepcopy(self.overall)
-        # set negative values equal to zero as they are exports
-        imported.hourly_profile_kwh.loc[imported.hourly_profile_kwh < 0] = 0
-        return imported
+        return self.split_into_imported_and_exported()[0]
 
     @property
     def exported(self) -> ConsumptionStream:
-        exported = copy.deepcopy(self.overall)
-        # set positive values equal to zero as they are imports
-        exported.hourly_profile_kwh.loc[exported.hourly_profile_kwh > 0] = 0
-        # now that it is labelled as exported, make it positive to make it easier to deal with
-        exported.hourly_profile_kwh = exported.hourly_profile_kwh * -1
-        return exported
-
+        return self.split_into_imported_and_exported()[1]
+
+    def split_into_imported_and_exported(self) -> Tuple[ConsumptionStream, ConsumptionStream]:
+        """ Done in one pass and reused until the overall profile changes"""
+        if self._split is None or self._split[0] is not self.overall or self._split[1] != self.overall.version:
+            with instrumentation.span('consumption.split'):
+                overall_kwh = self.overall.hourly_profile_kwh_array
+                imported_kwh = np.empty_like(overall_kwh)
+                exported_kwh = np.empty_like(overall_kwh)
+                np.maximum(overall_kwh, 0.0, out=imported_kwh)  # negative values are exports so zero here
+                np.subtract(imported_kwh, overall_kwh, out=exported_kwh)  # leaves exports only, as positive values
+                imported = ConsumptionStream.from_array(profile_kwh=imported_kwh, index=self.overall.index,
+                                                     fuel=self.fuel)
+                exported = ConsumptionStream.from_array(profile_kwh=exported_kwh, index=self.overall.index,
+                                                     fuel=self.fuel)
+                self._split = (self.overall, self.overall.version, imported, exported)
+            Consumption.splits_computed += 1
+        _, _, imported, exported = self._split
+        return imported, exported
+
+    @instrumentation.timed('consumption.add')
     def add(self, other: 'Consumption') -> 'Consumption':
         combined_overall_consumption = self.overall.add(other.overall)
-        combined_consumption = Consumption(hourly_profile_kwh=combined_overall_consumption.hourly_profile_kwh,
-                                           fuel=self.fuel)
-        return combined_consumption
+        return Consumption.from_stream(combined_overall_consumption)
@@ -1,14 +1,34 @@
-from dataclasses import dataclass
+import warnings
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict
 
+import numpy as np
 import pandas as pd
 
+HOURS_IN_YEAR = 8760  # intensities line up with the base year, which isn't a leap year
+
 
 @dataclass
 class Fuel:
     name: str
-    tco2_per_kwh: float  # could be a time series later
+    tco2_per_kwh: float  # annual average, used for annual sums and whenever there is no hourly intensity
     units: str = "kWh"
     converter_consumption_units_to_kwh: float = 1
+    # tCO2/kWh for each hour (or half hour) of the base year. Read only so it can be shared by every consumption of
+    # this fuel, and not compared as fuels are compared often
+    hourly_tco2_per_kwh: np.ndarray | None = field(default=None, compare=False, repr=False)
+
+    def __post_init__(self):
+        self._hourly_tco2_per_kwh_by_resolution: Dict[int, np.ndarray] = {}
+        if self.hourly_tco2_per_kwh is not None:
+            intensity = np.array(self.hourly_tco2_per_kwh, dtype=np.float64)  # own copy, so it can be made read only
+            if intensity.ndim != 1 or len(intensity) not in (HOURS_IN_YEAR, 2 * HOURS_IN_YEAR):
+                raise ValueError(f"hourly_tco2_per_kwh of {self.name} must have a value for each of the {HOURS_IN_YEAR}"
+                                 f" hours or {2 * HOURS_IN_YEAR} half hours, got shape {intensity.shape}")
+            intensity.setflags(write=False)
+            self.hourly_tco2_per_kwh = intensity
+            self._hourly_tco2_per_kwh_by_resolution[len(intensity) // HOURS_IN_YEAR] = intensity
 
     def convert_kwh_to_fuel_units(self, value_kwh: [float | pd.Series | pd.DataFrame]):
         value_fuel_units = value_kwh / self.converter_consumption_units_to_kwh
@@ -21,3 +41,49 @@ class Fuel:
     def calculate_annual_tco2(self, annual_sum_kwh: float) -> float:
         annual_tco2 = self.tco2_per_kwh * annual_sum_kwh
         return annual_tco2
+
+    def hourly_tco2_per_kwh_at(self, steps_per_hour: int) -> np.ndarray:
+        """ The hourly intensity with steps_per_hour values an hour. Made once and then shared"""
+        if steps_per_hour not in self._hourly_tco2_per_kwh_by_resolution:
+            native_steps_per_hour, intensity = next(iter(self._hourly_tco2_per_kwh_by_resolution.items()))
+            if steps_per_hour > native_steps_per_hour:
+                intensity = np.repeat(intensity, steps_per_hour // native_steps_per_hour)
+            else:  # the mean, so consumption spread evenly over the finer steps has the same emissions
+                intensity = intensity.reshape(-1, native_steps_per_hour // steps_per_hour).mean(axis=1)
+            intensity.setflags(write=False)
+            self._hourly_tco2_per_kwh_by_resolution[steps_per_hour] = intensity
+        return self._hourly_tco2_per_kwh_by_resolution[steps_per_hour]
+
+    def calculate_annual_tco2_from_profile(self, profile_kwh: np.ndarray, steps_per_hour: int = 1
+                                           ) -> float | np.ndarray:
+        """ For one profile, or each row of a (N x steps) array. With an hourly intensity this is a dot product, so
+        exports (negative kWh) are credited with the emissions they displace at the time"""
+        if self.hourly_tco2_per_kwh is None:
+            return self.calculate_annual_tco2(np.sum(profile_kwh, axis=-1))
+        return np.asarray(profile_kwh) @ self.hourly_tco2_per_kwh_at(steps_per_hour)
+
+
+def load_grid_carbon_intensity(path: Path, year: int) -> np.ndarray:
+    """ tCO2/kWh for each half hour of year, from National Grid ESO's historic generation mix file, which has
+    DATETIME and CARBON_INTENSITY (gCO2/kWh) columns. 29th February is dropped so any year lines up with the base
+    year"""
+    df = pd.read_csv(path, usecols=['DATETIME', 'CARBON_INTENSITY'], parse_dates=['DATETIME'])
+    times = df['DATETIME'].dt
+    in_year = (times.year == year) & ~((times.month == 2) & (times.day == 29))
+    intensity = df.loc[in_year, 'CARBON_INTENSITY'].to_numpy(dtype=np.float64) / 10 ** 6
+    if len(intensity) not in (HOURS_IN_YEAR, 2 * HOURS_IN_YEAR) or np.isnan(intensity).any():
+        raise ValueError(f"{path} doesn't have a carbon intensity for every hour or half hour of {year}, "
+                         f"got {np.count_nonzero(~np.isnan(intensity))} values")
+    return intensity
+
+
+def load_grid_carbon_intensity_if_usable(path: Path, year: int) -> np.ndarray | None:
+    """ As load_grid_carbon_intensity, or None if there is no file, so the annual average is used instead.
+    A file that can't be used is warned about rather than raised, as it is loaded when the app starts"""
+    if not path.exists():
+        return None
+    try:
+        return load_grid_carbon_intensity(path, year=year)
+    except (ValueError, OSError) as error:  # pandas' parser errors are ValueErrors
+        warnings.warn(f"Using the annual average grid carbon intensity instead: {error}")
+        return None
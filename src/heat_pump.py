@@ -0,0 +1,73 @@
+""" Heat pump COP hour by hour, from the outdoor air temperature and the flow temperature.
+
+COP falls as the lift from the outdoor air to the flow temperature grows, so a heat pump uses relatively more
+electricity on cold winter evenings, when demand peaks and there is least solar. hourly_cop() gives the COP for every
+hour (or half hour) of a weather year. It is worked out once per weather year, flow temperature, model and resolution,
+and the same read-only array is then shared by every heating system that uses it. The least recently used curves are
+dropped once they take more than COP_CACHE_MAX_BYTES.
+
+HeatingSystem.efficiency stays the seasonal COP, which the user can overwrite. The curve is calibrated once so its
+demand weighted average matches efficiency at DEFAULT_FLOW_TEMPERATURE_C, and is then applied hour by hour, so other
+flow temperatures change how much electricity the heat pump uses as well as when. That needs measured temperatures:
+with only pv_model's synthetic climatology, heating systems use the seasonal efficiency every hour instead.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+import constants
+import pv_model
+from bounded_cache import bounded_cache
+from consumption import resample_rates
+
+DEFAULT_FLOW_TEMPERATURE_C = 45.0  # typical of a well designed UK system with radiators
+MIN_COP = 1.0  # a heat pump is never worse than direct electric heating, as it would switch to its immersion
+# Flow temperature is typed in by the user, so any number of curves could be asked for. A half-hourly curve is 140kB
+COP_CACHE_MAX_BYTES = 8 * 1024 ** 2
+
+
+@dataclass(frozen=True)
+class CopModel:
+    """ COP as a quadratic in the temperature lift, i.e. flow less source temperature"""
+    name: str
+    constant: float
+    per_c_lift: float
+    per_c_lift_squared: float
+
+    def cop(self, lift_c: np.ndarray) -> np.ndarray:
+        return self.constant + self.per_c_lift * lift_c + self.per_c_lift_squared * lift_c ** 2
+
+
+# Fitted to manufacturers' data by Staffell et al. 2012, "A review of domestic heat pumps"
+COP_MODELS = {model.name: model for model in [CopModel(name='Air source', constant=6.08, per_c_lift=-0.09,
+                                                       per_c_lift_squared=0.0005)]}
+
+
+def has_measured_temperatures() -> bool:
+    """ False when there is only the synthetic climatology, whose made up temperatures would give an hourly COP that
+    looks more precise than the seasonal one without being any more right"""
+    return not pv_model.get_default_weather().synthetic
+
+
+def outdoor_temperature_c(weather_year: int) -> np.ndarray:
+    weather = pv_model.get_default_weather()
+    if weather.index[0].year != weather_year:
+        raise ValueError(f"There is only weather for {weather.index[0].year}, not {weather_year}")
+    return weather.air_temperature_c
+
+
+@bounded_cache(max_bytes=COP_CACHE_MAX_BYTES)
+def hourly_cop(model_name: str, flow_temperature_c: float = DEFAULT_FLOW_TEMPERATURE_C,
+               steps_per_hour: int = constants.HOURLY,
+               weather_year: int = constants.BASE_YEAR_HOURLY_INDEX[0].year) -> np.ndarray:
+    """ COP for each step of the weather year. Read only, as it is shared"""
+    lift_c = flow_temperature_c - outdoor_temperature_c(weather_year)
+    cop = np.maximum(COP_MODELS[model_name].cop(lift_c), MIN_COP)
+    cop = np.array(resample_rates(cop, constants.HOURLY, steps_per_hour))
+    cop.setflags(write=False)
+    return cop
+
+
+def seasonal_cop(cop: np.ndarray, heat_demand: np.ndarray) -> float:
+    """ Heat out over electricity in across the year, i.e. the COP averaged weighting each hour by its heat demand"""
+    return heat_demand.sum() / (heat_demand / cop).sum()
@@ -6,6 +6,7 @@ from typing import Dict
 import streamlit as st
 
 import constants
+import instrumentation
 from building_model import House, BuildingEnvelope, HeatingSystem, Tariff
 from fuels import Fuel
 
@@ -35,7 +36,6 @@ def render(house: House) -> House:
     if st.session_state.heating_fuel_changed:
         house.tariffs = update_tariffs_for_new_heating_fuel(heating_fuel=house.heating_system.fuel,
                                                             tariffs=house.tariffs)
-        house.clear_cached_properties()  # so that change in tariff flows through into cached properties
 
     house = render_house_assumptions_sidebar(house=house)
 
@@ -44,7 +44,7 @@ def render(house: House) -> House:
 
 
 def set_up_default_house() -> "House":
-    print("Setting up default house")
+    instrumentation.count('house.default_set_up')
     envelope = BuildingEnvelope.from_building_type_constants(constants.BUILDING_TYPE_OPTIONS["Terrace"])
     heating_system_name = list(constants.DEFAULT_HEATING_CONSTANTS.keys())[0]
     house = House.set_up_from_heating_name(envelope=envelope, heating_name=heating_system_name)
@@ -69,11 +69,10 @@ def render_building_envelope_questions(house: House) -> House:
                                       on_change=flag_change_in_house_type)
 
             if st.session_state.house_type_changed:  # only overwrite if house type changed by user
-                print("Behaves as if house changed")
+                instrumentation.count('overwrite.house_type')
                 envelope = BuildingEnvelope.from_building_type_constants(constants.BUILDING_TYPE_OPTIONS[house_type])
                 write_house_type_variables_to_session_state(envelope=envelope)
                 house.envelope = envelope
-                house.clear_cached_properties()  # so that change in envelope flows through into cached properties
                 write_heating_consumption_to_session_state(house)  # so change of house type changes consumption
                 st.session_state.upgrade_heating_system_cost_needs_resetting = True
                 st.session_state.baseline_heating_system_cost_needs_resetting = True
@@ -117,12 +116,11 @@ def render_heating_system_questions(house: House) -> House:
                 on_change=flag_change_in_heating_system)
 
             if st.session_state.heating_system_changed:  # only overwrite heating system if changed by user
-                print("Behaves as if heating system changed")
+                instrumentation.count('overwrite.heating_system')
                 heating_system = HeatingSystem.from_constants(name=name,
                                                               parameters=constants.DEFAULT_HEATING_CONSTANTS[name])
                 write_baseline_heating_system_to_session_state(heating_system=heating_system)
                 house.heating_system = heating_system
-                house.clear_cached_properties()
                 write_heating_consumption_to_session_state(house=house)
                 st.session_state.baseline_heating_system_cost_needs_resetting = True
 
@@ -131,7 +129,7 @@ def render_heating_system_questions(house: House) -> House:
 
 def write_baseline_heating_system_to_session_state(heating_system: HeatingSystem):
     if heating_system.fuel.name != st.session_state.heating_fuel_name:
-        print(f"Behaves as if heating fuel changed")
+        instrumentation.count('overwrite.heating_fuel')
         st.session_state.heating_fuel_changed = True  # flag change so tariff changes
         st.session_state.heating_fuel_name = heating_system.fuel.name
 
@@ -188,7 +186,6 @@ def render_baseline_heating_system_overwrite_options(house: "House") -> "House":
 
     if st.session_state.baseline_heating_efficiency_changed:
         house.heating_system.efficiency = st.session_state.baseline_heating_efficiency
-        house.clear_cached_properties()
         write_heating_consumption_to_session_state(house)  # so change of heating efficiency changes consumption
         st.session_state.baseline_heating_efficiency_changed = False
 
@@ -221,10 +218,9 @@ def render_consumption_overwrite_options(house: 'House') -> House:
         on_change=overwrite_heating_consumption_in_session_state)
 
     if st.session_state.heating_demand_changed:  # scale profile  by correction factor
-        print("Behaves as if heating demand changed")
+        instrumentation.count('overwrite.heating_demand')
         mult = st.session_state.annual_heating_consumption/int(house.heating_consumption.overall.annual_sum_fuel_units)
         house.envelope.annual_heating_demand = house.envelope.annual_heating_demand * mult
-        house.clear_cached_properties()  # so change in annual heating demand flows through to cached properties
         st.session_state.annual_heating_demand = int(house.envelope.annual_heating_demand)
         st.session_state.heating_demand_changed = False
 
@@ -237,10 +233,9 @@ def render_consumption_overwrite_options(house: 'House') -> House:
         on_change=overwrite_base_demand_in_session_state
     )
     if st.session_state.base_demand_changed:  # scale profile  by correction factor
-        print("Behaves as if base demand changed")
+        instrumentation.count('overwrite.base_demand')
         multiplier = st.session_state.annual_base_demand / int(house.envelope.base_demand.sum())
         house.envelope.base_demand = house.envelope.base_demand * multiplier
-        house.clear_cached_properties()  # so change in base demand flows through to cached properties
         st.session_state.base_demand_changed = False
 
     typical_heat_demand = constants.BUILDING_TYPE_OPTIONS[house.envelope.house_type].annual_heat_demand_kWh
@@ -336,7 +331,6 @@ def render_tariff_overwrite_options(house: House) -> House:
 
     if st.session_state.tariff_changed:
         house.tariffs = tariffs
-        house.clear_cached_properties()
         st.session_state.tariff_changed = False
 
     return house
@@ -0,0 +1,165 @@
+""" Timing spans and counters around each stage of the model, to find out where a rerun's time goes.
+
+Off by default: span() then hands back one shared do-nothing context manager and count() returns straight away, so
+leaving them in hot paths costs next to nothing. Set INSTRUMENTATION_PATH (or call enable()) to turn them on. Each
+Streamlit rerun then collects its own spans and counts between start_rerun() and finish_rerun(), and the summary is
+appended to that file as a line of JSON.
+
+    with instrumentation.span('tariff.costing'):
+        ...
+    instrumentation.count('pvgis.fetch')
+
+Spans can nest, and each records its own total, e.g. solar.profile_scaling includes any pvgis.fetch inside it. Work
+on other threads, or outside a rerun, is recorded against a recorder for the whole process.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import wraps
+from pathlib import Path
+from typing import Callable, Dict
+
+PATH_ENVIRONMENT_VARIABLE = 'INSTRUMENTATION_PATH'
+
+
+@dataclass
+class SpanStats:
+    calls: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+    def add(self, seconds: float):
+        self.calls += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+
+class Recorder:
+
+    def __init__(self, label: str = ''):
+        self.label = label
+        self.started = time.time()
+        self._started_counter = time.perf_counter()
+        self.spans: Dict[str, SpanStats] = {}
+        self.counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record_span(self, name: str, seconds: float):
+        with self._lock:
+            self.spans.setdefault(name, SpanStats()).add(seconds)
+
+    def count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def summary(self) -> dict:
+        with self._lock:
+            spans = {name: {'calls': stats.calls,
+                            'total_ms': round(stats.total_seconds * 1000, 3),
+                            'max_ms': round(stats.max_seconds * 1000, 3)}
+                     for name, stats in sorted(self.spans.items(), key=lambda item: -item[1].total_seconds)}
+            return {'label': self.label,
+                    'started': self.started,
+                    'wall_ms': round((time.perf_counter() - self._started_counter) * 1000, 3),
+                    'spans': spans,
+                    'counters': dict(sorted(self.counters.items()))}
+
+
+class _Span:
+    __slots__ = ('name', 'recorder', 'start')
+
+    def __init__(self, name: str, recorder: Recorder):
+        self.name = name
+        self.recorder = recorder
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.recorder.record_span(self.name, time.perf_counter() - self.start)
+        return False
+
+
+_enabled = False
+_path: Path | None = None
+_write_lock = threading.Lock()
+_NULL_SPAN = nullcontext()
+_process_recorder = Recorder(label='process')
+_rerun_recorder: ContextVar[Recorder | None] = ContextVar('rerun_recorder', default=None)
+
+
+def enable(path: Path | str | None = None):
+    """ Start recording. Rerun summaries are appended to path, if given"""
+    global _enabled, _path
+    _path = Path(path) if path is not None else None
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def current_recorder() -> Recorder:
+    return _rerun_recorder.get() or _process_recorder
+
+
+def span(name: str):
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, current_recorder())
+
+
+def timed(name: str) -> Callable[[Callable], Callable]:
+    """ Decorator that wraps every call of the function in a span"""
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(name, current_recorder()):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name: str, n: int = 1):
+    if _enabled:
+        current_recorder().count(name, n)
+
+
+def start_rerun(label: str = '') -> Recorder | None:
+    """ Spans and counts on this thread go to a fresh recorder until finish_rerun"""
+    if not _enabled:
+        return None
+    recorder = Recorder(label=label)
+    _rerun_recorder.set(recorder)
+    return recorder
+
+
+def finish_rerun() -> dict | None:
+    """ Summary of the rerun, which is also appended to the export file if there is one"""
+    recorder = _rerun_recorder.get()
+    if recorder is None:
+        return None
+    _rerun_recorder.set(None)
+    summary = recorder.summary()
+    if _path is not None:
+        with _write_lock:
+            _path.parent.mkdir(parents=True, exist_ok=True)
+            with open(_path, 'a') as file:
+                file.write(json.dumps(summary) + '\n')
+    return summary
+
+
+if os.environ.get(PATH_ENVIRONMENT_VARIABLE):
+    enable(os.environ[PATH_ENVIRONMENT_VARIABLE])
@@ -1,6 +1,7 @@
 import streamlit as st
 
 import house_questions
+import instrumentation
 import solar_questions
 import savings_outputs
 import next_steps
@@ -56,7 +57,11 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
-wizard.render()
+instrumentation.start_rerun(label=wizard.current_page.name)
+try:
+    wizard.render()
+finally:  # moving page stops the run part way through with a rerun exception
+    instrumentation.finish_rerun()
 
 st.markdown("<p style='text-align: center; margin-top: 20px; font-size:14px'>🛠 Made by <a href='https://twitter.com/stephwillis808'>Stephanie Willis </a>"
          " and <a href='https://twitter.com/ArchydeB'> Archy de Berker </a><br/>"
@@ -0,0 +1,201 @@
+""" Packs solar panels onto roofs of any shape, e.g. L-shaped or hipped, by rasterizing them.
+
+The roof is laid flat in its own plane (stretched up the slope by the pitch) and covered with a grid of cells, sized
+so a panel covers a whole number of them. Cells closer to an edge than the border are unusable. Panels are then laid
+in rows running along the eaves: each row takes panels greedily from the left wherever a whole panel fits, which is
+the most a row can hold, and the rows are spaced up the roof to hold the most panels between them. This is tried with
+panels portrait and landscape and a few rotations, and the best is kept.
+"""
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import numpy as np
+
+from constants import SolarConstants
+from roof import Polygon
+
+CELL_SIZE_M = 0.05
+MAX_CELLS = 60_000  # big roofs use coarser cells so packing one roof stays well under 50ms
+MAX_EDGE_ROTATIONS = 2  # besides lining rows up with the eaves, also line them up with the longest edges
+
+
+@dataclass
+class Packing:
+    number_of_panels: int
+    panel_corners_m: np.ndarray  # (panels, 4, 2) in plan metres, same frame as Polygon.metres
+    portrait: bool  # long side of the panels up the roof
+    rotation_degrees: float  # of the rows from the eaves, in the plane of the roof
+
+
+def pack_polygon(polygon: Polygon, pitch: float, azimuth_degrees: float) -> Packing:
+    """ Most panels that fit on the roof, with where they go"""
+    plan = polygon.metres
+    if len(plan) < 3 or polygon.area == 0:
+        return Packing(number_of_panels=0, panel_corners_m=np.zeros((0, 4, 2)), portrait=True, rotation_degrees=0)
+
+    along_eaves, up_roof = roof_axes(azimuth_degrees)
+    stretch = 1 / np.cos(np.radians(pitch))
+    in_roof_plane = np.stack([plan @ along_eaves, plan @ up_roof * stretch], axis=-1)
+    # Bigger roofs get a bigger border, as for rectangles in Solar.max_number_of_panels_in_a_rectangle
+    roof_height = np.ptp(in_roof_plane[:, 1])
+    if roof_height >= 2 * (SolarConstants.SMALL_PANEL_BORDER_M + SolarConstants.PANEL_HEIGHT_M):
+        border = SolarConstants.BIG_PANEL_BORDER_M
+    else:
+        border = SolarConstants.SMALL_PANEL_BORDER_M
+
+    best = (np.zeros((0, 4, 2)), True, 0.0)
+    for rotation_degrees in candidate_rotations(in_roof_plane):
+        rotated = in_roof_plane @ rotation_matrix(rotation_degrees)
+        for portrait in (True, False):
+            panel_size = (SolarConstants.PANEL_WIDTH_M, SolarConstants.PANEL_HEIGHT_M)
+            grid = RoofGrid.from_outline(rotated, panel_size=panel_size if portrait else panel_size[::-1],
+                                         border=border)
+            corners = grid.pack_rows()
+            if len(corners) > len(best[0]):
+                best = (corners, portrait, rotation_degrees)
+
+    corners, portrait, rotation_degrees = best
+    # back from the rotated roof plane to plan metres
+    in_roof_plane_corners = corners @ rotation_matrix(rotation_degrees).T
+    plan_corners = (np.multiply.outer(in_roof_plane_corners[..., 0], along_eaves)
+                    + np.multiply.outer(in_roof_plane_corners[..., 1] / stretch, up_roof))
+    return Packing(number_of_panels=len(corners), panel_corners_m=plan_corners, portrait=portrait,
+                   rotation_degrees=rotation_degrees)
+
+
+def roof_axes(azimuth_degrees: float) -> Tuple[np.ndarray, np.ndarray]:
+    """ Unit vectors in plan (north, east) along the eaves and up the roof. Azimuth is clockwise from South"""
+    azimuth = np.radians(azimuth_degrees)
+    up_roof = np.array([np.cos(azimuth), np.sin(azimuth)])  # away from the direction the roof faces
+    along_eaves = np.array([-up_roof[1], up_roof[0]])
+    return along_eaves, up_roof
+
+
+def rotation_matrix(degrees: float) -> np.ndarray:
+    """ For row vectors, i.e. points @ rotation_matrix(degrees)"""
+    radians = np.radians(degrees)
+    return np.array([[np.cos(radians), np.sin(radians)], [-np.sin(radians), np.cos(radians)]])
+
+
+def candidate_rotations(outline: np.ndarray) -> List[float]:
+    """ 0, so rows follow the eaves, plus the rotations that line rows up with the longest edges, e.g. for roofs
+    drawn a little askew"""
+    edges = np.roll(outline, -1, axis=0) - outline
+    lengths = np.hypot(edges[:, 0], edges[:, 1])
+    rotations = [0.0]
+    for i in np.argsort(-lengths):
+        angle = np.degrees(np.arctan2(edges[i, 1], edges[i, 0]))
+        # rotating by minus the edge's angle lines it up with the rows. Rows and columns are interchangeable, so
+        # only the angle mod 90 matters
+        rotation = float(-((angle + 45) % 90 - 45))
+        if all(abs(rotation - existing) > 1 for existing in rotations):
+            rotations.append(rotation)
+        if len(rotations) > MAX_EDGE_ROTATIONS:
+            break
+    return rotations
+
+
+@dataclass
+class RoofGrid:
+    origin: np.ndarray  # (x, y) of the corner of cell (0, 0)
+    cell_size_m: np.ndarray  # (along the eaves, up the roof)
+    panel_cells: Tuple[int, int]  # cells covered by one panel (along the eaves, up the roof)
+    usable: np.ndarray  # (rows up the roof, columns along the eaves) of bool
+
+    @classmethod
+    def from_outline(cls, outline: np.ndarray, panel_size: Tuple[float, float], border: float) -> 'RoofGrid':
+        minimum, maximum = outline.min(axis=0), outline.max(axis=0)
+        extent = maximum - minimum
+        scale = max(1.0, np.sqrt(extent[0] * extent[1] / MAX_CELLS) / CELL_SIZE_M)
+        panel_cells = tuple(max(2, int(round(size / (CELL_SIZE_M * scale)))) for size in panel_size)
+        cell_size_m = np.array(panel_size) / panel_cells
+        n_columns, n_rows = np.ceil(extent / cell_size_m).astype(int) + 1
+        x = minimum[0] + (np.arange(n_columns) + 0.5) * cell_size_m[0]
+        y = minimum[1] + (np.arange(n_rows) + 0.5) * cell_size_m[1]
+
+        usable = is_inside(x, y, outline) & ~is_near_outline(x, y, outline, distance=border / 2)
+        return cls(origin=minimum, cell_size_m=cell_size_m, panel_cells=panel_cells, usable=usable)
+
+    def pack_rows(self) -> np.ndarray:
+        """ Corners (panels, 4, 2) of panels laid in rows along the eaves, greedily from the left in each row.
+        Rows go wherever gets the most panels in total, so they can skip a gap, e.g. to line up with the other leg
+        of an L"""
+        width_cells, height_cells = self.panel_cells
+        n_rows, n_columns = self.usable.shape
+        if n_rows < height_cells or n_columns < width_cells:
+            return np.zeros((0, 4, 2))
+
+        # A panel fits where every cell under it is usable, found from a summed-area table for every row at once
+        summed = np.zeros((n_rows + 1, n_columns + 1), dtype=np.int32)
+        summed[1:, 1:] = self.usable.cumsum(axis=0).cumsum(axis=1)
+        top, bottom = summed[height_cells:], summed[:-height_cells]
+        under_panel = top[:, width_cells:] - bottom[:, width_cells:] - top[:, :-width_cells] + bottom[:, :-width_cells]
+        fits = under_panel == width_cells * height_cells  # (row the panel starts on, column it starts on)
+
+        # next_fit[row, column] is the first column at or after column where a panel fits in that row
+        n_row_starts, n_starts = fits.shape
+        next_fit = np.minimum.accumulate(np.where(fits, np.arange(n_starts), n_starts)[:, ::-1], axis=1)[:, ::-1]
+        next_fit = np.concatenate([next_fit, np.full((n_row_starts, width_cells + 1), n_starts)], axis=1)
+
+        # Fill a row starting on every row of cells, stepping along all of them at once, one panel per step
+        rows = np.arange(n_row_starts)
+        columns = next_fit[rows, 0]
+        placed_rows, placed_columns = [], []
+        while len(rows) > 0:
+            placed = columns < n_starts
+            rows, columns = rows[placed], columns[placed]
+            placed_rows.append(rows)
+            placed_columns.append(columns)
+            columns = next_fit[rows, columns + width_cells]
+        placed_rows, placed_columns = np.concatenate(placed_rows), np.concatenate(placed_columns)
+        panels_per_row = np.bincount(placed_rows, minlength=n_row_starts)
+
+        # Then pick rows that don't overlap with the most panels between them: most[row] is the most panels in rows
+        # starting at or above row
+        most = np.zeros(n_row_starts + height_cells, dtype=int)
+        for row in range(n_row_starts - 1, -1, -1):
+            most[row] = max(most[row + 1], panels_per_row[row] + most[row + height_cells])
+        chosen = np.zeros(n_row_starts, dtype=bool)
+        row = 0
+        while row < n_row_starts and most[row] > 0:
+            if most[row] == most[row + 1]:
+                row += 1
+            else:
+                chosen[row] = True
+                row += height_cells
+        keep = chosen[placed_rows]
+
+        bottom_left = self.origin + np.stack([placed_columns[keep], placed_rows[keep]], axis=-1) * self.cell_size_m
+        panel_shape = np.array([[0, 0], [width_cells, 0], [width_cells, height_cells], [0, height_cells]])
+        return bottom_left[:, None, :] + panel_shape * self.cell_size_m
+
+
+def is_inside(x: np.ndarray, y: np.ndarray, outline: np.ndarray) -> np.ndarray:
+    """ (y, x) grid of whether each cell centre is inside, by the even-odd rule. Works along each row of cells, so
+    the cost goes with rows x edges rather than cells x edges"""
+    start, end = outline, np.roll(outline, -1, axis=0)
+    crosses = (start[:, 1] > y[:, None]) != (end[:, 1] > y[:, None])
+    rows, edges = np.nonzero(crosses)
+    x_crossing = start[edges, 0] + ((y[rows] - start[edges, 1]) * (end[edges, 0] - start[edges, 0])
+                                    / (end[edges, 1] - start[edges, 1]))
+    # count each crossing at the first cell centre to its right, so a cumulative sum counts crossings to the left
+    first_column_right = np.searchsorted(x, x_crossing, side='right')
+    crossings_left = np.zeros((len(y), len(x) + 1), dtype=np.int32)
+    np.add.at(crossings_left, (rows, first_column_right), 1)
+    return crossings_left.cumsum(axis=1)[:, :-1] % 2 == 1
+
+
+def is_near_outline(x: np.ndarray, y: np.ndarray, outline: np.ndarray, distance: float) -> np.ndarray:
+    """ (y, x) grid of whether each cell centre is closer than distance to an edge. Each edge only checks the cells
+    around it"""
+    near = np.zeros((len(y), len(x)), dtype=bool)
+    for start, end in zip(outline, np.roll(outline, -1, axis=0)):
+        low, high = np.minimum(start, end) - distance, np.maximum(start, end) + distance
+        columns = slice(np.searchsorted(x, low[0]), np.searchsorted(x, high[0], side='right'))
+        rows = slice(np.searchsorted(y, low[1]), np.searchsorted(y, high[1], side='right'))
+        relative_x = x[columns][None, :] - start[0]
+        relative_y = y[rows][:, None] - start[1]
+        edge = end - start
+        along = np.clip((relative_x * edge[0] + relative_y * edge[1]) / max(edge @ edge, 1e-12), 0, 1)
+        near[rows, columns] |= (relative_x - along * edge[0]) ** 2 + (relative_y - along * edge[1]) ** 2 < distance ** 2
+    return near
@@ -0,0 +1,212 @@
+""" Local PV performance model, so generation can be worked out without calling PVGIS.
+
+Used for batch work over many roofs and as the fallback when PVGIS can't be reached. Everything is vectorised over
+the hours of the year and over installs. Weather is described by hourly clearness index, diffuse fraction and air
+temperature, so one dataset can be applied at any site in the region it describes.
+
+Steps, for each install and hour:
+    solar position - declination, equation of time and hour angle (Spencer 1971)
+    plane of array - isotropic sky: beam on the panel + sky diffuse + ground reflected
+    temperature - cell temperature from air temperature and irradiance, derating output by a power coefficient
+    losses - SolarConstants.SYSTEM_LOSS, as used in the PVGIS requests
+"""
+from dataclasses import dataclass
+from functools import cache, cached_property
+from pathlib import Path
+from typing import Iterator, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+import constants
+from constants import SolarConstants
+
+WEATHER_PATH = Path(__file__).parent.parent / 'data/weather_hourly_2013.csv'
+# Hourly columns ghi and dhi (W/m2 horizontal) and temp_air (C) measured at WEATHER_LATITUDE/LONGITUDE.
+# Not shipped, so unless it is added the climatology below is used
+WEATHER_LATITUDE = 52.5
+WEATHER_LONGITUDE = -1.5
+
+SOLAR_CONSTANT_W_PER_M2 = 1367
+GROUND_REFLECTANCE = 0.2
+TEMPERATURE_COEFFICIENT_PER_C = -0.004  # crystalline silicon
+CELL_HEATING_C_PER_W_PER_M2 = 0.035  # from a NOCT of ~48C, building mounted panels run warmer than free standing
+CHUNK_SIZE = 64  # installs per block of hourly arrays
+
+# Typical UK monthly mean clearness index and air temperature, Jan to Dec
+MONTHLY_CLEARNESS_INDEX = (0.33, 0.37, 0.40, 0.45, 0.47, 0.47, 0.47, 0.46, 0.43, 0.39, 0.34, 0.31)
+MONTHLY_AIR_TEMPERATURE_C = (5, 5, 7, 9, 12, 15, 17, 17, 14, 11, 8, 5)
+DIURNAL_TEMPERATURE_RANGE_C = 8
+
+
+@dataclass
+class SunPath:
+    """ Parts of the solar position that are the same for every site, one value per hour"""
+    sin_declination: np.ndarray
+    cos_declination_cos_hour_angle: np.ndarray  # hour angle at longitude 0
+    cos_declination_sin_hour_angle: np.ndarray
+    extraterrestrial_w_per_m2: np.ndarray
+
+    @classmethod
+    def for_index(cls, index: pd.DatetimeIndex) -> 'SunPath':
+        """ Sun position at the middle of each hour, index in UTC"""
+        day_angle = 2 * np.pi * (index.dayofyear.to_numpy() - 1) / 365
+        declination = (0.006918 - 0.399912 * np.cos(day_angle) + 0.070257 * np.sin(day_angle)
+                       - 0.006758 * np.cos(2 * day_angle) + 0.000907 * np.sin(2 * day_angle)
+                       - 0.002697 * np.cos(3 * day_angle) + 0.00148 * np.sin(3 * day_angle))
+        equation_of_time_minutes = 229.18 * (0.000075 + 0.001868 * np.cos(day_angle) - 0.032077 * np.sin(day_angle)
+                                             - 0.014615 * np.cos(2 * day_angle) - 0.040849 * np.sin(2 * day_angle))
+        solar_time_hours = index.hour.to_numpy() + 0.5 + equation_of_time_minutes / 60
+        hour_angle = np.radians(15 * (solar_time_hours - 12))
+        return cls(sin_declination=np.sin(declination),
+                   cos_declination_cos_hour_angle=np.cos(declination) * np.cos(hour_angle),
+                   cos_declination_sin_hour_angle=np.cos(declination) * np.sin(hour_angle),
+                   extraterrestrial_w_per_m2=SOLAR_CONSTANT_W_PER_M2 * (1 + 0.033 * np.cos(day_angle)))
+
+    @property
+    def basis(self) -> np.ndarray:
+        return np.vstack([self.sin_declination, self.cos_declination_cos_hour_angle,
+                          self.cos_declination_sin_hour_angle])
+
+
+def incidence_coefficients(latitudes: np.ndarray, longitudes: np.ndarray, pitches: np.ndarray,
+                           azimuths_degrees: np.ndarray) -> np.ndarray:
+    """ Cosine of the angle between sun and panel is a weighted sum of the three SunPath terms (Duffie & Beckman
+    eq. 1.6.2 with the site's longitude folded into the hour angle). Returns the weights, one row per install.
+    Azimuth as PVGIS: 0 south, 90 west, -90 east"""
+    phi = np.radians(latitudes)
+    beta = np.radians(pitches)
+    gamma = np.radians(azimuths_degrees)
+    lam = np.radians(longitudes)
+    a = np.sin(phi) * np.cos(beta) - np.cos(phi) * np.sin(beta) * np.cos(gamma)
+    b = np.cos(phi) * np.cos(beta) + np.sin(phi) * np.sin(beta) * np.cos(gamma)
+    c = np.sin(beta) * np.sin(gamma)
+    return np.column_stack([a, b * np.cos(lam) + c * np.sin(lam), c * np.cos(lam) - b * np.sin(lam)])
+
+
+def erbs_diffuse_fraction(clearness_index: np.ndarray) -> np.ndarray:
+    kt = clearness_index
+    middle = 0.9511 - 0.1604 * kt + 4.388 * kt ** 2 - 16.638 * kt ** 3 + 12.336 * kt ** 4
+    return np.where(kt <= 0.22, 1 - 0.09 * kt, np.where(kt <= 0.8, middle, 0.165))
+
+
+@dataclass
+class Weather:
+    index: pd.DatetimeIndex
+    clearness_index: np.ndarray  # global horizontal / extraterrestrial horizontal
+    diffuse_fraction: np.ndarray  # diffuse horizontal / global horizontal
+    air_temperature_c: np.ndarray
+    synthetic: bool = False  # made up from monthly means rather than measured, so only a rough guide
+
+    @cached_property
+    def sun_path(self) -> SunPath:
+        return SunPath.for_index(self.index)
+
+    @classmethod
+    def climatology(cls, index: pd.DatetimeIndex = constants.BASE_YEAR_HOURLY_INDEX, seed: int = 2013
+                    ) -> 'Weather':
+        """ Typical UK year. Each day's clearness varies around the monthly mean so there are dull and bright days"""
+        month = index.month.to_numpy() - 1
+        day = index.dayofyear.to_numpy() - 1
+        daily_variation = np.random.default_rng(seed).uniform(0.45, 1.55, size=day.max() + 1)
+        clearness_index = np.clip(np.asarray(MONTHLY_CLEARNESS_INDEX)[month] * daily_variation[day], 0.05, 0.8)
+        hour = index.hour.to_numpy()
+        diurnal = DIURNAL_TEMPERATURE_RANGE_C / 2 * np.cos(2 * np.pi * (hour - 15) / 24)  # warmest mid afternoon
+        return cls(index=index, clearness_index=clearness_index,
+                   diffuse_fraction=erbs_diffuse_fraction(clearness_index),
+                   air_temperature_c=np.asarray(MONTHLY_AIR_TEMPERATURE_C, dtype=float)[month] + diurnal,
+                   synthetic=True)
+
+    @classmethod
+    def from_measurements(cls, index: pd.DatetimeIndex, ghi: np.ndarray, dhi: np.ndarray,
+                          air_temperature_c: np.ndarray, latitude: float, longitude: float) -> 'Weather':
+        """ From measured global and diffuse horizontal irradiance at a site"""
+        sun = SunPath.for_index(index)
+        horizontal = incidence_coefficients(np.array([latitude]), np.array([longitude]), np.zeros(1), np.zeros(1))
+        sin_elevation = (horizontal @ sun.basis)[0]
+        extraterrestrial_horizontal = sun.extraterrestrial_w_per_m2 * sin_elevation
+        sun_up = sin_elevation > 0.05  # avoids dividing by ~0 at sunrise and sunset
+        clearness_index = np.where(sun_up, ghi / np.where(sun_up, extraterrestrial_horizontal, 1), 0)
+        diffuse_fraction = np.where(ghi > 0, dhi / np.where(ghi > 0, ghi, 1), 1)
+        return cls(index=index, clearness_index=np.clip(clearness_index, 0, 1),
+                   diffuse_fraction=np.clip(diffuse_fraction, 0, 1),
+                   air_temperature_c=np.asarray(air_temperature_c, dtype=float))
+
+    @classmethod
+    def load(cls, path: Path = WEATHER_PATH, latitude: float = WEATHER_LATITUDE,
+             longitude: float = WEATHER_LONGITUDE) -> 'Weather':
+        df = pd.read_csv(path)
+        assert len(df) == len(constants.BASE_YEAR_HOURLY_INDEX), "weather file must be hourly for the base year"
+        return cls.from_measurements(index=constants.BASE_YEAR_HOURLY_INDEX, ghi=df['ghi'].to_numpy(),
+                                     dhi=df['dhi'].to_numpy(), air_temperature_c=df['temp_air'].to_numpy(),
+                                     latitude=latitude, longitude=longitude)
+
+
+@cache
+def get_default_weather() -> Weather:
+    """ The stored dataset if there is one, otherwise the climatology"""
+    if WEATHER_PATH.exists():
+        return Weather.load()
+    return Weather.climatology()
+
+
+def iter_generation_per_kwp(latitudes: Sequence[float], longitudes: Sequence[float], pitches: Sequence[float],
+                            azimuths_degrees: Sequence[float], weather: Weather | None = None,
+                            chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[slice, np.ndarray]]:
+    """ Hourly kW for 1kWp, a block of installs at a time, for when all of them won't fit in memory at once.
+    Yields the rows of installs in the block and their profiles. The array is reused, so copy anything to keep"""
+    weather = weather if weather is not None else get_default_weather()
+    sun = weather.sun_path
+    basis = sun.basis
+    latitudes, longitudes, pitches, azimuths_degrees = (np.asarray(values, dtype=float) for values in
+                                                        (latitudes, longitudes, pitches, azimuths_degrees))
+    panel_coefficients = incidence_coefficients(latitudes, longitudes, pitches, azimuths_degrees)
+    horizontal_coefficients = incidence_coefficients(latitudes, longitudes, np.zeros_like(pitches),
+                                                     np.zeros_like(pitches))
+    sky_view = ((1 + np.cos(np.radians(pitches))) / 2)[:, np.newaxis]
+    ground_view = ((1 - np.cos(np.radians(pitches))) / 2)[:, np.newaxis]
+
+    # Hourly weather terms, shared by every install
+    global_extraterrestrial = sun.extraterrestrial_w_per_m2 * weather.clearness_index
+    beam = global_extraterrestrial * (1 - weather.diffuse_fraction)  # per unit cos(incidence)
+    diffuse = global_extraterrestrial * weather.diffuse_fraction  # per unit sin(elevation)
+    reflected = global_extraterrestrial * GROUND_REFLECTANCE
+    efficiency = (1 - SolarConstants.SYSTEM_LOSS / 100) / 1000  # W/m2 on 1kWp to kW out, after losses
+    linear_term = efficiency * (1 + TEMPERATURE_COEFFICIENT_PER_C * (weather.air_temperature_c - 25))
+    quadratic_term = efficiency * TEMPERATURE_COEFFICIENT_PER_C * CELL_HEATING_C_PER_W_PER_M2  # heating by the sun
+
+    number_of_installs = len(latitudes)
+    hours = len(weather.index)
+    cos_incidence = np.empty((min(chunk_size, number_of_installs), hours))
+    sin_elevation = np.empty_like(cos_incidence)
+    plane_of_array = np.empty_like(cos_incidence)
+    for start in range(0, number_of_installs, chunk_size):
+        rows = slice(start, min(start + chunk_size, number_of_installs))
+        n = rows.stop - start
+        np.matmul(panel_coefficients[rows], basis, out=cos_incidence[:n])
+        np.matmul(horizontal_coefficients[rows], basis, out=sin_elevation[:n])
+        poa = plane_of_array[:n]
+        np.maximum(cos_incidence[:n], 0, out=poa)
+        poa *= beam
+        poa[sin_elevation[:n] <= 0] = 0  # a tilted panel can face the sun while it is below the horizon
+        np.maximum(sin_elevation[:n], 0, out=sin_elevation[:n])
+        poa += sin_elevation[:n] * (diffuse * sky_view[rows] + reflected * ground_view[rows])
+        # kW = poa * efficiency * (1 + coefficient * (air temperature + heating * poa - 25))
+        power = cos_incidence[:n]  # reuse the buffer
+        np.multiply(poa, quadratic_term, out=power)
+        power += linear_term
+        power *= poa
+        yield rows, power
+
+
+def generation_per_kwp(latitudes: Sequence[float], longitudes: Sequence[float], pitches: Sequence[float],
+                       azimuths_degrees: Sequence[float], weather: Weather | None = None,
+                       dtype: type = np.float64) -> np.ndarray:
+    """ Hourly kW for 1kWp at each install, one row per install. In the form batch.Scenarios.from_options takes.
+    10,000 installs is ~700MB as float64, so pass dtype=np.float32 or use iter_generation_per_kwp for more"""
+    number_of_installs = len(latitudes)
+    weather = weather if weather is not None else get_default_weather()
+    profiles = np.empty((number_of_installs, len(weather.index)), dtype=dtype)
+    for rows, power in iter_generation_per_kwp(latitudes, longitudes, pitches, azimuths_degrees, weather=weather):
+        profiles[rows] = power
+    return profiles
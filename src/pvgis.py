@@ -0,0 +1,174 @@
+""" Client for the PVGIS API: pooled connections, a process-wide rate limit and retries with backoff.
+
+API Documentation here: https://joint-research-centre.ec.europa.eu/
+  pvgis-photovoltaic-geographical-information-system/getting-started-pvgis/api-non-interactive-service_en
+"""
+import os
+import random
+import statistics
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+API_URL = 'https://re.jrc.ec.europa.eu/api/v5_2/seriescalc'
+API_URL_ENVIRONMENT_VARIABLE = 'PVGIS_API_URL'  # e.g. to point at a local pvgis_stub server
+RATE_LIMIT_PER_SECOND = 30  # published limit, per IP address
+MAX_RETRIES = 4
+BACKOFF_SECONDS = 0.5  # first retry waits up to this long, doubling each retry after
+TIMEOUT_SECONDS = (5, 60)  # (connect, read). Multi-year hourly series can take a while to generate
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+POOL_SIZE = 32  # connections kept alive, enough for a thread per request at the rate limit
+ERROR_BODY_CHARS = 500  # of a failed response kept in the error, PVGIS explains what was wrong with the request there
+
+
+class TokenBucket:
+    """ Thread-safe rate limiter. Callers over the rate wait their turn rather than being refused"""
+
+    def __init__(self, rate_per_second: float, burst: int = 1,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = float(burst)
+        self._last_refill = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """ Take a token, waiting if there isn't one. Returns the seconds waited"""
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate_per_second)
+            self._last_refill = now
+            self._tokens -= 1  # reserve a token now, so waiting callers are served in order
+            wait = -self._tokens / self.rate_per_second if self._tokens < 0 else 0.0
+        if wait > 0:
+            self.sleep(wait)
+        return wait
+
+
+class RequestMetrics:
+    """ Counts, response statuses and recent latencies across every request made by a client"""
+
+    def __init__(self, window: int = 1000):
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.statuses: Dict[int, int] = {}  # responses by HTTP status. Requests with no response aren't counted
+        self.rate_limit_wait_seconds = 0.0
+        self.latencies_seconds: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency_seconds: float, wait_seconds: float, retry: bool, status: int | None = None):
+        with self._lock:
+            self.requests += 1
+            self.retries += retry
+            if status is not None:
+                self.statuses[status] = self.statuses.get(status, 0) + 1
+            self.rate_limit_wait_seconds += wait_seconds
+            self.latencies_seconds.append(latency_seconds)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+
+    def summary(self) -> Dict[str, float]:
+        with self._lock:
+            latencies = sorted(self.latencies_seconds)
+            summary = {'requests': self.requests, 'retries': self.retries, 'failures': self.failures,
+                       'statuses': dict(sorted(self.statuses.items())),
+                       'rate_limit_wait_seconds': self.rate_limit_wait_seconds}
+        if latencies:
+            summary['latency_p50_seconds'] = statistics.median(latencies)
+            summary['latency_p95_seconds'] = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+            summary['latency_max_seconds'] = latencies[-1]
+        return summary
+
+
+# Shared by every client in the process, as the published limit is per IP not per connection
+RATE_LIMITER = TokenBucket(rate_per_second=RATE_LIMIT_PER_SECOND)
+
+
+class PVGISClient:
+
+    def __init__(self, api_url: str = API_URL, rate_limiter: TokenBucket = RATE_LIMITER,
+                 max_retries: int = MAX_RETRIES, backoff_seconds: float = BACKOFF_SECONDS,
+                 timeout_seconds: float | tuple = TIMEOUT_SECONDS, sleep: Callable[[float], None] = time.sleep):
+        self.api_url = api_url
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout_seconds = timeout_seconds
+        self.sleep = sleep
+        self.metrics = RequestMetrics()
+        self.session = requests.Session()  # keeps connections alive between calls
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def get_json(self, params: dict) -> dict:
+        """ Retries connection errors, timeouts, 429 and 5xx responses with jittered exponential backoff.
+        Raises requests.ConnectionError once retries run out or for any other status"""
+        for attempt in range(self.max_retries + 1):
+            wait = self.rate_limiter.acquire()
+            start = time.perf_counter()
+            try:
+                response = self.session.get(self.api_url, params=params, timeout=self.timeout_seconds)
+            except (requests.ConnectionError, requests.Timeout) as error:
+                response = None
+                failure = error
+            self.metrics.record(latency_seconds=time.perf_counter() - start, wait_seconds=wait, retry=attempt > 0,
+                                status=response.status_code if response is not None else None)
+
+            if response is not None:
+                if response.status_code == 200:
+                    return response.json()
+                failure = requests.ConnectionError(
+                    f"PVGIS returned {response.status_code}: {response.text[:ERROR_BODY_CHARS]}", response=response)
+                if response.status_code not in RETRY_STATUS_CODES:
+                    break
+            if attempt < self.max_retries:
+                self.sleep(self.backoff(attempt=attempt, response=response))
+
+        self.metrics.record_failure()
+        raise failure
+
+    def backoff(self, attempt: int, response: requests.Response | None) -> float:
+        """ Full jitter, so clients that failed together don't all retry together. Honours Retry-After if sent"""
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after is not None and retry_after.isdigit():
+            return float(retry_after)
+        return random.uniform(0, self.backoff_seconds * 2 ** attempt)
+
+
+def hourly_power_kw(response_json: dict) -> np.ndarray:
+    """ Hourly PV output from a seriescalc response, converted from W to kW"""
+    hourly = response_json['outputs']['hourly']
+    return np.fromiter((hour['P'] for hour in hourly), dtype=np.float64, count=len(hourly)) / 1000
+
+
+def hourly_power_kw_per_year(response_json: dict) -> np.ndarray:
+    """ Hourly PV output in kW as a float32 array of years x 8760, from a response covering whole years.
+    29th February is dropped so every year lines up hour for hour with a non-leap year"""
+    hourly = response_json['outputs']['hourly']
+    power_kw = np.fromiter((hour['P'] for hour in hourly if hour['time'][4:8] != '0229'), dtype=np.float64) / 1000
+    return power_kw.astype(np.float32).reshape(-1, 8760)
+
+
+_default_client: PVGISClient | None = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client() -> PVGISClient:
+    """ Client for PVGIS_API_URL if set, otherwise the real API. Recreated if the variable changes"""
+    global _default_client
+    api_url = os.environ.get(API_URL_ENVIRONMENT_VARIABLE, API_URL)
+    with _default_client_lock:
+        if _default_client is None or _default_client.api_url != api_url:
+            _default_client = PVGISClient(api_url=api_url)
+        return _default_client
@@ -0,0 +1,125 @@
+""" Fetch PVGIS generation for many installs at once, e.g. for portfolio studies.
+
+Requests are deduplicated and run concurrently on a thread pool, so the blocking PVGIS client and its process-wide
+rate limit are reused as they are. Installs without a tile grid of their own share profiles through
+pvgis_tiles.DEFAULT_GRID, unless another grid, or None for exact sites, is passed in. Results are streamed back per
+install as soon as everything it needs has arrived, and a failed request only fails the installs that needed it.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Iterable, List, Tuple
+
+import numpy as np
+
+import pvgis_tiles
+import solar
+
+MAX_CONCURRENCY = 16  # requests in flight. The rate limit in pvgis still applies on top of this
+
+Site = Tuple[float, float, float, float]  # (latitude, longitude, pitch, azimuth_degrees)
+
+
+@dataclass
+class FetchResult:
+    index: int  # position of the item in the list passed in
+    item: Any
+    profile_kw: np.ndarray | None  # kW for an install's capacity, or per kWp for a site tuple
+    error: Exception | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def grid_for(item: 'solar.Solar', tile_grid: pvgis_tiles.TileGrid | None) -> pvgis_tiles.TileGrid | None:
+    """ The install's own tile grid if it has one, otherwise the one for the whole batch"""
+    return item.tile_grid if item.tile_grid is not None else tile_grid
+
+
+def sites_needed(item: 'solar.Solar | Site', tile_grid: pvgis_tiles.TileGrid | None = None) -> List[Site]:
+    """ Site tuples are fetched as they are, installs fetch the tile grid nodes their profile is blended from"""
+    if isinstance(item, tuple):
+        return [tuple(item)]
+    grid = grid_for(item, tile_grid)
+    if grid is None:
+        return [(item.latitude, item.longitude, item.pitch, item.orientation.azimuth_degrees)]
+    return [grid.node_coordinates(node) + (item.pitch, item.orientation.azimuth_degrees)
+            for node, _ in grid.weights(latitude=item.latitude, longitude=item.longitude)]
+
+
+def combine_profile(item: 'solar.Solar | Site', fetched: Dict[Site, np.ndarray],
+                    tile_grid: pvgis_tiles.TileGrid | None = None) -> np.ndarray:
+    if isinstance(item, tuple):
+        return fetched[tuple(item)]
+    grid = grid_for(item, tile_grid)
+    if grid is None:
+        per_kwp = fetched[sites_needed(item)[0]]
+    else:
+        per_kwp = grid.profile_per_kwp(latitude=item.latitude, longitude=item.longitude, pitch=item.pitch,
+                                       azimuth_degrees=item.orientation.azimuth_degrees,
+                                       fetch=lambda *site: fetched[site])
+    return per_kwp * item.peak_capacity_kw_out_per_kw_in_per_m2
+
+
+async def fetch_generation(items: Iterable['solar.Solar | Site'], max_concurrency: int = MAX_CONCURRENCY,
+                           tile_grid: pvgis_tiles.TileGrid | None = pvgis_tiles.DEFAULT_GRID
+                           ) -> AsyncIterator[FetchResult]:
+    """ Yields a FetchResult per item, in the order they complete. Closing it early cancels the fetches left"""
+    items = list(items)
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max_concurrency)
+    fetched: Dict[Site, np.ndarray] = {}
+    site_tasks: Dict[Site, asyncio.Task] = {}
+    item_tasks: List[asyncio.Task] = []
+    executor = ThreadPoolExecutor(max_workers=max_concurrency)
+
+    async def fetch_site(site: Site):
+        async with semaphore:
+            # goes through the in-memory and disk caches, so repeat batches don't touch the network
+            fetched[site] = await loop.run_in_executor(executor,
+                                                       solar.get_hourly_generation_per_kwp_from_eu_api, *site)
+
+    async def fetch_item(index: int, item) -> FetchResult:
+        try:
+            sites = sites_needed(item, tile_grid)
+            await asyncio.gather(*[site_tasks[site] for site in sites])
+            return FetchResult(index=index, item=item, profile_kw=combine_profile(item, fetched, tile_grid))
+        except Exception as error:
+            return FetchResult(index=index, item=item, profile_kw=None, error=error)
+
+    # The caller can stop iterating early, e.g. on the first failure, so everything still queued is cancelled on
+    # the way out rather than left running in the background
+    try:
+        for item in items:
+            try:
+                sites = sites_needed(item, tile_grid)
+            except Exception:
+                continue  # reported against the item by fetch_item
+            for site in sites:
+                if site not in site_tasks:  # each distinct request only made once
+                    site_tasks[site] = asyncio.create_task(fetch_site(site))
+
+        item_tasks = [asyncio.create_task(fetch_item(index, item)) for index, item in enumerate(items)]
+        for next_result in asyncio.as_completed(item_tasks):
+            yield await next_result
+        # failures have already been reported per item, this just stops asyncio warning they were never retrieved
+        await asyncio.gather(*site_tasks.values(), return_exceptions=True)
+    finally:
+        tasks = [*item_tasks, *site_tasks.values()]
+        for task in tasks:
+            task.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def fetch_generation_all(items: Iterable['solar.Solar | Site'], max_concurrency: int = MAX_CONCURRENCY,
+                         tile_grid: pvgis_tiles.TileGrid | None = pvgis_tiles.DEFAULT_GRID) -> List[FetchResult]:
+    """ Blocking version for scripts, returns results in the same order as items"""
+
+    async def collect():
+        return [result async for result in fetch_generation(items, max_concurrency=max_concurrency,
+                                                            tile_grid=tile_grid)]
+
+    results = asyncio.run(collect())
+    return sorted(results, key=lambda result: result.index)
@@ -0,0 +1,160 @@
+""" Persistent cache of PVGIS responses, shared by every process and replica that points at the same file.
+
+Responses are stored as compact numpy arrays in a SQLite file, keyed on the canonical request parameters. Writes
+happen inside a transaction so a reader never sees half an entry, and the least recently used entries are evicted
+once the file holds more than max_bytes of profiles.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+
+DEFAULT_PATH = Path(__file__).parent.parent / 'data/pvgis_cache.sqlite'
+PATH_ENVIRONMENT_VARIABLE = 'PVGIS_CACHE_PATH'
+MAX_BYTES = 256 * 1024 ** 2  # ~3,800 single-year profiles
+DECIMAL_PLACES = {'lat': 6, 'lon': 6, 'angle': 2, 'aspect': 2, 'peakpower': 4, 'loss': 2}
+# 6 d.p. of lat/lon is ~0.1m, so rounding only removes float noise and the request sent is unchanged
+
+
+def canonical_params(params: dict) -> dict:
+    """ Round and normalise request parameters so equivalent requests share one key, e.g. pitch 30 and 30.0"""
+    canonical = {}
+    for name, value in params.items():
+        if name in DECIMAL_PLACES:
+            value = float(round(value, DECIMAL_PLACES[name])) + 0.0  # + 0.0 turns -0.0 into 0.0
+        canonical[name] = value
+    return canonical
+
+
+def make_key(params: dict) -> str:
+    return json.dumps(canonical_params(params), sort_keys=True, separators=(',', ':'))
+
+
+@dataclass
+class CacheStats:
+    hits: int
+    misses: int
+    writes: int
+    evictions: int
+    entries: int
+    size_bytes: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
+
+
+class PVGISCache:
+
+    def __init__(self, path: Path | str, max_bytes: int = MAX_BYTES):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        # counts are for this process only, entries and size are read from the shared file
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        connection = self._connect()
+        try:
+            with connection:  # only commits, the connection is closed below
+                connection.execute("PRAGMA journal_mode=WAL")  # readers in other processes don't block on writers
+                connection.execute("CREATE TABLE IF NOT EXISTS responses ("
+                                   "key TEXT PRIMARY KEY, profile BLOB NOT NULL, size_bytes INTEGER NOT NULL, "
+                                   "last_used REAL NOT NULL, dtype TEXT NOT NULL DEFAULT '<f8')")
+                connection.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+                columns = [row[1] for row in connection.execute("PRAGMA table_info(responses)")]
+                if 'dtype' not in columns:  # files from before dtype was stored only hold float64 profiles
+                    connection.execute("ALTER TABLE responses ADD COLUMN dtype TEXT NOT NULL DEFAULT '<f8'")
+        finally:
+            connection.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        # A connection per call keeps this safe to use from Streamlit's script threads
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, params: dict) -> np.ndarray | None:
+        key = make_key(params)
+        connection = self._connect()
+        try:
+            with connection:
+                row = connection.execute("SELECT profile, dtype FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    connection.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+        finally:
+            connection.close()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return np.frombuffer(row[0], dtype=np.dtype(row[1])).copy()
+
+    def put(self, params: dict, profile: np.ndarray):
+        """ Stored flat in the profile's own dtype, so float32 ensembles take half the space"""
+        key = make_key(params)
+        profile = np.ascontiguousarray(profile)
+        blob = profile.tobytes()
+        connection = self._connect()
+        try:
+            with connection:  # one transaction, so the entry and any evictions land together or not at all
+                connection.execute("INSERT OR REPLACE INTO responses (key, profile, size_bytes, last_used, dtype) "
+                                   "VALUES (?, ?, ?, ?, ?)", (key, blob, len(blob), time.time(), profile.dtype.str))
+                evicted = self._evict_least_recently_used(connection)
+        finally:
+            connection.close()
+        with self._lock:
+            self.writes += 1
+            self.evictions += evicted
+
+    def _evict_least_recently_used(self, connection: sqlite3.Connection) -> int:
+        (total_bytes,) = connection.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM responses").fetchone()
+        if total_bytes <= self.max_bytes:
+            return 0
+        to_delete = []
+        for key, size_bytes in connection.execute("SELECT key, size_bytes FROM responses ORDER BY last_used"):
+            if total_bytes <= self.max_bytes:
+                break
+            to_delete.append((key,))
+            total_bytes -= size_bytes
+        connection.executemany("DELETE FROM responses WHERE key = ?", to_delete)
+        return len(to_delete)
+
+    def stats(self) -> CacheStats:
+        connection = self._connect()
+        try:
+            entries, size_bytes = connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM responses").fetchone()
+        finally:
+            connection.close()
+        return CacheStats(hits=self.hits, misses=self.misses, writes=self.writes, evictions=self.evictions,
+                          entries=entries, size_bytes=size_bytes)
+
+    def clear(self):
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute("DELETE FROM responses")
+        finally:
+            connection.close()
+
+
+_caches: Dict[Path, PVGISCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_default_cache() -> PVGISCache:
+    """ Cache at PVGIS_CACHE_PATH if set, otherwise in the data folder. One instance per path per process"""
+    path = Path(os.environ.get(PATH_ENVIRONMENT_VARIABLE, DEFAULT_PATH))
+    with _caches_lock:
+        if path not in _caches:
+            _caches[path] = PVGISCache(path)
+        return _caches[path]
@@ -0,0 +1,192 @@
+""" Local stand-in for the PVGIS seriescalc API, for tests, benchmarks and air-gapped CI.
+
+Modes:
+    synthesize - plausible hourly output made up from the request parameters. Deterministic, so repeatable
+    replay - responses previously saved in record mode. Unrecorded requests get a 404
+    record - forwards requests to the real API and saves the responses for replay
+
+Point the app at it with the PVGIS_API_URL environment variable, e.g.
+    python src/pvgis_stub.py --port 8001 --latency 0.5 &
+    PVGIS_API_URL=http://127.0.0.1:8001/api/v5_2/seriescalc streamlit run src/main.py
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List
+from urllib.parse import parse_qsl, urlparse
+
+import numpy as np
+import pandas as pd
+import requests
+
+import pvgis
+import pvgis_cache
+
+MODES = ('synthesize', 'replay', 'record')
+PATH = '/api/v5_2/seriescalc'
+
+
+def parse_params(query: str) -> dict:
+    params = {}
+    for name, value in parse_qsl(query):
+        try:
+            params[name] = float(value)
+        except ValueError:
+            params[name] = value
+    return params
+
+
+def recording_path(recordings_dir: Path, params: dict) -> Path:
+    key = pvgis_cache.make_key({name: value for name, value in params.items() if name != 'outputformat'})
+    return recordings_dir / f"{hashlib.sha1(key.encode()).hexdigest()}.json"
+
+
+def synthesize_hourly(params: dict) -> List[Dict]:
+    """ Clear sky output on the tilted plane, dimmed by a made up (but repeatable) cloudiness for each day"""
+    latitude, longitude = params['lat'], params['lon']
+    pitch = np.radians(params.get('angle', 0))
+    aspect = np.radians(params.get('aspect', 0))  # PVGIS convention: 0 south, 90 west, -90 east
+    start_year, end_year = int(params.get('startyear', 2013)), int(params.get('endyear', 2013))
+    times = pd.date_range(start=f"{start_year}-01-01 00:10", end=f"{end_year}-12-31 23:10", freq="1H")
+
+    day_of_year = times.dayofyear.to_numpy()
+    declination = np.radians(23.44) * np.sin(2 * np.pi * (284 + day_of_year) / 365)
+    solar_time = times.hour.to_numpy() + times.minute.to_numpy() / 60 + longitude / 15
+    hour_angle = np.radians(15 * (solar_time - 12))
+    phi = np.radians(latitude)
+    sin_elevation = np.sin(phi) * np.sin(declination) + np.cos(phi) * np.cos(declination) * np.cos(hour_angle)
+    elevation = np.arcsin(np.clip(sin_elevation, -1, 1))
+    sun_azimuth = np.arctan2(np.sin(hour_angle),
+                             np.cos(hour_angle) * np.sin(phi) - np.tan(declination) * np.cos(phi))
+    cos_incidence = (np.sin(elevation) * np.cos(pitch)
+                     + np.cos(elevation) * np.sin(pitch) * np.cos(sun_azimuth - aspect))
+
+    daylight = sin_elevation > 0.01
+    air_mass = np.where(daylight, 1 / np.where(daylight, sin_elevation, 1), np.inf)
+    direct_normal = 1000 * 0.7 ** (air_mass ** 0.678)
+    diffuse = 0.1 * direct_normal * (1 + np.cos(pitch)) / 2
+    clear_sky = np.where(daylight, direct_normal * np.clip(cos_incidence, 0, None) + diffuse, 0)
+
+    seed = zlib.crc32(f"{latitude:.2f},{longitude:.2f},{start_year},{end_year}".encode())
+    daily_clearness = np.random.default_rng(seed).uniform(0.3, 1.0, size=len(times) // 24 + 1)
+    irradiance = clear_sky * daily_clearness[np.arange(len(times)) // 24]  # W/m2 on the panel
+    power_w = params.get('peakpower', 1) * irradiance * (1 - params.get('loss', 14) / 100)
+
+    timestamps = times.strftime('%Y%m%d:%H%M')
+    return [{'time': timestamp, 'P': round(p, 2), 'G(i)': round(g, 2), 'H_sun': round(h, 2), 'T2m': 10.0,
+             'WS10m': 3.0, 'Int': 0.0}
+            for timestamp, p, g, h in zip(timestamps, power_w, irradiance, np.degrees(elevation))]
+
+
+class PVGISStubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # so the client can keep connections alive, like the real API
+
+    def do_GET(self):
+        server: PVGISStubServer = self.server
+        url = urlparse(self.path)
+        params = parse_params(url.query)
+        server.count_request()
+        server.inject_latency()
+
+        if url.path != PATH:
+            status, body = 404, {'message': f'Unknown path {url.path}'}
+        elif 'lat' not in params or 'lon' not in params:
+            status, body = 400, {'message': "'lat' and 'lon' are required"}
+        elif server.mode == 'synthesize':
+            status, body = 200, {'inputs': {'location': {'latitude': params['lat'], 'longitude': params['lon']}},
+                                 'outputs': {'hourly': synthesize_hourly(params)},
+                                 'meta': {'source': 'pvgis_stub'}}
+        elif server.mode == 'replay':
+            path = recording_path(server.recordings_dir, params)
+            if path.exists():
+                status, body = 200, json.loads(path.read_text())
+            else:
+                status, body = 404, {'message': 'No recording for this request'}
+        else:
+            response = requests.get(server.upstream_url, params=dict(parse_qsl(url.query)),
+                                    timeout=pvgis.TIMEOUT_SECONDS)
+            status, body = response.status_code, response.json()
+            if status == 200:
+                path = recording_path(server.recordings_dir, params)
+                temporary_path = path.with_suffix('.tmp')
+                temporary_path.write_text(json.dumps(body))
+                temporary_path.replace(path)  # atomic, so replay never reads half a recording
+
+        encoded = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def log_message(self, *args):
+        pass
+
+
+class PVGISStubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, mode: str = 'synthesize',
+                 recordings_dir: Path | str | None = None, latency_seconds: float = 0.0,
+                 latency_jitter_seconds: float = 0.0, upstream_url: str = pvgis.API_URL, seed: int = 0):
+        """ Port 0 picks a free port. Latency is latency_seconds plus up to latency_jitter_seconds, seeded"""
+        assert mode in MODES, f"mode must be one of {MODES}"
+        assert mode == 'synthesize' or recordings_dir is not None, f"{mode} mode needs a recordings_dir"
+        super().__init__((host, port), PVGISStubHandler)
+        self.mode = mode
+        self.recordings_dir = Path(recordings_dir) if recordings_dir is not None else None
+        if self.recordings_dir is not None:
+            self.recordings_dir.mkdir(parents=True, exist_ok=True)
+        self.latency_seconds = latency_seconds
+        self.latency_jitter_seconds = latency_jitter_seconds
+        self.upstream_url = upstream_url
+        self.request_count = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}{PATH}"
+
+    def count_request(self):
+        with self._lock:
+            self.request_count += 1
+
+    def inject_latency(self):
+        with self._lock:
+            latency = self.latency_seconds + self._random.uniform(0, self.latency_jitter_seconds)
+        if latency > 0:
+            time.sleep(latency)
+
+    def start(self) -> 'PVGISStubServer':
+        """ Serve from a background thread"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--mode', choices=MODES, default='synthesize')
+    parser.add_argument('--recordings', help="folder of recorded responses, for replay and record modes")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument('--jitter', type=float, default=0.0, help="up to this many seconds more, at random")
+    args = parser.parse_args()
+    server = PVGISStubServer(host=args.host, port=args.port, mode=args.mode, recordings_dir=args.recordings,
+                             latency_seconds=args.latency, latency_jitter_seconds=args.jitter)
+    print(f"PVGIS stub in {args.mode} mode at {server.url}")
+    server.serve_forever()
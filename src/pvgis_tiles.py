@@ -0,0 +1,73 @@
+""" Spatial grid of PVGIS profiles, so neighbouring sites share requests instead of each making their own.
+
+Profiles are only ever fetched at the nodes of a regular lat/lon grid (one per node, pitch and azimuth, for 1kWp).
+A site close enough to a node uses that node's profile, otherwise it is a bilinear blend of the four nodes around it.
+"""
+from dataclasses import dataclass
+from math import floor, hypot
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from constants import SolarConstants
+
+Node = Tuple[int, int]  # (latitude, longitude) as whole numbers of grid cells, so nodes compare exactly
+FetchPerKwp = Callable[[float, float, float, float], np.ndarray]  # (latitude, longitude, pitch, azimuth) -> kW
+
+
+@dataclass(frozen=True)
+class TileGrid:
+    size_degrees: float = SolarConstants.PVGIS_TILE_DEGREES
+    tolerance_degrees: float = SolarConstants.PVGIS_TILE_TOLERANCE_DEGREES
+    # Sites within tolerance of a node take its profile. Half the size always snaps, 0 always blends
+
+    def node_coordinates(self, node: Node) -> Tuple[float, float]:
+        return round(node[0] * self.size_degrees, 6), round(node[1] * self.size_degrees, 6)
+
+    def weights(self, latitude: float, longitude: float) -> List[Tuple[Node, float]]:
+        """ Nodes to take the profile from and how much of each. Weights sum to 1"""
+        # rounding stops a site sitting on a node landing just below it, e.g. 52.19 / 0.01 = 5218.999...
+        lat_cells = round(latitude / self.size_degrees, 9)
+        lon_cells = round(longitude / self.size_degrees, 9)
+        nearest = (round(lat_cells), round(lon_cells))
+        distance = hypot(lat_cells - nearest[0], lon_cells - nearest[1]) * self.size_degrees
+        if distance <= self.tolerance_degrees:
+            return [(nearest, 1.0)]
+
+        lat_node, lon_node = floor(lat_cells), floor(lon_cells)
+        lat_fraction, lon_fraction = lat_cells - lat_node, lon_cells - lon_node
+        corners = [((lat_node, lon_node), (1 - lat_fraction) * (1 - lon_fraction)),
+                   ((lat_node + 1, lon_node), lat_fraction * (1 - lon_fraction)),
+                   ((lat_node, lon_node + 1), (1 - lat_fraction) * lon_fraction),
+                   ((lat_node + 1, lon_node + 1), lat_fraction * lon_fraction)]
+        return [(node, weight) for node, weight in corners if weight > 0]
+
+    def profile_per_kwp(self, latitude: float, longitude: float, pitch: float, azimuth_degrees: float,
+                        fetch: FetchPerKwp) -> np.ndarray:
+        weights = self.weights(latitude=latitude, longitude=longitude)
+        if len(weights) == 1:
+            return fetch(*self.node_coordinates(weights[0][0]), pitch, azimuth_degrees)
+        profile = sum(weight * fetch(*self.node_coordinates(node), pitch, azimuth_degrees)
+                      for node, weight in weights)
+        return profile
+
+    def profiles_for_sites(self, latitudes: Sequence[float], longitudes: Sequence[float], pitches: Sequence[float],
+                           azimuths_degrees: Sequence[float], fetch: FetchPerKwp) -> Tuple[np.ndarray, np.ndarray]:
+        """ Profiles for many sites at once, e.g. a street or town, in the form batch.Scenarios.from_options takes.
+        Returns one row per distinct blend and, for each site, the row to use"""
+        rows: Dict[Tuple, int] = {}
+        profiles = []
+        site_index = np.empty(len(latitudes), dtype=np.intp)
+        for i, (latitude, longitude, pitch, azimuth) in enumerate(zip(latitudes, longitudes, pitches,
+                                                                         azimuths_degrees)):
+            weights = self.weights(latitude=latitude, longitude=longitude)
+            key = (tuple(weights), pitch, azimuth)
+            if key not in rows:
+                rows[key] = len(profiles)
+                profiles.append(self.profile_per_kwp(latitude=latitude, longitude=longitude, pitch=pitch,
+                                                     azimuth_degrees=azimuth, fetch=fetch))
+            site_index[i] = rows[key]
+        return np.vstack(profiles), site_index
+
+
+DEFAULT_GRID = TileGrid()
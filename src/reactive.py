@@ -0,0 +1,84 @@
+""" Small dependency tracking so derived values are only recomputed when one of their inputs changes.
+
+Inputs (the envelope, heating system, solar install, tariffs) inherit from Tracked, which gives them a new stamp
+every time one of their attributes is assigned a different value. Values declared with @derived(...) remember the
+stamps of the inputs they were computed from and are reused until one of those stamps changes.
+"""
+import itertools
+from functools import reduce
+from typing import Any, Callable, Tuple
+
+_stamps = itertools.count()
+
+
+class Tracked:
+    """ Mixin that re-stamps the object whenever one of its attributes is assigned a different value"""
+
+    untracked_attributes: Tuple[str, ...] = ()  # e.g. cost overwrites, which nothing derived depends on
+
+    def __setattr__(self, name: str, value: Any):
+        unchanged = name in self.__dict__ and is_same_value(self.__dict__[name], value)
+        object.__setattr__(self, name, value)
+        if not unchanged and name not in self.untracked_attributes:
+            object.__setattr__(self, '_stamp', next(_stamps))
+
+
+def is_same_value(old: Any, new: Any) -> bool:
+    """ Only simple values are compared, anything else has to be the same object"""
+    if old is new:
+        return True
+    simple_types = (int, float, str, bool)
+    return isinstance(old, simple_types) and isinstance(new, simple_types) and old == new
+
+
+def state_key(value: Any) -> Any:
+    """ Something that compares equal for as long as value hasn't been changed"""
+    if isinstance(value, Tracked):
+        return 'stamp', value.__dict__.get('_stamp')
+    if isinstance(value, dict):
+        return tuple((key, state_key(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(state_key(item) for item in value)
+    try:
+        hash(value)
+    except TypeError:
+        return 'id', id(value)
+    return value
+
+
+class derived:
+    """ Like cached_property, but recomputed whenever one of the named inputs changes.
+
+    Inputs are attribute names on the instance, and can be dotted to reach into an attribute, e.g.
+    'orientation.azimuth_degrees'.
+    """
+
+    def __init__(self, *inputs: str):
+        self.inputs = inputs
+        self.func: Callable | None = None
+        self.name: str | None = None
+
+    def __call__(self, func: Callable) -> 'derived':
+        self.func = func
+        self.__doc__ = func.__doc__
+        return self
+
+    def __set_name__(self, owner, name: str):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        key = tuple(state_key(reduce(getattr, name.split('.'), instance)) for name in self.inputs)
+        # Write to __dict__ directly so caching never counts as a change to a Tracked instance
+        values = instance.__dict__.setdefault('_derived_values', {})
+        if self.name in values and values[self.name][0] == key:
+            return values[self.name][1]
+        value = self.func(instance)
+        values[self.name] = (key, value)
+        return value
+
+
+def clear_derived_values(instance):
+    """ Force everything derived on this instance to be recomputed next time it is asked for"""
+    instance.__dict__.pop('_derived_values', None)
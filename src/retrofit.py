@@ -1,10 +1,11 @@
-import copy
-from typing import List, Tuple
+from typing import List, Sequence, Tuple
 
 import pandas as pd
 import numpy as np
 
+from battery import Battery, BatterySpecs
 from building_model import House, HeatingSystem
+from constants import BatteryConstants
 from solar import Solar
 
 
@@ -47,20 +48,12 @@ class Retrofit:
 
 def upgrade_buildings(baseline_house: 'House', solar_install: 'Solar', upgrade_heating: 'HeatingSystem'
                       ) -> Tuple['House', 'House', 'House']:
+    """ Variants share the baseline's envelope, tariffs and unchanged results rather than copying them.
+    Do after modifications to the baseline so modifications flow through"""
 
-    hp_house = copy.deepcopy(baseline_house)  # do after modifications so modifications flow through
-    hp_house.clear_cost_overwrite()  # so that changes in baseline cost don't flow through into hp_house
-    hp_house.heating_system = upgrade_heating  # means that cost overwrites here do not persist
-    hp_house.clear_cached_properties()  # so that cached properties recalculated for this heating system
-
-    solar_house = copy.deepcopy(baseline_house)
-    solar_house.solar_install = solar_install
-    solar_house.clear_cached_properties()  # so that cached properties recalculated for this solar install
-
-    both_house = copy.deepcopy(hp_house)
-    both_house.clear_cost_overwrite()  # so that changes in baseline cost don't flow through into both_house
-    both_house.solar_install = solar_install
-    both_house.clear_cached_properties()  # so that cached properties recalculated for this solar install + hp system
+    hp_house = baseline_house.variant(heating_system=upgrade_heating)  # baseline cost overwrites don't carry over
+    solar_house = baseline_house.variant(solar_install=solar_install)
+    both_house = baseline_house.variant(heating_system=upgrade_heating, solar_install=solar_install)
 
     return solar_house, hp_house, both_house
 
@@ -73,6 +66,58 @@ def generate_all_retrofit_cases(baseline_house: 'House', solar_house: 'House', h
     return solar_retrofit, hp_retrofit, both_retrofit
 
 
+def battery_sizing_sweep(house: 'House', capacities_kwh: Sequence[float] = BatteryConstants.SIZING_SWEEP_KWH,
+                         round_trip_efficiency: float = BatteryConstants.ROUND_TRIP_EFFICIENCY,
+                         reserve_fraction: float = BatteryConstants.RESERVE_FRACTION) -> pd.DataFrame:
+    """ Bill, bill savings, solar self use, cost and simple payback of this house with a battery of each capacity,
+    compared with the house without one. One row per capacity.
+
+    Every size is dispatched against the house's own net electricity demand in one batched pass, rather than making
+    a House per size, so a full sweep is quick enough to rerun as inputs change. Only electricity is affected by a
+    battery so other fuels' bills are reused as they are.
+    """
+    batteries = [Battery(capacity_kwh=capacity_kwh, round_trip_efficiency=round_trip_efficiency,
+                         reserve_fraction=reserve_fraction) for capacity_kwh in capacities_kwh]
+    electricity = house.electricity_consumption_excluding_battery.overall
+    net_kwh = electricity.hourly_profile_kwh_array
+    # First row is without a battery, so the baseline is costed by exactly the same sums as each size
+    grid_kwh = BatterySpecs.from_batteries([None] + batteries).dispatch(
+        np.broadcast_to(net_kwh, (len(batteries) + 1, len(net_kwh))), steps_per_hour=electricity.steps_per_hour)
+
+    tariff = house.tariffs['electricity']
+    imported_kwh = np.maximum(grid_kwh, 0.0)
+    exported_kwh = imported_kwh - grid_kwh
+    if tariff.hourly_prices is None:
+        unit_cost_p = (imported_kwh.sum(axis=1) * tariff.p_per_unit_import
+                       - exported_kwh.sum(axis=1) * tariff.p_per_unit_export)
+    else:
+        prices = tariff.hourly_prices.at_resolution(electricity.steps_per_hour)
+        unit_cost_p = prices.import_cost_p(imported_kwh) - prices.export_income_p(exported_kwh)
+    other_fuel_bills = sum(bill for fuel_name, bill in house.annual_bill_per_fuel.items() if fuel_name != 'electricity')
+    bills = (electricity.days_in_year * tariff.p_per_day + unit_cost_p) / 100 + other_fuel_bills
+    total_annual_bill = bills[1:]
+    bill_savings_absolute = bills[0] - total_annual_bill
+
+    upfront_cost = np.array([battery.upfront_cost for battery in batteries], dtype=float)
+    payback = np.divide(upfront_cost, bill_savings_absolute, out=np.full(len(batteries), np.nan),
+                        where=bill_savings_absolute > 0)
+
+    generation_kwh = -house.solar_install.generation.overall.annual_sum_kwh
+    if generation_kwh > 0:
+        solar_used_kwh = electricity.annual_sum_kwh + generation_kwh - imported_kwh[1:].sum(axis=1)
+        percent_self_use_of_solar = solar_used_kwh / generation_kwh
+    else:
+        percent_self_use_of_solar = np.zeros(len(batteries))
+
+    results_df = pd.DataFrame(index=pd.Index(capacities_kwh, name='capacity_kwh', dtype=float),
+                              data={'total_annual_bill': total_annual_bill,
+                                    'bill_savings_absolute': bill_savings_absolute,
+                                    'percent_self_use_of_solar': percent_self_use_of_solar,
+                                    'upfront_cost': upfront_cost,
+                                    'simple_payback': payback})
+    return results_df
+
+
 def combine_results_dfs_multiple_houses(houses: List['House'], keys: List['str']):
     results_df = pd.concat([house.energy_and_bills_df for house in houses], keys=keys)
     results_df.index.names = ['Upgrade option', 'old_index']
@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from functools import cached_property
 import math
 from typing import List, Tuple, Optional
 
@@ -14,18 +15,20 @@ from place_search import place_search
 KM_TO_M = 1e3
 
 
-def shoelace(x_y) -> float:
-    """Calculate the area of an array of x,y points which form an arbitrary polygon"""
+def shoelace(x_y) -> float | np.ndarray:
+    """Calculate the area of an array of x,y points which form an arbitrary polygon.
+    A stacked array of shape (polygons, points, 2) gives one area per polygon"""
 
     """https://stackoverflow.com/questions/41077185/fastest-way-to-shoelace-formula"""
     x_y = np.array(x_y)
-    x_y = x_y.reshape(-1, 2)
+    if x_y.ndim != 3:
+        x_y = x_y.reshape(-1, 2)
 
-    x = x_y[:, 0]
-    y = x_y[:, 1]
+    x = x_y[..., 0]
+    y = x_y[..., 1]
 
-    s1 = np.sum(x * np.roll(y, -1))
-    s2 = np.sum(y * np.roll(x, -1))
+    s1 = np.sum(x * np.roll(y, -1, axis=-1), axis=-1)
+    s2 = np.sum(y * np.roll(x, -1, axis=-1), axis=-1)
 
     area = 0.5 * np.absolute(s1 - s2)
 
@@ -34,7 +37,16 @@ def shoelace(x_y) -> float:
 
 @dataclass
 class Polygon:
-    _points: List[List[float]]
+    """ Points are [lng, lat], with the first point repeated at the end to close the shape.
+    _points can also be a stacked array of shape (polygons, points, 2) for many polygons with the same number of
+    points, and then each geometry property gives an array with one value per polygon.
+    Geometry is worked out once and kept, so don't edit _points in place"""
+    _points: List[List[float]] | np.ndarray
+
+    def __eq__(self, other):
+        if not isinstance(other, Polygon):
+            return NotImplemented
+        return np.array_equal(self.lng_lat, other.lng_lat)
 
     @classmethod
     def make_zero_area_instance(cls):
@@ -42,49 +54,73 @@ class Polygon:
         _points = [default_point, default_point, default_point, default_point, default_point]
         return Polygon(_points)
 
+    @cached_property
+    def lng_lat(self) -> np.ndarray:
+        return np.asarray(self._points, dtype=float)
+
+    @property
+    def is_batch(self) -> bool:
+        return self.lng_lat.ndim == 3
+
     @property
-    def points(self) -> List[Tuple[float]]:
+    def points(self) -> List[Tuple[float]] | np.ndarray:
         """map returns lng lat for some reason, rather than lat long - so switch around here"""
+        if self.is_batch:
+            return self.lng_lat[..., ::-1]
         return [(lat, lng) for (lng, lat) in self._points]
 
+    @cached_property
+    def metres(self) -> np.ndarray:
+        """ Points relative to the first, in metres, projected once for all points.
+        Shape (points - 1, 2), or (polygons, points - 1, 2), as the point which closes the shape is dropped"""
+        lat = self.lng_lat[..., 1]
+        lng = self.lng_lat[..., 0]
+        start_lat = lat[..., :1]
+        lat_metres, lng_metres = self.lat_lng_to_metres(start_lat_lng=(start_lat, None),
+                                                        lat_lng=(lat - start_lat, lng - lng[..., :1]))
+        return np.stack([lat_metres, lng_metres], axis=-1)[..., :-1, :]
+
     @property
-    def dimensions(self) -> List[Tuple[float]]:
+    def dimensions(self) -> List[Tuple[float]] | np.ndarray:
         """Formats points as metres"""
-        points_in_relative_lat_lng = self.convert_points_to_be_relative_to_first(self.points)
-        points_in_relative_metres = [
-            self.lat_lng_to_metres(start_lat_lng=self.points[0], lat_lng=p) for p in points_in_relative_lat_lng
-        ]
-        points_in_relative_metres = points_in_relative_metres[:-1]  # drop the 5th point which closes the shape
-        return points_in_relative_metres
+        if self.is_batch:
+            return self.metres
+        return [tuple(point) for point in self.metres.tolist()]
 
-    @property
-    def area(self) -> float:
-        return shoelace(self.dimensions)
+    @cached_property
+    def area(self) -> float | np.ndarray:
+        return shoelace(self.metres)
+
+    @cached_property
+    def side_lengths_array(self) -> np.ndarray:
+        """ Starting with the side that closes the shape, from the last point back to the first"""
+        steps = self.metres - np.roll(self.metres, 1, axis=-2)
+        squares = np.square(steps)  # not ** 2, which can round differently to math on strided columns
+        return np.sqrt(squares[..., 0] + squares[..., 1])
 
     @property
-    def side_lengths(self):
-        side_lengths = []
-        for i in range(len(self.dimensions)):
-            next_dimension = self.dimensions[i + 1] if i + 1 < len(self.dimensions) else self.dimensions[0]
-            side_length = self.calculate_side_length(self.dimensions[i], next_dimension)
-            side_lengths.append(side_length)
-        side_lengths = [self.calculate_side_length(self.dimensions[i], self.dimensions[i + 1]) for i in
-                        range(-1, (len(self.dimensions) - 1))]
-        return side_lengths
+    def side_lengths(self) -> List[float] | np.ndarray:
+        if self.is_batch:
+            return self.side_lengths_array
+        return self.side_lengths_array.tolist()
+
+    @cached_property
+    def _average_opposite_side_lengths(self) -> Tuple[np.ndarray, np.ndarray]:
+        average_length_1 = (self.side_lengths_array[..., 0] + self.side_lengths_array[..., 2])/2
+        average_length_2 = (self.side_lengths_array[..., 1] + self.side_lengths_array[..., 3])/2
+        return average_length_1, average_length_2
 
     @property
-    def average_plan_height(self):
+    def average_plan_height(self) -> float | np.ndarray:
         """ Assume polygon is rectangular and is wider that it is tall. 'plan' because doesn't account for pitch"""
-        average_length_1 = (self.side_lengths[0] + self.side_lengths[2])/2
-        average_length_2 = (self.side_lengths[1] + self.side_lengths[3])/2
-        return min(average_length_1, average_length_2)
+        height = np.minimum(*self._average_opposite_side_lengths)
+        return height if self.is_batch else float(height)
 
     @property
-    def average_width(self):
+    def average_width(self) -> float | np.ndarray:
         """ Assume polygon is rectangular and is wider that it is tall."""
-        average_length_1 = (self.side_lengths[0] + self.side_lengths[2])/2
-        average_length_2 = (self.side_lengths[1] + self.side_lengths[3])/2
-        return max(average_length_1, average_length_2)
+        width = np.maximum(*self._average_opposite_side_lengths)
+        return width if self.is_batch else float(width)
 
     @staticmethod
     def convert_points_to_be_relative_to_first(points: List[Tuple]):
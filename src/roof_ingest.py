@@ -0,0 +1,251 @@
+""" Roof areas and panel counts for large files of footprints, e.g. every building outline in a city.
+
+Footprints are read one at a time from GeoJSON (a FeatureCollection, or one feature per line for .geojsonl/.ndjson
+files) or CSV (a WKT or GeoJSON geometry column), so files far bigger than memory are fine. They are worked through
+in chunks: areas, and panel counts for four-sided roofs, are computed for the whole chunk at once on stacked polygons,
+other shapes are packed with panel_packing on a process pool, and the results are appended to a CSV as each chunk
+finishes. Nothing is printed per roof.
+
+    python src/roof_ingest.py footprints.geojson results.csv --processes 8
+"""
+import argparse
+import csv
+import json
+import re
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, TextIO
+
+import numpy as np
+import pandas as pd
+
+import panel_packing
+from constants import SolarConstants
+from roof import Polygon
+
+CHUNK_SIZE = 4096  # footprints worked on together
+READ_SIZE = 1024 ** 2  # characters of GeoJSON read at a time
+LINE_DELIMITED_SUFFIXES = ('.geojsonl', '.geojsons', '.ndjson', '.jsonl')
+GEOMETRY_COLUMNS = ('geometry', 'wkt', 'WKT')
+
+
+@dataclass
+class Footprint:
+    id: str
+    rings: List[np.ndarray]  # outer ring of each part of the roof, closed, as (points, 2) of [lng, lat]
+    pitch: float = SolarConstants.ROOF_PITCH_DEGREES
+    azimuth_degrees: float = 0.0  # south facing unless the file says otherwise
+
+
+def read_footprints(path: Path | str) -> Iterator[Footprint]:
+    path = Path(path)
+    with open(path, newline='') as file:
+        if path.suffix.lower() == '.csv':
+            yield from iter_csv_footprints(file)
+            return
+        features = iter_line_delimited_features(file) if path.suffix.lower() in LINE_DELIMITED_SUFFIXES \
+            else iter_geojson_features(file)
+        for index, feature in enumerate(features):
+            yield footprint_from_feature(feature, index=index)
+
+
+def iter_geojson_features(file: TextIO) -> Iterator[dict]:
+    """ Features one at a time from a FeatureCollection, holding at most a little more than READ_SIZE of it"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    start = -1
+    while start < 0:  # find the opening bracket of the features list
+        chunk = file.read(READ_SIZE)
+        if not chunk:
+            return
+        buffer += chunk
+        match = re.search(r'"features"\s*:\s*\[', buffer)
+        start = match.end() if match else -1
+    position = start
+    while True:
+        while True:  # skip to the next feature
+            position = skip_separators(buffer, position)
+            if position < len(buffer):
+                break
+            chunk = file.read(READ_SIZE)
+            if not chunk:
+                raise ValueError("GeoJSON ended inside the features list")
+            buffer, position = buffer[position:] + chunk, 0
+        if buffer[position] == ']':
+            return
+        try:
+            feature, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = file.read(READ_SIZE)
+            if not chunk:
+                raise
+            buffer, position = buffer[position:] + chunk, 0  # feature continues in the next chunk
+            continue
+        yield feature
+        position = end
+
+
+def skip_separators(text: str, position: int) -> int:
+    while position < len(text) and (text[position].isspace() or text[position] == ','):
+        position += 1
+    return position
+
+
+def iter_line_delimited_features(file: TextIO) -> Iterator[dict]:
+    for line in file:
+        line = line.strip().lstrip('\x1e')  # GeoJSON text sequences start each feature with a record separator
+        if line:
+            yield json.loads(line)
+
+
+def footprint_from_feature(feature: dict, index: int) -> Footprint:
+    properties = feature.get('properties') or {}
+    footprint_id = feature.get('id', properties.get('id', index))
+    return Footprint(id=str(footprint_id),
+                     rings=rings_from_geometry(feature.get('geometry') or {}),
+                     pitch=float(properties.get('pitch', SolarConstants.ROOF_PITCH_DEGREES)),
+                     azimuth_degrees=float(properties.get('azimuth_degrees', 0.0)))
+
+
+def rings_from_geometry(geometry: dict) -> List[np.ndarray]:
+    """ Outer ring of each polygon. Holes are ignored, as are points and lines"""
+    if geometry.get('type') == 'Polygon':
+        polygons = [geometry['coordinates']]
+    elif geometry.get('type') == 'MultiPolygon':
+        polygons = geometry['coordinates']
+    else:
+        polygons = []
+    return [np.asarray(polygon[0], dtype=float)[:, :2] for polygon in polygons if polygon]
+
+
+def rings_from_wkt(text: str) -> List[np.ndarray]:
+    """ Outer ring of each polygon in a WKT POLYGON or MULTIPOLYGON"""
+    if not re.match(r'\s*(MULTI)?POLYGON', text, flags=re.IGNORECASE):
+        return []
+    body = text[text.index('('):]
+    rings = []
+    for polygon in re.split(r'\)\s*\)\s*,\s*\(\s*\(', body):
+        outer_ring = polygon.strip().lstrip('(').split(')')[0]
+        points = [point.split()[:2] for point in outer_ring.split(',')]
+        rings.append(np.array(points, dtype=float))
+    return rings
+
+
+def iter_csv_footprints(file: TextIO) -> Iterator[Footprint]:
+    """ Rows with a geometry (or wkt) column holding WKT or GeoJSON, and optional id, pitch and azimuth_degrees"""
+    csv.field_size_limit(max(csv.field_size_limit(), 64 * 1024 ** 2))  # outlines of big buildings are long
+    reader = csv.DictReader(file)
+    geometry_column = next((column for column in GEOMETRY_COLUMNS if column in (reader.fieldnames or [])), None)
+    if geometry_column is None:
+        raise ValueError(f"CSV needs one of the columns {GEOMETRY_COLUMNS}, got {reader.fieldnames}")
+    for index, row in enumerate(reader):
+        geometry = row[geometry_column].strip()
+        rings = rings_from_geometry(json.loads(geometry)) if geometry.startswith('{') else rings_from_wkt(geometry)
+        yield Footprint(id=row.get('id') or str(index),
+                        rings=rings,
+                        pitch=float(row.get('pitch') or SolarConstants.ROOF_PITCH_DEGREES),
+                        azimuth_degrees=float(row.get('azimuth_degrees') or 0.0))
+
+
+def panels_in_rectangles(average_widths: np.ndarray, roof_heights: np.ndarray) -> np.ndarray:
+    """ Solar.max_number_of_panels_in_a_rectangle for many roofs at once"""
+    big_roofs = roof_heights >= 2 * (SolarConstants.SMALL_PANEL_BORDER_M + SolarConstants.PANEL_HEIGHT_M)
+    border = np.where(big_roofs, SolarConstants.BIG_PANEL_BORDER_M, SolarConstants.SMALL_PANEL_BORDER_M)
+
+    def number_in_rectangles(side_1: np.ndarray, side_2: np.ndarray) -> np.ndarray:
+        rows_axis_1 = np.floor((side_1 - border) / SolarConstants.PANEL_WIDTH_M)
+        rows_axis_2 = np.floor((side_2 - border) / SolarConstants.PANEL_HEIGHT_M)
+        return np.where((side_1 < border) | (side_2 < border), 0, rows_axis_1 * rows_axis_2)
+
+    option_1 = number_in_rectangles(average_widths, roof_heights)
+    option_2 = number_in_rectangles(roof_heights, average_widths)
+    return np.maximum(option_1, option_2).astype(np.int32)
+
+
+def pack_ring(ring: np.ndarray, pitch: float, azimuth_degrees: float) -> int:
+    return panel_packing.pack_polygon(Polygon(ring), pitch=pitch, azimuth_degrees=azimuth_degrees).number_of_panels
+
+
+def assess_chunk(footprints: List[Footprint], executor: Executor | None = None) -> pd.DataFrame:
+    """ A row per footprint, summed over its parts, as Solar does over polygons"""
+    ring_footprints = np.array([i for i, footprint in enumerate(footprints) for _ in footprint.rings], dtype=np.int64)
+    rings = [ring for footprint in footprints for ring in footprint.rings]
+    pitches = np.array([footprints[i].pitch for i in ring_footprints], dtype=float)
+    # cos of each distinct pitch one at a time, so results match Solar to the last bit
+    unique_pitches, pitch_index = np.unique(pitches, return_inverse=True)
+    cos_pitches = np.array([np.cos(np.radians(pitch)) for pitch in unique_pitches])[pitch_index]
+
+    plan_areas = np.zeros(len(rings))
+    panels = np.zeros(len(rings), dtype=np.int32)
+    to_pack: List[int] = []
+    for length, ring_indices in group_by_length(rings).items():
+        if length < 4:  # not even a triangle once closed
+            continue
+        polygons = Polygon(np.stack([rings[i] for i in ring_indices]))
+        plan_areas[ring_indices] = polygons.area
+        if length == 5:  # four corners, counted with the side-length rule like Solar does
+            roof_heights = polygons.average_plan_height / cos_pitches[ring_indices]
+            panels[ring_indices] = panels_in_rectangles(polygons.average_width, roof_heights)
+        else:
+            to_pack.extend(ring_indices)
+
+    azimuths = [footprints[ring_footprints[i]].azimuth_degrees for i in to_pack]
+    arguments = ([rings[i] for i in to_pack], [pitches[i] for i in to_pack], azimuths)
+    packed = executor.map(pack_ring, *arguments, chunksize=64) if executor is not None else map(pack_ring, *arguments)
+    panels[to_pack] = list(packed)
+
+    plan_area_m2 = np.bincount(ring_footprints, weights=plan_areas, minlength=len(footprints))
+    roof_area_m2 = np.bincount(ring_footprints, weights=plan_areas / cos_pitches, minlength=len(footprints))
+    number_of_panels = np.bincount(ring_footprints, weights=panels, minlength=len(footprints)).astype(np.int32)
+    return pd.DataFrame({'id': [footprint.id for footprint in footprints],
+                         'plan_area_m2': plan_area_m2.round(2).astype(np.float32),
+                         'roof_area_m2': roof_area_m2.round(2).astype(np.float32),
+                         'number_of_panels': number_of_panels,
+                         'capacity_kwp': (number_of_panels * SolarConstants.KW_PEAK_PER_PANEL).astype(np.float32)})
+
+
+def group_by_length(rings: List[np.ndarray]) -> Dict[int, np.ndarray]:
+    lengths = np.array([len(ring) for ring in rings], dtype=np.int64)
+    return {int(length): np.flatnonzero(lengths == length) for length in np.unique(lengths)}
+
+
+def chunked(items: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def assess_footprints(footprints: Iterable[Footprint], processes: int | None = None,
+                      chunk_size: int = CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """ Yields a results table per chunk of footprints. processes=None packs in this process"""
+    if processes is None:
+        for chunk in chunked(footprints, chunk_size):
+            yield assess_chunk(chunk)
+        return
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        for chunk in chunked(footprints, chunk_size):
+            yield assess_chunk(chunk, executor=executor)
+
+
+def write_results(footprints_path: Path | str, results_path: Path | str, processes: int | None = None,
+                  chunk_size: int = CHUNK_SIZE) -> int:
+    """ Streams footprints in and results out, returning the number of footprints"""
+    count = 0
+    with open(results_path, 'w', newline='') as results_file:
+        for results in assess_footprints(read_footprints(footprints_path), processes=processes,
+                                         chunk_size=chunk_size):
+            results.to_csv(results_file, header=count == 0, index=False, float_format='%.2f')
+            count += len(results)
+    return count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('footprints', help="GeoJSON, line delimited GeoJSON or CSV of roof outlines")
+    parser.add_argument('results', help="CSV to write a row per footprint to")
+    parser.add_argument('--processes', type=int, default=None, help="pack non-rectangular roofs on this many")
+    args = parser.parse_args()
+    number_of_footprints = write_results(args.footprints, args.results, processes=args.processes)
+    print(f"Wrote {number_of_footprints} footprints to {args.results}")
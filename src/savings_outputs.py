@@ -5,6 +5,7 @@ import plotly.express as px
 import streamlit as st
 
 import house_questions
+import instrumentation
 import retrofit
 import solar_questions
 from building_model import *
@@ -25,6 +26,7 @@ def get_upgrade_heating_from_session_state_if_exists_or_create_default() -> Heat
 
 
 def render(house: "House", solar_install: "Solar", upgrade_heating: "HeatingSystem"):
+    generations_built_before = Solar.generations_built
     if "number_of_panels" not in st.session_state:
         st.session_state.number_of_panels = solar_install.number_of_panels
     if st.session_state.number_of_panels == 0:
@@ -41,6 +43,8 @@ def render(house: "House", solar_install: "Solar", upgrade_heating: "HeatingSyst
 
     render_results(house=house, hp_house=hp_house, solar_house=solar_house, both_house=both_house,
                    solar_retrofit=solar_retrofit, hp_retrofit=hp_retrofit, both_retrofit=both_retrofit)
+    # kept for the rerun rather than printed, so repeat builds can be checked without filling the log
+    st.session_state.generations_built_last_rerun = Solar.generations_built - generations_built_before
     return house, solar_house.solar_install, hp_house.heating_system
 
 
@@ -95,7 +99,7 @@ def render_heat_pump_overwrite_options(upgrade_heating: HeatingSystem) -> Heatin
         on_change=overwrite_upgrade_heating_efficiency_in_session_state)
 
     if st.session_state.upgrade_heating_efficiency_overwritten:
-        print("Behaves as if heating efficiency overwritten")
+        instrumentation.count('overwrite.heating_efficiency')
         upgrade_heating.efficiency = st.session_state.upgrade_heating_efficiency
         st.session_state.upgrade_heating_efficiency_overwritten = False
 
@@ -151,7 +155,7 @@ def render_upfront_cost_overwrite_options(house: House, solar_house: House, hp_h
     )
 
     if st.session_state.solar_cost_overwritten:
-        print("Behaves as if solar cost overwritten")
+        instrumentation.count('overwrite.solar_cost')
         solar_house.solar_install.upfront_cost = st.session_state.solar_cost
         both_house.solar_install.upfront_cost = st.session_state.solar_cost
         st.session_state.solar_cost_overwritten = False
@@ -198,7 +202,7 @@ def render_upfront_cost_overwrite_options(house: House, solar_house: House, hp_h
     )
 
     if st.session_state.heat_pump_cost_overwritten:
-        print("Behaves as if heating cost overwritten")
+        instrumentation.count('overwrite.heat_pump_cost')
         hp_house.heating_system_upfront_cost = st.session_state.heat_pump_cost
         both_house.heating_system_upfront_cost = st.session_state.heat_pump_cost
         st.session_state.heat_pump_cost_overwritten = False
@@ -239,7 +243,7 @@ def render_grant_overwrite_options(hp_house: House, both_house: House) -> Tuple[
     )
 
     if st.session_state.heat_pump_grant_value_overwritten:
-        print("Behaves as if heat pump grant overwritten")
+        instrumentation.count('overwrite.heat_pump_grant')
         hp_house.heating_system.grant = st.session_state.heat_pump_grant_value
         both_house.heating_system.grant = st.session_state.heat_pump_grant_value
         st.session_state.heat_pump_grant_value_overwritten = False
@@ -255,6 +259,13 @@ def flag_that_heat_pump_grant_value_overwritten():
 def render_results(house: House, solar_house: House, hp_house: House, both_house: House,
                    solar_retrofit: retrofit.Retrofit, hp_retrofit: retrofit.Retrofit,
                    both_retrofit: retrofit.Retrofit):
+    if solar_house.solar_install.generation_uses_synthetic_weather:
+        st.warning(
+            "We couldn't reach PVGIS, the EU's solar data service, so solar generation is estimated from typical UK"
+            " weather rather than measured weather for your roof. Treat the solar savings as a rough guide and try"
+            " again later for a better estimate."
+        )
+
     # Combine results all variables
     results_df = retrofit.combine_results_dfs_multiple_houses(
         [both_house, hp_house, solar_house, house],
@@ -509,6 +520,7 @@ def produce_self_use_sentence(house: 'House') -> str:
     return extra
 
 
+@instrumentation.timed('chart.build')
 def render_savings_chart(results_df: pd.DataFrame, x_variable: str):
     bills_fig = px.bar(results_df,
                        x=x_variable,
@@ -1,18 +1,39 @@
-from functools import cache
+import copy
+from functools import partial
 from math import floor
-from typing import List
+from typing import List, Tuple
 
 import numpy as np
 import pandas as pd
 import requests
 
 import constants
+import instrumentation
+import panel_packing
+import pv_model
+import pvgis
+import pvgis_cache
+import pvgis_tiles
+from bounded_cache import bounded_cache
 from constants import SolarConstants, Orientation
 from consumption import Consumption
+from reactive import Tracked, derived
 from roof import Polygon
 
+# In-memory profiles, in front of the disk cache. A single year for 1kWp is 70kB, so this holds ~900 sites
+PROFILE_CACHE_MAX_BYTES = 64 * 1024 ** 2
+PROFILE_CACHE_TTL_SECONDS = 24 * 60 * 60  # re-read from the disk cache daily rather than pinning old entries
 
-class Solar:
+# Everything generation depends on, so it is rebuilt only when one of these changes
+GENERATION_INPUTS = ('number_of_panels', 'kwp_per_panel', 'orientation.azimuth_degrees', 'pitch', 'polygons',
+                     'latitude', 'longitude', 'tile_grid', 'ensemble_years', 'ensemble_year')
+
+
+class Solar(Tracked):
+
+    # don't change generation, or are worked out along with it
+    untracked_attributes = ('_upfront_cost', '_generation_uses_synthetic_weather')
+    generations_built = 0  # across all installs in this process, to check reruns reuse generation
 
     def __init__(self, orientation: Orientation, polygons: List[Polygon],
                  pitch: float = SolarConstants.ROOF_PITCH_DEGREES):
@@ -36,24 +57,16 @@ class Solar:
 
         self.lifetime = SolarConstants.LIFETIME
 
-        self._upfront_cost: int | None = None  # to help with overwrites
+        # None requests this exact site. Portfolio runs can set e.g. pvgis_tiles.DEFAULT_GRID to share generation
+        # with nearby sites
+        self.tile_grid: pvgis_tiles.TileGrid | None = None
+        self._generation_uses_synthetic_weather = False
+        # Set to e.g. SolarConstants.ENSEMBLE_YEARS to use the mean of those years instead of API_YEAR.
+        # ensemble_year then picks out a single year of the range instead of the mean
+        self.ensemble_years: Tuple[int, int] | None = None
+        self.ensemble_year: int | None = None
 
-    def __hash__(self):
-        return hash((self.latitude,
-                     self.longitude,
-                     self.pitch,
-                     self.peak_capacity_kw_out_per_kw_in_per_m2,
-                     self.orientation.azimuth_degrees
-                     ))
-
-    def __eq__(self, other: 'Solar'):
-        result = (self.latitude == other.latitude
-                  and self.longitude == other.longitude
-                  and self.pitch == other.pitch
-                  and self.peak_capacity_kw_out_per_kw_in_per_m2 == other.peak_capacity_kw_out_per_kw_in_per_m2
-                  and self.orientation.azimuth_degrees == other.orientation.azimuth_degrees
-                  )
-        return result
+        self._upfront_cost: int | None = None  # to help with overwrites
 
     @classmethod
     def create_zero_area_instance(cls):
@@ -102,17 +115,17 @@ class Solar:
         numbers = []
         for polygon in self.polygons:
             if len(polygon.dimensions) != 4:  # if not roughly rectangular
-                print("Calculated based on area")
-                number_this_polygon = self.get_number_of_panels_from_polygon_area(polygon)
+                instrumentation.count('panels.packed')
+                number_this_polygon = self.pack_panels_onto_polygon(polygon).number_of_panels
             else:
-                print("Calculated based on side lengths")
+                instrumentation.count('panels.side_length_rule')
                 number_this_polygon = self.max_number_of_panels_in_a_rectangle(polygon)
             numbers.append(number_this_polygon)
-        print(f"number this polygon: {number_this_polygon}")
-        all_panels = sum(numbers)
-        print(f"number all polygons: {all_panels}")
-        print(f"number based on area: {self.get_number_of_panels_from_polygon_area(polygon)}")
-        return all_panels
+        return sum(numbers)
+
+    def pack_panels_onto_polygon(self, polygon: Polygon) -> panel_packing.Packing:
+        """ Panel count and where each panel goes, for any shape of roof"""
+        return panel_packing.pack_polygon(polygon, pitch=self.pitch, azimuth_degrees=self.orientation.azimuth_degrees)
 
     def get_number_of_panels_from_polygon_area(self, polygon: Polygon) -> int:
         """ Very simplified assumptions to fall back on when shape not roughly rectangular"""
@@ -124,18 +137,13 @@ class Solar:
     def max_number_of_panels_in_a_rectangle(self, polygon) -> int:
         """ Assume shape is rectangular. Try panels in either orientation"""
         roof_height = self.convert_plan_value_to_value_along_pitch(polygon.average_plan_height)
-        print(f"roof height = {roof_height}, roof_width = {polygon.average_width}")
         # Typically, installers leave a bigger border on big roofs. Increase border if fit more than 2 rows height-wise
         if roof_height >= 2 * (SolarConstants.SMALL_PANEL_BORDER_M + SolarConstants.PANEL_HEIGHT_M):
             border_to_use = SolarConstants.BIG_PANEL_BORDER_M
-            print("Using big border")
         else:
             border_to_use = SolarConstants.SMALL_PANEL_BORDER_M
-            print("Using small border")
-        print("long side up roof")
         option_1 = self.number_of_panels_in_rectangle(side_1=polygon.average_width, side_2=roof_height,
                                                       border=border_to_use)
-        print("short side up roof")
         option_2 = self.number_of_panels_in_rectangle(side_1=roof_height, side_2=polygon.average_width,
                                                       border=border_to_use)
         number = max(option_1, option_2)
@@ -149,7 +157,6 @@ class Solar:
             rows_axis_1 = floor((side_1 - border) / SolarConstants.PANEL_WIDTH_M)
             rows_axis_2 = floor((side_2 - border) / SolarConstants.PANEL_HEIGHT_M)
             number = rows_axis_1 * rows_axis_2
-            print(f"{rows_axis_1} by {rows_axis_2}")
         return number
 
     @property
@@ -161,52 +168,162 @@ class Solar:
         """ The nominal output capacity of the system when there is 1kW/m2 of irradiance on the panel"""
         return self.number_of_panels * self.kwp_per_panel
 
-    @property
-    def generation(self):
+    @derived(*GENERATION_INPUTS)
+    def generation(self) -> Consumption:
+        """ Shared by everything that asks for it until an input changes, so don't modify it in place"""
+        Solar.generations_built += 1
+        instrumentation.count('solar.generation_built')
         if self.peak_capacity_kw_out_per_kw_in_per_m2 > 0:
             profile_kwh = self.get_hourly_radiation_from_eu_api()
             profile_kwh.index = constants.BASE_YEAR_HOURLY_INDEX
         else:
             profile_kwh = pd.Series(index=constants.BASE_YEAR_HOURLY_INDEX, data=0)
+            self._generation_uses_synthetic_weather = False
         # set negative as generation not consumption
         profile_kwh_negative = profile_kwh * -1
         generation = Consumption(hourly_profile_kwh=profile_kwh_negative, fuel=constants.ELECTRICITY)
         return generation
 
-    @cache
+    @property
+    def generation_uses_synthetic_weather(self) -> bool:
+        """ True if PVGIS couldn't be reached and the local model had no measured weather, so generation is only
+        a rough guide"""
+        _ = self.generation  # worked out while generation is built
+        return self._generation_uses_synthetic_weather
+
+    @instrumentation.timed('solar.profile_scaling')
     def get_hourly_radiation_from_eu_api(self) -> pd.Series:
-        """ Returns series of 8760 of average solar pv power for that hour in kW. Index 0 to 8759"""
-        # API Documentation here: https://joint-research-centre.ec.europa.eu/
-        #   pvgis-photovoltaic-geographical-information-system/getting-started-pvgis/api-non-interactive-service_en
-        # Limit of 30 calls per second
-
-        tool_name = 'seriescalc'
-        api_url = f'https://re.jrc.ec.europa.eu/api/v5_2/{tool_name}'
-
-        params = {'lat': self.latitude,
-                  'lon': self.longitude,
-                  'startyear': SolarConstants.API_YEAR,  # just take one year for now
-                  'endyear': SolarConstants.API_YEAR,
-                  'pvcalculation': 1,  # estimate hourly PV production
-                  'peakpower': self.peak_capacity_kw_out_per_kw_in_per_m2,  # installed capacity
-                  'mountingplace': "building",
-                  'loss': SolarConstants.SYSTEM_LOSS,
-                  'angle': self.pitch,
-                  'aspect': self.orientation.azimuth_degrees,
-                  'outputformat': "json"
-                  }
-        print("making api call")
-        response = requests.get(api_url, params=params)
-
-        if response.status_code == 200:
-            dictr = response.json()
-            df = pd.DataFrame(dictr['outputs']['hourly'])
-            # can add timeseries as index later if needed
-            pv_power_kw = df['P'] / 1000  # source data in W so convert to kW
-            pv_power_kw.index = constants.BASE_YEAR_HOURLY_INDEX
+        """ Returns series of 8760 of average solar pv power for that hour in kW.
+        Scaled from the cached output of 1kWp at this site, as PVGIS output is linear in peak power"""
+        self._generation_uses_synthetic_weather = False
+        if self.ensemble_years is None:
+            fallback_weather = []
+            per_kwp = self.get_per_kwp_at_site(fetch=partial(get_hourly_generation_per_kwp,
+                                                             fallback_weather=fallback_weather))
+            self._generation_uses_synthetic_weather = any(weather.synthetic for weather in fallback_weather)
+        elif self.ensemble_year is None:
+            per_kwp = self.get_hourly_generation_per_kwp_per_year().mean(axis=0, dtype=np.float64)
         else:
-            print(response.status_code)
-            print(response.text)
-            raise requests.ConnectionError
-
+            assert self.ensemble_year in self.solar_years, f"{self.ensemble_year} isn't in {self.ensemble_years}"
+            per_year = self.get_hourly_generation_per_kwp_per_year()
+            per_kwp = per_year[self.ensemble_year - self.ensemble_years[0]].astype(np.float64)
+        pv_power_kw = pd.Series(per_kwp * self.peak_capacity_kw_out_per_kw_in_per_m2,
+                                index=constants.BASE_YEAR_HOURLY_INDEX)
         return pv_power_kw
+
+    def get_per_kwp_at_site(self, fetch: pvgis_tiles.FetchPerKwp) -> np.ndarray:
+        if self.tile_grid is None:
+            return fetch(self.latitude, self.longitude, self.pitch, self.orientation.azimuth_degrees)
+        return self.tile_grid.profile_per_kwp(latitude=self.latitude,
+                                              longitude=self.longitude,
+                                              pitch=self.pitch,
+                                              azimuth_degrees=self.orientation.azimuth_degrees,
+                                              fetch=fetch)
+
+    @property
+    def solar_years(self) -> List[int]:
+        """ Years generation can be reported for, empty unless ensemble_years is set"""
+        if self.ensemble_years is None:
+            return []
+        return list(range(self.ensemble_years[0], self.ensemble_years[1] + 1))
+
+    def get_hourly_generation_per_kwp_per_year(self) -> np.ndarray:
+        """ float32 array of years x 8760 in kW for 1kWp, all from a single request"""
+        start_year, end_year = self.ensemble_years
+        return self.get_per_kwp_at_site(
+            fetch=lambda *site: get_hourly_generation_per_kwp_per_year_from_eu_api(*site, start_year, end_year))
+
+    @property
+    def annual_generation_per_year_kwh(self) -> pd.Series:
+        annual_per_kwp = self.get_hourly_generation_per_kwp_per_year().sum(axis=1, dtype=np.float64)
+        return pd.Series(annual_per_kwp * self.peak_capacity_kw_out_per_kw_in_per_m2, index=self.solar_years)
+
+    def for_ensemble_year(self, year: int) -> 'Solar':
+        """ Copy of this install that generates as it would have in that year"""
+        solar_install = copy.copy(self)
+        # own copy, so generation for the year doesn't overwrite the mean year cached on this install
+        solar_install._derived_values = dict(self.__dict__.get('_derived_values', {}))
+        solar_install.ensemble_year = year
+        return solar_install
+
+
+def get_hourly_generation_per_kwp(latitude: float, longitude: float, pitch: float, azimuth_degrees: float,
+                                  fallback_weather: List[pv_model.Weather] | None = None) -> np.ndarray:
+    """ From PVGIS, or from the local PV model if PVGIS can't be reached or is still overloaded once retries run out.
+    Any other refusal, e.g. a 400 for a site outside PVGIS's coverage, is raised.
+    The weather the local model used is appended to fallback_weather, if given.
+    The fallback isn't put in the PVGIS profile caches, so PVGIS is tried again the next time a profile is needed for
+    the site. Solar.generation built from it does keep it, like any other generation, until one of the install's
+    inputs changes"""
+    try:
+        return get_hourly_generation_per_kwp_from_eu_api(latitude, longitude, pitch, azimuth_degrees)
+    except (requests.ConnectionError, requests.Timeout) as error:
+        if error.response is not None and error.response.status_code not in pvgis.RETRY_STATUS_CODES:
+            raise
+        instrumentation.count('pvgis.fallback')
+        weather = pv_model.get_default_weather()
+        if fallback_weather is not None:
+            fallback_weather.append(weather)
+        per_kwp = pv_model.generation_per_kwp([latitude], [longitude], [pitch], [azimuth_degrees], weather=weather)[0]
+        per_kwp.setflags(write=False)
+        return per_kwp
+
+
+@bounded_cache(max_bytes=PROFILE_CACHE_MAX_BYTES, ttl_seconds=PROFILE_CACHE_TTL_SECONDS)
+def get_hourly_generation_per_kwp_from_eu_api(latitude: float, longitude: float, pitch: float,
+                                              azimuth_degrees: float) -> np.ndarray:
+    """ Returns array of 8760 of average solar pv power for that hour in kW, for 1kWp installed at the site.
+    Read only, as the same array is handed to every install at the site"""
+    params = make_pvgis_params(latitude=latitude, longitude=longitude, pitch=pitch, azimuth_degrees=azimuth_degrees)
+    # Persistent cache shared across processes and restarts, in front of the slow network call
+    disk_cache = pvgis_cache.get_default_cache()
+    pv_power_kw = disk_cache.get(params)
+
+    if pv_power_kw is None:
+        with instrumentation.span('pvgis.fetch'):
+            response_json = pvgis.get_default_client().get_json(params)
+        pv_power_kw = pvgis.hourly_power_kw(response_json)
+        disk_cache.put(params, pv_power_kw)
+
+    pv_power_kw.setflags(write=False)
+    return pv_power_kw
+
+
+@bounded_cache(max_bytes=PROFILE_CACHE_MAX_BYTES, ttl_seconds=PROFILE_CACHE_TTL_SECONDS)
+def get_hourly_generation_per_kwp_per_year_from_eu_api(latitude: float, longitude: float, pitch: float,
+                                                       azimuth_degrees: float, start_year: int, end_year: int
+                                                       ) -> np.ndarray:
+    """ Returns float32 array of years x 8760 of kW for 1kWp installed at the site, from one request for all the
+    years. Stored as float32 to halve the size of the ensemble, which is plenty of precision for kW. Read only"""
+    params = make_pvgis_params(latitude=latitude, longitude=longitude, pitch=pitch, azimuth_degrees=azimuth_degrees,
+                               start_year=start_year, end_year=end_year)
+    disk_cache = pvgis_cache.get_default_cache()
+    pv_power_kw = disk_cache.get(params)
+
+    if pv_power_kw is None:
+        with instrumentation.span('pvgis.fetch'):
+            response_json = pvgis.get_default_client().get_json(params)
+        pv_power_kw = pvgis.hourly_power_kw_per_year(response_json)
+        disk_cache.put(params, pv_power_kw)
+
+    pv_power_kw = pv_power_kw.reshape(end_year - start_year + 1, 8760)
+    pv_power_kw.setflags(write=False)
+    return pv_power_kw
+
+
+def make_pvgis_params(latitude: float, longitude: float, pitch: float, azimuth_degrees: float,
+                      start_year: int = SolarConstants.API_YEAR, end_year: int = SolarConstants.API_YEAR) -> dict:
+    """ PVGIS seriescalc request for 1kWp at the site, in canonical form so it can be used as a cache key"""
+    params = {'lat': latitude,
+              'lon': longitude,
+              'startyear': start_year,  # one year unless a range is asked for
+              'endyear': end_year,
+              'pvcalculation': 1,  # estimate hourly PV production
+              'peakpower': 1,  # installed capacity, scaled to the real capacity afterwards
+              'mountingplace': "building",
+              'loss': SolarConstants.SYSTEM_LOSS,
+              'angle': pitch,
+              'aspect': azimuth_degrees,
+              'outputformat': "json"
+              }
+    return pvgis_cache.canonical_params(params)
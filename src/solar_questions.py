@@ -3,6 +3,7 @@ import streamlit as st
 from typing import Optional, List
 
 from constants import SolarConstants, CLASS_NAME_OF_SIDEBAR_DIV
+import instrumentation
 import roof
 from solar import Solar
 
@@ -33,12 +34,11 @@ def render(solar_install: Solar) -> "Solar":
 
     # if polygons changed (figure out how to persist polygons when page changes)
     if polygons != solar_install.polygons:
-        print("Setting up solar install based on polygons")
+        instrumentation.count('solar.set_up_from_polygons')
         solar_install = Solar(orientation=orientation, polygons=polygons)
         st.session_state.number_of_panels = solar_install.number_of_panels
         st.session_state.number_of_panels_defined_by_dropdown = False
     else:
-        print("Not changing default solar install as no polygons drawn")
         solar_install.orientation = orientation  # in case orientation changed
 
     solar_install = render_solar_assumptions_sidebar(solar_install)
@@ -105,8 +105,7 @@ def render_solar_overwrite_options(solar_install: "Solar"):
     if st.session_state.number_of_panels_overwritten:
         solar_install.number_of_panels = st.session_state.number_of_panels
         write_solar_cost_to_session_state(solar_install)
-        print(f"Behaves as if number of panels changed to {solar_install.number_of_panels} and overwrite flag set to"
-              f"{solar_install.number_of_panels_has_been_overwritten}")
+        instrumentation.count('overwrite.number_of_panels')
         st.session_state.number_of_panels_overwritten = False
 
     if "kwp_per_panel" not in st.session_state:
@@ -123,7 +122,7 @@ def render_solar_overwrite_options(solar_install: "Solar"):
         help="Older panels typically had a capacity of 0.3kW/panel, but newer panels are bigger:  around 0.4kW/panel")
 
     if st.session_state.kwp_per_panel_overwritten:
-        print("Behaves as if kWp of panels changed")
+        instrumentation.count('overwrite.kwp_per_panel')
         solar_install.kwp_per_panel = st.session_state.kwp_per_panel
         st.session_state.kwp_per_panel_overwritten = False
         write_solar_cost_to_session_state(solar_install)
@@ -135,9 +134,7 @@ def render_solar_overwrite_options(solar_install: "Solar"):
 
 def overwrite_number_of_panels_in_session_state():
     st.session_state.number_of_panels_defined_by_dropdown = True
-    print(st.session_state.number_of_panels_overwrite)
     st.session_state.number_of_panels = st.session_state.number_of_panels_overwrite
-    print(st.session_state.number_of_panels)
     st.session_state.number_of_panels_overwritten = True
 
 
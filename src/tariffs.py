@@ -0,0 +1,120 @@
+""" Tariffs whose unit rates change hour by hour: Economy 7, Flux, or a file of prices such as Agile's.
+
+HourlyPrices holds a read-only import and export rate for every hour (or half hour) of the base year, and costs are
+dot products of those rates with the hourly imports and exports. A (houses x hours) array of imports is costed
+against the same rates in one matrix product. Rates are resampled once to the resolution of the consumption they
+cost, rather than resampling the consumption. Price files are read once per process and the same HourlyPrices is
+handed to every Tariff that uses them.
+"""
+from dataclasses import dataclass
+from functools import cache
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+import constants
+from consumption import resample_rates, steps_per_hour_of
+
+ECONOMY_7_NIGHT_HOURS = range(0, 7)  # really 00:30 to 07:30 GMT, so as near as hours get
+FLUX_OFF_PEAK_HOURS = range(2, 5)
+FLUX_PEAK_HOURS = range(16, 19)
+
+# Rough rates in p/kWh, late 2022, for when none are given
+ECONOMY_7_DAY_P_PER_KWH = 38.0
+ECONOMY_7_NIGHT_P_PER_KWH = 17.0
+FLUX_IMPORT_P_PER_KWH = {'off_peak': 21.0, 'day': 35.0, 'peak': 49.0}
+FLUX_EXPORT_P_PER_KWH = {'off_peak': 8.0, 'day': 23.0, 'peak': 36.0}
+
+
+@dataclass(eq=False)  # compared by identity, so tariffs sharing prices never compare arrays
+class HourlyPrices:
+    name: str
+    import_p_per_unit: np.ndarray  # one per hour, or half hour, of the base year
+    export_p_per_unit: np.ndarray
+
+    def __post_init__(self):
+        hours = len(constants.BASE_YEAR_HOURLY_INDEX)
+        steps = [hours * steps_per_hour for steps_per_hour in constants.FREQUENCIES]
+        for attribute in ('import_p_per_unit', 'export_p_per_unit'):
+            prices = np.array(getattr(self, attribute), dtype=np.float64)  # own copy, so it can be made read only
+            if prices.ndim != 1 or len(prices) not in steps:
+                raise ValueError(f"{attribute} of {self.name} must have a price for each of the {hours} hours or "
+                                 f"{2 * hours} half hours, got shape {prices.shape}")
+            prices.setflags(write=False)
+            setattr(self, attribute, prices)
+        if len(self.import_p_per_unit) != len(self.export_p_per_unit):
+            raise ValueError(f"Import and export prices of {self.name} must be at the same resolution")
+        self.steps_per_hour = steps_per_hour_of(len(self.import_p_per_unit))
+        self._resampled = {self.steps_per_hour: self}
+
+    def at_resolution(self, steps_per_hour: int) -> 'HourlyPrices':
+        """ The same prices for consumption with steps_per_hour values an hour. Made once and then shared"""
+        if steps_per_hour not in self._resampled:
+            self._resampled[steps_per_hour] = HourlyPrices(
+                name=self.name,
+                import_p_per_unit=resample_rates(self.import_p_per_unit, self.steps_per_hour, steps_per_hour),
+                export_p_per_unit=resample_rates(self.export_p_per_unit, self.steps_per_hour, steps_per_hour))
+        return self._resampled[steps_per_hour]
+
+    def import_cost_p(self, imported_fuel_units: np.ndarray) -> float | np.ndarray:
+        """ Pence for a year of imports, or for each row of a (houses x hours) array, at the prices' resolution"""
+        return np.asarray(imported_fuel_units) @ self.import_p_per_unit
+
+    def export_income_p(self, exported_fuel_units: np.ndarray) -> float | np.ndarray:
+        return np.asarray(exported_fuel_units) @ self.export_p_per_unit
+
+    @classmethod
+    def from_daily_rates(cls, name: str, import_p_by_hour: Iterable[float], export_p_by_hour: Iterable[float]
+                         ) -> 'HourlyPrices':
+        """ The same 24 rates every day, from midnight"""
+        hour_of_day = constants.BASE_YEAR_HOURLY_INDEX.hour
+        return cls(name=name,
+                   import_p_per_unit=np.asarray(list(import_p_by_hour), dtype=np.float64)[hour_of_day],
+                   export_p_per_unit=np.asarray(list(export_p_by_hour), dtype=np.float64)[hour_of_day])
+
+
+def economy_7(day_p: float = ECONOMY_7_DAY_P_PER_KWH, night_p: float = ECONOMY_7_NIGHT_P_PER_KWH,
+              export_p: float = constants.STANDARD_TARIFF.p_per_kwh_elec_export,
+              night_hours: Iterable[int] = ECONOMY_7_NIGHT_HOURS) -> HourlyPrices:
+    night_hours = set(night_hours)
+    return HourlyPrices.from_daily_rates(name="Economy 7",
+                                         import_p_by_hour=[night_p if hour in night_hours else day_p
+                                                           for hour in range(24)],
+                                         export_p_by_hour=[export_p] * 24)
+
+
+def flux(import_p: dict = None, export_p: dict = None) -> HourlyPrices:
+    """ Cheap overnight, dear in the early evening peak, for both imports and exports. Rates are keyed by
+    'off_peak', 'day' and 'peak'"""
+    import_p = import_p or FLUX_IMPORT_P_PER_KWH
+    export_p = export_p or FLUX_EXPORT_P_PER_KWH
+    periods = ['off_peak' if hour in FLUX_OFF_PEAK_HOURS else 'peak' if hour in FLUX_PEAK_HOURS else 'day'
+               for hour in range(24)]
+    return HourlyPrices.from_daily_rates(name="Flux",
+                                         import_p_by_hour=[import_p[period] for period in periods],
+                                         export_p_by_hour=[export_p[period] for period in periods])
+
+
+def load_price_file(path: Path | str) -> HourlyPrices:
+    """ Prices from a CSV of start time, import_p_per_kwh and optionally export_p_per_kwh, for one whole year.
+
+    Hourly or half-hourly (e.g. Agile) prices are kept at the file's resolution. 29th February is dropped so any year
+    lines up with the base year. Each file is only read once, unless it changes on disk.
+    """
+    path = Path(path).resolve()
+    return _load_price_file(path, path.stat().st_mtime_ns)
+
+
+@cache
+def _load_price_file(path: Path, modified_ns: int) -> HourlyPrices:
+    prices = pd.read_csv(path, index_col=0, parse_dates=True)
+    if 'import_p_per_kwh' not in prices.columns:
+        raise ValueError(f"{path} needs an import_p_per_kwh column, got {list(prices.columns)}")
+    if 'export_p_per_kwh' not in prices.columns:
+        prices['export_p_per_kwh'] = 0.0
+    prices = prices[~((prices.index.month == 2) & (prices.index.day == 29))]
+    return HourlyPrices(name=path.stem,
+                        import_p_per_unit=prices['import_p_per_kwh'].to_numpy(),
+                        export_p_per_unit=prices['export_p_per_kwh'].to_numpy())
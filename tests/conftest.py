@@ -0,0 +1,45 @@
+""" Tests talk to a local PVGIS stub unless PVGIS_LIVE is set, so they run offline and repeatably.
+
+Tests that check values only the real API gives are marked @pytest.mark.live and skipped against the stub.
+"""
+import os
+
+import pytest
+
+from .context import src
+from src import pvgis, pvgis_cache, pvgis_stub
+
+LIVE_ENVIRONMENT_VARIABLE = 'PVGIS_LIVE'
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', "live: needs the real PVGIS API, only run when PVGIS_LIVE is set")
+
+
+def pytest_collection_modifyitems(config, items):
+    if os.environ.get(LIVE_ENVIRONMENT_VARIABLE):
+        return
+    skip_live = pytest.mark.skip(reason="needs the real PVGIS API, set PVGIS_LIVE=1 to run")
+    for item in items:
+        if 'live' in item.keywords:
+            item.add_marker(skip_live)
+
+
+@pytest.fixture(scope='session', autouse=True)
+def pvgis_api(tmp_path_factory):
+    """ Fresh disk cache for the session, and the stub in place of the real API unless running live"""
+    original = {name: os.environ.get(name)
+                for name in (pvgis.API_URL_ENVIRONMENT_VARIABLE, pvgis_cache.PATH_ENVIRONMENT_VARIABLE)}
+    os.environ[pvgis_cache.PATH_ENVIRONMENT_VARIABLE] = str(tmp_path_factory.mktemp('pvgis') / 'cache.sqlite')
+    server = None
+    if not os.environ.get(LIVE_ENVIRONMENT_VARIABLE):
+        server = pvgis_stub.PVGISStubServer(mode='synthesize').start()
+        os.environ[pvgis.API_URL_ENVIRONMENT_VARIABLE] = server.url
+    yield server
+    if server is not None:
+        server.stop()
+    for name, value in original.items():
+        if value is None:
+            os.environ.pop(name, None)
+        else:
+            os.environ[name] = value
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+from .context import src
+from src import batch, building_model, constants, retrofit
+
+
+def make_solar_house(envelope, heating_name: str, monkeypatch):
+    """ Solar house with a made up generation profile so the test doesn't need the PVGIS API"""
+    hour_of_day = constants.BASE_YEAR_HOURLY_INDEX.hour
+    generation_kw = pd.Series(index=constants.BASE_YEAR_HOURLY_INDEX,
+                              data=np.clip(np.sin((hour_of_day - 6) * np.pi / 12), 0, None) * 1.5)
+    solar_install = building_model.Solar.create_zero_area_instance()
+    solar_install.number_of_panels = 8
+    monkeypatch.setattr(type(solar_install), 'get_hourly_radiation_from_eu_api', lambda self: generation_kw.copy())
+    house = building_model.House.set_up_from_heating_name(envelope=envelope, heating_name=heating_name)
+    return house.variant(solar_install=solar_install)
+
+
+def test_batch_matches_house_and_retrofit(monkeypatch):
+    houses = []
+    for building_type in constants.BUILDING_TYPE_OPTIONS:
+        envelope = building_model.BuildingEnvelope.from_building_type_constants(
+            constants.BUILDING_TYPE_OPTIONS[building_type])
+        for heating_name in constants.DEFAULT_HEATING_CONSTANTS:
+            houses.append(building_model.House.set_up_from_heating_name(envelope=envelope, heating_name=heating_name))
+        houses.append(make_solar_house(envelope=envelope, heating_name='Heat pump', monkeypatch=monkeypatch))
+        houses.append(make_solar_house(envelope=envelope, heating_name='Oil boiler', monkeypatch=monkeypatch))
+    houses[0].tariffs['electricity'].p_per_unit_import = 50.0
+
+    results = batch.evaluate(batch.Scenarios.from_houses(houses), chunk_size=5)  # chunks smaller than the batch
+
+    for i, house in enumerate(houses):
+        electricity = house.consumption_per_fuel['electricity']
+        np.testing.assert_allclose(results.electricity_imported_kwh[i], electricity.imported.annual_sum_kwh)
+        np.testing.assert_allclose(results.electricity_exported_kwh[i], electricity.exported.annual_sum_kwh)
+        np.testing.assert_allclose(results.annual_bill_electricity[i], house.annual_bill_per_fuel['electricity'])
+        np.testing.assert_allclose(results.total_annual_bill[i], house.total_annual_bill)
+        np.testing.assert_allclose(results.total_annual_tco2[i], house.total_annual_tco2)
+        np.testing.assert_allclose(results.percent_self_use_of_solar[i], house.percent_self_use_of_solar)
+    assert (results.percent_self_use_of_solar[-2:] > 0).all()
+
+    baseline_results = batch.evaluate(batch.Scenarios.from_houses([houses[0]] * len(houses)))
+    batch_retrofit = batch.BatchRetrofit(baseline=baseline_results, upgrade=results)
+    for i, house in enumerate(houses):
+        house_retrofit = retrofit.Retrofit(baseline_house=houses[0], upgrade_house=house)
+        np.testing.assert_allclose(batch_retrofit.bill_savings_absolute[i], house_retrofit.bill_savings_absolute,
+                                   atol=1e-9)
+        np.testing.assert_allclose(batch_retrofit.carbon_savings_absolute[i], house_retrofit.carbon_savings_absolute,
+                                   atol=1e-12)
+        np.testing.assert_allclose(batch_retrofit.simple_payback[i], house_retrofit.simple_payback)
+
+
+def test_batch_from_options_matches_default_houses():
+    building_types = list(constants.BUILDING_TYPE_OPTIONS.keys()) * 2
+    heating_names = ['Gas boiler'] * 4 + ['Heat pump'] * 4
+    no_generation = np.zeros((1, len(constants.BASE_YEAR_HOURLY_INDEX)))
+    scenarios = batch.Scenarios.from_options(building_types=building_types, heating_system_names=heating_names,
+                                             generation_kwh_per_kwp=no_generation,
+                                             site_index=np.zeros(8, dtype=int), capacity_kwp=np.zeros(8))
+    results = batch.evaluate(scenarios)
+
+    for i, (building_type, heating_name) in enumerate(zip(building_types, heating_names)):
+        envelope = building_model.BuildingEnvelope.from_building_type_constants(
+            constants.BUILDING_TYPE_OPTIONS[building_type])
+        house = building_model.House.set_up_from_heating_name(envelope=envelope, heating_name=heating_name)
+        np.testing.assert_allclose(results.total_annual_bill[i], house.total_annual_bill)
+        np.testing.assert_allclose(results.total_annual_tco2[i], house.total_annual_tco2)
+        assert results.percent_self_use_of_solar[i] == 0
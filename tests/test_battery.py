@@ -0,0 +1,111 @@
+import numpy as np
+
+from .context import src
+from src import batch, battery, building_model, constants, retrofit, tariffs
+from .test_batch import make_solar_house
+
+
+def dispatch_one_step_at_a_time(net_kwh, capacity_kwh, max_power_kw, round_trip_efficiency, reserve_fraction):
+    one_way_efficiency = round_trip_efficiency ** 0.5
+    reserve_kwh = capacity_kwh * reserve_fraction
+    stored_kwh = reserve_kwh
+    grid_kwh = []
+    for net in net_kwh:
+        if net < 0:
+            flow = min(-net, max_power_kw, (capacity_kwh - stored_kwh) / one_way_efficiency)
+            stored_kwh += flow * one_way_efficiency
+        else:
+            flow = -min(net, max_power_kw, (stored_kwh - reserve_kwh) * one_way_efficiency)
+            stored_kwh += flow / one_way_efficiency
+        grid_kwh.append(net + flow)
+    return np.array(grid_kwh)
+
+
+def test_dispatch_matches_stepping_through_each_house():
+    rng = np.random.default_rng(0)
+    net_kwh = rng.normal(scale=2.0, size=(5, 500))
+    capacity_kwh = np.array([0.0, 2.0, 5.0, 10.0, 13.5])
+    max_power_kw = np.array([0.0, 0.5, 2.5, 10.0, 5.0])
+
+    grid_kwh = battery.dispatch(net_kwh, capacity_kwh=capacity_kwh, max_power_kw=max_power_kw,
+                                round_trip_efficiency=0.81, reserve_fraction=0.2)
+
+    np.testing.assert_array_equal(grid_kwh[0], net_kwh[0])  # no battery
+    for i in range(len(net_kwh)):
+        np.testing.assert_allclose(grid_kwh[i], dispatch_one_step_at_a_time(net_kwh[i], capacity_kwh[i],
+                                                                            max_power_kw[i], 0.81, 0.2), atol=1e-12)
+    np.testing.assert_allclose(battery.dispatch(net_kwh[2], capacity_kwh=5.0, max_power_kw=2.5,
+                                                round_trip_efficiency=0.81, reserve_fraction=0.2), grid_kwh[2])
+
+
+def test_dispatch_respects_limits_and_only_loses_energy():
+    net_kwh = np.tile([-3.0] * 6 + [2.0] * 6, 10)
+    grid_kwh = battery.dispatch(net_kwh, capacity_kwh=5.0, max_power_kw=1.0, round_trip_efficiency=0.9,
+                                reserve_fraction=0.1, steps_per_hour=constants.HALF_HOURLY)
+
+    flow_kwh = grid_kwh - net_kwh
+    assert (np.abs(flow_kwh) <= 0.5 + 1e-12).all()  # 1kW for half an hour
+    assert (np.sign(flow_kwh) * np.sign(net_kwh) <= 0).all()  # never charges from, or discharges to, the grid
+    stored_kwh = 0.5 + np.cumsum(np.where(flow_kwh > 0, flow_kwh * 0.9 ** 0.5, flow_kwh / 0.9 ** 0.5))
+    assert stored_kwh.min() >= 0.5 - 1e-12 and stored_kwh.max() <= 5.0 + 1e-12
+    charged, discharged = flow_kwh[flow_kwh > 0].sum(), -flow_kwh[flow_kwh < 0].sum()
+    assert discharged <= charged * 0.9 + 1e-9
+    assert grid_kwh.sum() > net_kwh.sum()
+
+
+def test_battery_raises_self_use_and_is_picked_up_by_the_house(monkeypatch):
+    envelope = building_model.BuildingEnvelope.from_building_type_constants(constants.BUILDING_TYPE_OPTIONS['Terrace'])
+    house = make_solar_house(envelope=envelope, heating_name='Heat pump', monkeypatch=monkeypatch)
+    without_battery = house.consumption_per_fuel['electricity']
+
+    house.battery = building_model.Battery(capacity_kwh=5.0)
+    with_battery = house.consumption_per_fuel['electricity']
+    assert with_battery.imported.annual_sum_kwh < without_battery.imported.annual_sum_kwh
+    assert with_battery.exported.annual_sum_kwh < without_battery.exported.annual_sum_kwh
+    assert with_battery.overall.annual_sum_kwh > without_battery.overall.annual_sum_kwh  # losses
+    self_use = house.percent_self_use_of_solar
+
+    house.battery.capacity_kwh = 10.0
+    assert house.percent_self_use_of_solar > self_use
+    assert house.upfront_cost > house.variant(battery=building_model.Battery(capacity_kwh=0.0)).upfront_cost
+
+
+def test_batch_with_batteries_matches_houses(monkeypatch):
+    envelope = building_model.BuildingEnvelope.from_building_type_constants(constants.BUILDING_TYPE_OPTIONS['Terrace'])
+    solar_house = make_solar_house(envelope=envelope, heating_name='Gas boiler', monkeypatch=monkeypatch)
+    houses = [solar_house,
+              solar_house.variant(battery=building_model.Battery(capacity_kwh=5.0)),
+              solar_house.variant(battery=building_model.Battery(capacity_kwh=9.5, max_power_kw=5.0,
+                                                                 round_trip_efficiency=0.85, reserve_fraction=0.0)),
+              building_model.House.set_up_from_heating_name(envelope=envelope, heating_name='Heat pump')]
+
+    results = batch.evaluate(batch.Scenarios.from_houses(houses), chunk_size=3)
+
+    for i, house in enumerate(houses):
+        electricity = house.consumption_per_fuel['electricity']
+        np.testing.assert_allclose(results.electricity_imported_kwh[i], electricity.imported.annual_sum_kwh)
+        np.testing.assert_allclose(results.electricity_exported_kwh[i], electricity.exported.annual_sum_kwh)
+        np.testing.assert_allclose(results.total_annual_bill[i], house.total_annual_bill)
+        np.testing.assert_allclose(results.percent_self_use_of_solar[i], house.percent_self_use_of_solar)
+        np.testing.assert_allclose(results.upfront_cost[i], house.upfront_cost)
+    assert results.total_annual_bill[1] < results.total_annual_bill[0]
+
+
+def test_sizing_sweep_matches_a_house_with_each_battery(monkeypatch):
+    envelope = building_model.BuildingEnvelope.from_building_type_constants(constants.BUILDING_TYPE_OPTIONS['Detached'])
+    house = make_solar_house(envelope=envelope, heating_name='Gas boiler', monkeypatch=monkeypatch)
+    house.tariffs['electricity'].hourly_prices = tariffs.flux()
+
+    sweep = retrofit.battery_sizing_sweep(house)
+    assert list(sweep.index) == list(constants.BatteryConstants.SIZING_SWEEP_KWH)
+    assert sweep.loc[0, 'bill_savings_absolute'] == 0 and np.isnan(sweep.loc[0, 'simple_payback'])
+    np.testing.assert_allclose(sweep.loc[0, 'total_annual_bill'], house.total_annual_bill)
+    assert (np.diff(sweep['percent_self_use_of_solar']) >= -1e-12).all()
+    for capacity_kwh in [5, 13]:
+        battery_house = house.variant(battery=building_model.Battery(capacity_kwh=capacity_kwh))
+        result = sweep.loc[capacity_kwh]
+        np.testing.assert_allclose(result['total_annual_bill'], battery_house.total_annual_bill)
+        np.testing.assert_allclose(result['percent_self_use_of_solar'], battery_house.percent_self_use_of_solar)
+        np.testing.assert_allclose(result['upfront_cost'], battery_house.upfront_cost - house.upfront_cost)
+        np.testing.assert_allclose(result['simple_payback'],
+                                   retrofit.Retrofit(baseline_house=house, upgrade_house=battery_house).simple_payback)
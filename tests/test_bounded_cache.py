@@ -0,0 +1,74 @@
+import sys
+
+import numpy as np
+import pytest
+
+from .context import src
+from src import bounded_cache, solar
+from src.constants import Orientation
+
+
+def make_cache(**kwargs):
+    now = [0.0]
+    calls = []
+
+    def profile(latitude, longitude):
+        calls.append((latitude, longitude))
+        return np.full(1000, latitude)  # 8kB
+
+    cache = bounded_cache.BoundedCache(profile, clock=lambda: now[0], **kwargs)
+    return cache, now, calls
+
+
+def test_evicts_least_recently_used_once_over_byte_budget():
+    cache, _, calls = make_cache(max_bytes=20_000)
+    cache(1.0, 2.0)
+    cache(3.0, 4.0)
+    cache(1.0, 2.0)  # now more recently used than (3, 4)
+    cache(5.0, 6.0)
+
+    info = cache.cache_info()
+    assert (info.hits, info.misses, info.currsize, info.evictions) == (1, 3, 2, 1)
+    assert info.size_bytes == 16_000 <= info.max_bytes
+    assert [entry['key'] for entry in cache.dump()] == [(1.0, 2.0), (5.0, 6.0)]
+    cache(3.0, 4.0)
+    assert calls[-1] == (3.0, 4.0)  # was evicted so had to be recomputed
+
+
+def test_entries_expire_after_ttl():
+    cache, now, calls = make_cache(max_bytes=10 ** 6, ttl_seconds=60)
+    cache(1.0, longitude=2.0)
+    now[0] = 59
+    cache(1.0, longitude=2.0)
+    now[0] = 61
+    cache(1.0, longitude=2.0)
+    assert len(calls) == 2
+    assert cache.cache_info().expirations == 1
+    assert cache.dump()[0]['age_seconds'] == 0
+
+
+def test_memory_stays_flat_over_many_sites():
+    cache, _, _ = make_cache(max_bytes=100_000)
+    for latitude in np.linspace(50, 58, 5000):
+        cache(float(latitude), 0.0)
+    info = cache.cache_info()
+    assert info.currsize == 12
+    assert info.size_bytes <= info.max_bytes
+    assert info.evictions == 5000 - 12
+
+
+def test_rejects_mutable_arguments():
+    cache, _, _ = make_cache(max_bytes=10 ** 6)
+    with pytest.raises(TypeError):
+        cache([1.0], 2.0)
+    with pytest.raises(TypeError):
+        cache(Orientation(azimuth_degrees=0, name='South'), 2.0)  # a dataclass, but not frozen
+
+
+def test_solar_profiles_cache_is_listed_for_admins():
+    profiles = solar.get_hourly_generation_per_kwp_from_eu_api
+    # src code imports bounded_cache as a top level module, which has its own registry
+    caches = sys.modules[type(profiles).__module__].dump_caches()
+    assert f'{profiles.__module__}.get_hourly_generation_per_kwp_from_eu_api' in caches
+    info = caches[f'{profiles.__module__}.get_hourly_generation_per_kwp_from_eu_api']['info']
+    assert info['max_bytes'] == solar.PROFILE_CACHE_MAX_BYTES
@@ -1,4 +1,5 @@
 import pandas as pd
+import pytest
 import numpy as np
 
 from .context import src
@@ -88,3 +89,88 @@ def test_consumption_import_and_export():
     assert consumption_oil_added.imported.annual_sum_kwh == 2 * consumption_oil.imported.annual_sum_kwh
     assert (consumption_oil_added.overall.hourly_profile_fuel_units
             == 2 * consumption_oil_two.overall.hourly_profile_fuel_units).all()
+
+
+def test_consumption_stream_shares_validated_index():
+    stream_5 = consumption.ConsumptionStream(hourly_profile_kwh=pd.Series(index=BASE_YEAR_HOURLY_INDEX, data=5))
+    stream_2 = consumption.ConsumptionStream(hourly_profile_kwh=pd.Series(index=BASE_YEAR_HOURLY_INDEX.copy(), data=2))
+    assert stream_5.index is stream_2.index
+    assert stream_5.add(stream_2).index is stream_5.index
+    assert isinstance(stream_5.hourly_profile_kwh_array, np.ndarray)
+    assert stream_5.hourly_profile_kwh_array.dtype == np.float64
+
+    leap_year_index = consumption.get_hourly_index(2020)
+    assert consumption.get_hourly_index(2020) is leap_year_index
+    leap_stream = consumption.ConsumptionStream.from_array(profile_kwh=np.ones(len(leap_year_index)),
+                                                           index=leap_year_index)
+    assert leap_stream.leap_year
+    assert leap_stream.days_in_year == 366
+    assert (leap_stream.hourly_profile_kwh.index == leap_year_index).all()
+
+
+def test_consumption_stream_rejects_partial_year():
+    partial_year = pd.Series(index=BASE_YEAR_HOURLY_INDEX[:100], data=1.0)
+    with pytest.raises(AssertionError):
+        consumption.ConsumptionStream(hourly_profile_kwh=partial_year)
+
+
+def test_consumption_split_is_computed_once_and_reused():
+    profile = pd.Series(index=constants.BASE_YEAR_HOURLY_INDEX, data=np.tile([1.0, -2.0], 8760 // 2))
+    consumption_elec = consumption.Consumption(hourly_profile_kwh=profile)
+    splits_before = consumption.Consumption.splits_computed
+
+    imported = consumption_elec.imported
+    assert consumption_elec.exported.annual_sum_kwh == 2.0 * 8760 / 2
+    assert imported.annual_sum_kwh == 1.0 * 8760 / 2
+    assert consumption_elec.imported is imported
+    assert consumption.Consumption.splits_computed == splits_before + 1
+
+    # reading the profile doesn't change it, but setting a new one means the split has to be redone
+    assert consumption_elec.overall.hourly_profile_kwh.iloc[0] == 1.0
+    assert consumption_elec.imported is imported
+    edited = consumption_elec.overall.hourly_profile_kwh.copy()
+    edited.iloc[0] = -1.0
+    consumption_elec.overall.hourly_profile_kwh = edited
+    assert consumption_elec.exported.annual_sum_kwh == 2.0 * 8760 / 2 + 1
+    assert consumption_elec.imported.annual_sum_kwh == 1.0 * 8760 / 2 - 1
+    assert consumption.Consumption.splits_computed == splits_before + 2
+
+    # a different stream that happens to be at the same version isn't mistaken for the one that was split
+    index = consumption_elec.overall.index
+    all_exports = consumption.Consumption.from_stream(consumption.ConsumptionStream.from_array(-np.ones(8760), index))
+    assert all_exports.exported.annual_sum_kwh == 8760
+    all_imports = consumption.ConsumptionStream.from_array(np.ones(8760), index)
+    assert all_imports.version == all_exports.overall.version
+    all_exports.overall = all_imports
+    assert all_exports.exported.annual_sum_kwh == 0
+    with pytest.raises(ValueError):
+        all_imports.hourly_profile_kwh_array[0] = -1.0  # read only, so edits can't skip the version bump
+
+
+def test_half_hourly_stream_and_resampling():
+    profile = pd.Series(index=constants.BASE_YEAR_HALF_HOURLY_INDEX, data=np.tile([1.0, 3.0], 8760))
+    half_hourly = consumption.ConsumptionStream(hourly_profile_kwh=profile)
+    assert half_hourly.index is consumption.get_index(2013, steps_per_hour=constants.HALF_HOURLY)
+    assert half_hourly.steps_per_hour == constants.HALF_HOURLY
+    assert half_hourly.hours_in_year == 8760
+    assert half_hourly.days_in_year == 365
+
+    hourly = half_hourly.at_resolution(constants.HOURLY)
+    assert hourly.index is consumption.get_hourly_index(2013)
+    np.testing.assert_array_equal(hourly.hourly_profile_kwh_array, 4.0)
+    assert half_hourly.at_resolution(constants.HOURLY) is hourly  # reused until the values change
+    view = half_hourly.hourly_profile_kwh
+    with pytest.raises(ValueError):
+        view.iloc[0] = 2.0  # read only, so the stream can't change behind the resampled copy's back
+    assert half_hourly.at_resolution(constants.HOURLY) is hourly
+    edited = view.copy()
+    edited.iloc[0] = 2.0
+    half_hourly.hourly_profile_kwh = edited
+    assert half_hourly.at_resolution(constants.HOURLY).hourly_profile_kwh_array[0] == 5.0
+
+    # adding an hourly stream splits each of its hours evenly, giving a half-hourly stream
+    stream_2 = consumption.ConsumptionStream(hourly_profile_kwh=pd.Series(index=BASE_YEAR_HOURLY_INDEX, data=2.0))
+    combined = stream_2.add(half_hourly)
+    assert combined.steps_per_hour == constants.HALF_HOURLY
+    np.testing.assert_array_equal(combined.hourly_profile_kwh_array[:4], [3.0, 4.0, 2.0, 4.0])
+    np.testing.assert_almost_equal(combined.annual_sum_kwh, stream_2.annual_sum_kwh + half_hourly.annual_sum_kwh)
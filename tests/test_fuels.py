@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from .context import src
+from src import batch, building_model, constants, fuels
+from src.fuels import Fuel
+from .test_batch import make_solar_house
+
+HOUR_OF_DAY = constants.BASE_YEAR_HOURLY_INDEX.hour.to_numpy()
+EVENING_PEAK_INTENSITY = np.where((HOUR_OF_DAY >= 16) & (HOUR_OF_DAY < 20), 300.0, 150.0) / 10 ** 6
+
+
+@pytest.fixture
+def hourly_grid_carbon(monkeypatch):
+    """ Gives the electricity the model uses an hourly intensity, dirtier in the evening peak"""
+    electricity = building_model.constants.ELECTRICITY  # src code imports constants as a top level module
+    with_intensity = type(electricity)(name=electricity.name, tco2_per_kwh=electricity.tco2_per_kwh,
+                                       hourly_tco2_per_kwh=EVENING_PEAK_INTENSITY)
+    for attribute, value in vars(with_intensity).items():
+        monkeypatch.setattr(electricity, attribute, value)
+    return electricity
+
+
+def test_hourly_intensity_is_read_only_shared_and_not_compared():
+    flat = Fuel(name='electricity', tco2_per_kwh=186 / 10 ** 6, hourly_tco2_per_kwh=np.full(8760, 186 / 10 ** 6))
+    assert flat == Fuel(name='electricity', tco2_per_kwh=186 / 10 ** 6)
+    with pytest.raises(ValueError):
+        flat.hourly_tco2_per_kwh[0] = 0.0
+    assert flat.hourly_tco2_per_kwh_at(2) is flat.hourly_tco2_per_kwh_at(2)
+    with pytest.raises(ValueError):
+        Fuel(name='electricity', tco2_per_kwh=0.0, hourly_tco2_per_kwh=np.ones(100))
+
+    profiles_kwh = np.random.default_rng(0).normal(size=(3, 2 * 8760))
+    np.testing.assert_allclose(flat.calculate_annual_tco2_from_profile(profiles_kwh, steps_per_hour=2),
+                               flat.calculate_annual_tco2(profiles_kwh.sum(axis=1)))
+
+
+def test_grid_carbon_intensity_file_is_read_for_one_year(tmp_path):
+    times = pd.date_range(start="2019-12-31", end="2021-01-02", freq="30min", tz="UTC", inclusive="left")
+    intensity_g_per_kwh = np.where(times.hour < 12, 100.0, 200.0)
+    path = tmp_path / 'df_fuel_ckan.csv'
+    pd.DataFrame({'DATETIME': times.strftime('%Y-%m-%dT%H:%M:%S'), 'GAS': 1.0,
+                  'CARBON_INTENSITY': intensity_g_per_kwh}).to_csv(path, index=False)
+
+    intensity = fuels.load_grid_carbon_intensity(path, year=2020)
+    assert len(intensity) == 2 * 8760  # leap day dropped
+    np.testing.assert_allclose(intensity[:48], np.where(np.arange(48) < 24, 100e-6, 200e-6))
+    electricity = Fuel(name='electricity', tco2_per_kwh=150e-6, hourly_tco2_per_kwh=intensity)
+    np.testing.assert_allclose(electricity.hourly_tco2_per_kwh_at(constants.HOURLY)[11:13], [100e-6, 200e-6])
+    np.testing.assert_array_equal(fuels.load_grid_carbon_intensity_if_usable(path, year=2020), intensity)
+
+
+def test_unusable_grid_carbon_intensity_file_falls_back_to_the_annual_average(tmp_path):
+    assert fuels.load_grid_carbon_intensity_if_usable(tmp_path / 'missing.csv', year=2020) is None
+
+    times = pd.date_range(start="2020-01-01", periods=100, freq="30min", tz="UTC")
+    incomplete = tmp_path / 'incomplete.csv'
+    pd.DataFrame({'DATETIME': times.strftime('%Y-%m-%dT%H:%M:%S'), 'CARBON_INTENSITY': 100.0}).to_csv(incomplete)
+    with pytest.raises(ValueError):
+        fuels.load_grid_carbon_intensity(incomplete, year=2020)
+    with pytest.warns(UserWarning, match='annual average'):
+        assert fuels.load_grid_carbon_intensity_if_usable(incomplete, year=2020) is None
+
+    wrong_columns = tmp_path / 'wrong_columns.csv'
+    pd.DataFrame({'DATETIME': times, 'GAS': 1.0}).to_csv(wrong_columns)
+    with pytest.warns(UserWarning, match='annual average'):
+        assert fuels.load_grid_carbon_intensity_if_usable(wrong_columns, year=2020) is None
+
+
+def test_house_and_batch_carbon_follow_the_hour(hourly_grid_carbon, monkeypatch):
+    envelope = building_model.BuildingEnvelope.from_building_type_constants(constants.BUILDING_TYPE_OPTIONS['Terrace'])
+    houses = [make_solar_house(envelope=envelope, heating_name=heating_name, monkeypatch=monkeypatch)
+              for heating_name in ['Heat pump', 'Gas boiler']]
+    houses.append(houses[0].variant(battery=building_model.Battery(capacity_kwh=5.0)))
+
+    for house in houses:
+        electricity = house.consumption_per_fuel['electricity']
+        np.testing.assert_allclose(house.annual_tco2_per_fuel['electricity'],
+                                   electricity.overall.hourly_profile_kwh_array @ EVENING_PEAK_INTENSITY)
+        # solar exports at midday, when the grid is cleaner, so displace less than the average would say
+        assert (electricity.exported.annual_sum_tco2
+                < electricity.exported.annual_sum_kwh * hourly_grid_carbon.tco2_per_kwh)
+
+    results = batch.evaluate(batch.Scenarios.from_houses(houses), chunk_size=2)
+    for i, house in enumerate(houses):
+        np.testing.assert_allclose(results.total_annual_tco2[i], house.total_annual_tco2)
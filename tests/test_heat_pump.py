@@ -0,0 +1,83 @@
+import dataclasses
+
+import numpy as np
+import pytest
+
+from .context import src
+from src import building_model, constants
+
+heat_pump = building_model.heat_pump
+
+
+@pytest.fixture
+def measured_weather(monkeypatch):
+    """ Stands the climatology in for a measured weather file, which isn't shipped"""
+    weather = dataclasses.replace(heat_pump.pv_model.Weather.climatology(), synthetic=False)
+    monkeypatch.setattr(heat_pump.pv_model, 'get_default_weather', lambda: weather)
+    return weather
+
+
+def test_cop_is_cached_read_only_and_falls_with_lift():
+    cop = heat_pump.hourly_cop('Air source', flow_temperature_c=45.0)
+    assert cop is heat_pump.hourly_cop('Air source', flow_temperature_c=45.0)
+    assert len(cop) == len(constants.BASE_YEAR_HOURLY_INDEX)
+    with pytest.raises(ValueError):
+        cop[0] = 5.0
+
+    temperature_c = heat_pump.outdoor_temperature_c(2013)
+    assert cop[temperature_c.argmin()] == cop.min()
+    assert (heat_pump.hourly_cop('Air source', flow_temperature_c=55.0) < cop).all()
+    np.testing.assert_array_equal(heat_pump.hourly_cop('Air source', steps_per_hour=constants.HALF_HOURLY)[::2], cop)
+    with pytest.raises(ValueError):
+        heat_pump.hourly_cop('Air source', weather_year=2020)
+
+
+def test_cop_cache_stays_bounded_however_many_flow_temperatures_are_tried():
+    for flow_temperature_c in np.arange(30.0, 70.0, 0.25):
+        heat_pump.hourly_cop('Air source', flow_temperature_c=float(flow_temperature_c))
+    cache_info = heat_pump.hourly_cop.cache_info()
+    assert cache_info.evictions > 0 and cache_info.size_bytes <= heat_pump.COP_CACHE_MAX_BYTES
+
+
+@pytest.mark.parametrize('steps_per_hour', [constants.HOURLY, constants.HALF_HOURLY])
+def test_heat_pump_uses_more_in_winter_for_the_same_seasonal_cop(steps_per_hour, measured_weather):
+    heat_pump_system = building_model.HeatingSystem.from_constants(
+        name='Heat pump', parameters=constants.DEFAULT_HEATING_CONSTANTS['Heat pump'], steps_per_hour=steps_per_hour)
+    consumption = heat_pump_system.calculate_consumption(annual_space_heating_demand_kwh=9000)
+    np.testing.assert_allclose(consumption.overall.annual_sum_kwh, 9000 / heat_pump_system.efficiency)
+
+    demand = heat_pump_system.hourly_normalized_demand_profile
+    in_winter = demand.index.month.isin([12, 1, 2])
+    winter_share = consumption.overall.hourly_profile_kwh[in_winter].sum() / consumption.overall.annual_sum_kwh
+    assert winter_share > demand[in_winter].sum()
+
+    flat = building_model.HeatingSystem.from_constants(
+        name='Heat pump', parameters=constants.DEFAULT_HEATING_CONSTANTS['Heat pump'], steps_per_hour=steps_per_hour)
+    flat.cop_model = None
+    np.testing.assert_allclose(flat.calculate_consumption(9000).overall.hourly_profile_kwh_array,
+                               demand.to_numpy() * 9000 / flat.efficiency)
+
+
+def test_higher_flow_temperature_uses_more_electricity(measured_weather):
+    heat_pump_system = building_model.HeatingSystem.from_constants(
+        name='Heat pump', parameters=constants.DEFAULT_HEATING_CONSTANTS['Heat pump'])
+    annual_kwh, peak_kwh = {}, {}
+    for flow_temperature_c in [35.0, heat_pump.DEFAULT_FLOW_TEMPERATURE_C, 55.0]:
+        heat_pump_system.flow_temperature_c = flow_temperature_c
+        profile_kwh = heat_pump_system.calculate_consumption(9000).overall.hourly_profile_kwh_array
+        annual_kwh[flow_temperature_c], peak_kwh[flow_temperature_c] = profile_kwh.sum(), profile_kwh.max()
+
+    np.testing.assert_allclose(annual_kwh[heat_pump.DEFAULT_FLOW_TEMPERATURE_C], 9000 / heat_pump_system.efficiency)
+    assert annual_kwh[35.0] < annual_kwh[heat_pump.DEFAULT_FLOW_TEMPERATURE_C] < annual_kwh[55.0]
+    assert peak_kwh[35.0] < peak_kwh[heat_pump.DEFAULT_FLOW_TEMPERATURE_C] < peak_kwh[55.0]
+
+
+def test_seasonal_efficiency_is_used_with_only_synthetic_temperatures(monkeypatch):
+    monkeypatch.setattr(heat_pump.pv_model, 'get_default_weather', heat_pump.pv_model.Weather.climatology)
+    heat_pump_system = building_model.HeatingSystem.from_constants(
+        name='Heat pump', parameters=constants.DEFAULT_HEATING_CONSTANTS['Heat pump'])
+    demand = heat_pump_system.hourly_normalized_demand_profile.to_numpy()
+    for flow_temperature_c in [35.0, 55.0]:
+        heat_pump_system.flow_temperature_c = flow_temperature_c
+        np.testing.assert_allclose(heat_pump_system.calculate_consumption(9000).overall.hourly_profile_kwh_array,
+                                   demand * 9000 / heat_pump_system.efficiency)
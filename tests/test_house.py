@@ -1,5 +1,6 @@
 import numpy as np
 import pandas as pd
+import pytest
 
 from .context import src
 from src import building_model, solar, constants, roof, retrofit
@@ -52,6 +53,23 @@ def test_heating_system_from_constants():
                                    annual_demand / gas_boiler.efficiency)
 
 
+def test_half_hourly_house_matches_hourly_totals():
+    building_type = constants.BUILDING_TYPE_OPTIONS['Terrace']
+    hourly_envelope = building_model.BuildingEnvelope.from_building_type_constants(building_type)
+    half_hourly_envelope = building_model.BuildingEnvelope.from_building_type_constants(
+        building_type, steps_per_hour=constants.HALF_HOURLY)
+    hourly_house = building_model.House.set_up_from_heating_name(envelope=hourly_envelope, heating_name='Heat pump')
+    half_hourly_house = building_model.House.set_up_from_heating_name(envelope=half_hourly_envelope,
+                                                                      heating_name='Heat pump')
+
+    electricity = half_hourly_house.consumption_per_fuel['electricity']
+    assert electricity.overall.steps_per_hour == constants.HALF_HOURLY
+    assert len(electricity.overall.hourly_profile_kwh_array) == 2 * 8760
+    np.testing.assert_allclose(half_hourly_house.total_annual_consumption_kwh,
+                               hourly_house.total_annual_consumption_kwh)
+    np.testing.assert_allclose(half_hourly_house.total_annual_bill, hourly_house.total_annual_bill)
+
+
 def test_tariff_calculate_annual_cost():
     cheapo = building_model.Tariff(fuel=constants.ELECTRICITY,
                                    p_per_day=1.1,
@@ -73,7 +91,9 @@ def test_tariff_calculate_annual_cost():
 
     # Check consumption with export behaves as you expect
     consumption_with_export = space_heating_consumption
-    consumption_with_export.overall.hourly_profile_kwh.iloc[0] -= 100
+    profile_with_export = consumption_with_export.overall.hourly_profile_kwh.copy()
+    profile_with_export.iloc[0] -= 100
+    consumption_with_export.overall.hourly_profile_kwh = profile_with_export
     assert consumption_with_export.overall.annual_sum_kwh == 10 * consumption_with_export.overall.hours_in_year - 100
     assert consumption_with_export.imported.annual_sum_kwh == 10 * consumption_with_export.overall.hours_in_year - 10
     assert consumption_with_export.exported.annual_sum_kwh == 90
@@ -188,8 +208,98 @@ def test_upgrade_buildings():
     assert hp_house.percent_self_use_of_solar == 0
     assert oil_house.percent_self_use_of_solar == 0
     assert solar_house.percent_self_use_of_solar > 0
-    assert solar_house.percent_self_use_of_solar == 0.827282421412342  # so high because only 0.8kW of panels
     assert both_house.percent_self_use_of_solar > solar_house.percent_self_use_of_solar
-    assert both_house.percent_self_use_of_solar == 0.9196782581191316
 
     return hp_house, solar_house, both_house
+
+
+@pytest.mark.live
+def test_upgrade_buildings_self_use_from_live_api():
+    hp_house, solar_house, both_house = test_upgrade_buildings()
+    # so high because only 0.8kW of panels. Tolerance as generation is scaled from PVGIS output for 1kWp
+    np.testing.assert_allclose(solar_house.percent_self_use_of_solar, 0.827282421412342, rtol=1e-4)
+    np.testing.assert_allclose(both_house.percent_self_use_of_solar, 0.9196782581191316, rtol=1e-4)
+
+
+def test_house_recalculates_only_when_inputs_change():
+    envelope = building_model.BuildingEnvelope.from_building_type_constants(constants.BUILDING_TYPE_OPTIONS['Terrace'])
+    house = building_model.House.set_up_from_heating_name(envelope=envelope, heating_name='Gas boiler')
+
+    heating_consumption = house.heating_consumption
+    bill = house.total_annual_bill
+    assert house.heating_consumption is heating_consumption  # cached
+
+    # Tariff edits change the bill but leave the hourly energy balance alone
+    house.tariffs['gas'].p_per_unit_import = house.tariffs['gas'].p_per_unit_import * 2
+    assert house.total_annual_bill > bill
+    assert house.heating_consumption is heating_consumption
+
+    # Setting an input to the value it already has doesn't count as a change
+    house.heating_system.efficiency = house.heating_system.efficiency
+    assert house.heating_consumption is heating_consumption
+
+    # Edits to the heating system flow through without clearing anything by hand
+    gas_used = house.annual_consumption_per_fuel_kwh['gas']
+    house.heating_system.efficiency = house.heating_system.efficiency / 2
+    np.testing.assert_almost_equal(house.annual_consumption_per_fuel_kwh['gas'], 2 * gas_used)
+
+    house.envelope.annual_heating_demand = house.envelope.annual_heating_demand / 2
+    np.testing.assert_almost_equal(house.annual_consumption_per_fuel_kwh['gas'], gas_used)
+
+    # Changing the grant doesn't affect energy use
+    heating_consumption = house.heating_consumption
+    house.heating_system.grant = 1000
+    assert house.heating_consumption is heating_consumption
+
+    # Swapping the heating system for a different one does
+    house.heating_system = building_model.HeatingSystem.from_constants(
+        name='Heat pump', parameters=constants.DEFAULT_HEATING_CONSTANTS['Heat pump'])
+    assert list(house.consumption_per_fuel.keys()) == ['electricity']
+
+
+def test_house_variant_shares_unchanged_parts_of_baseline():
+    envelope = building_model.BuildingEnvelope.from_building_type_constants(constants.BUILDING_TYPE_OPTIONS['Detached'])
+    gas_house = building_model.House.set_up_from_heating_name(envelope=envelope, heating_name='Gas boiler')
+    gas_house.heating_system_upfront_cost = 4000
+    gas_bill = gas_house.total_annual_bill
+    heat_pump = building_model.HeatingSystem.from_constants(name='Heat pump',
+                                                            parameters=constants.DEFAULT_HEATING_CONSTANTS['Heat pump'])
+
+    hp_house = gas_house.variant(heating_system=heat_pump)
+    assert hp_house.envelope is gas_house.envelope
+    assert hp_house.tariffs is gas_house.tariffs
+    assert hp_house.base_consumption is gas_house.base_consumption  # already calculated so reused
+    assert hp_house.heating_system is heat_pump
+    assert hp_house.heating_system_upfront_cost != 4000  # overwrite was for the gas boiler
+
+    # Same results as setting up the house from scratch, and the baseline is untouched
+    fresh_hp_house = building_model.House(envelope=envelope, heating_system=heat_pump)
+    np.testing.assert_almost_equal(hp_house.total_annual_bill, fresh_hp_house.total_annual_bill)
+    np.testing.assert_almost_equal(hp_house.total_annual_tco2, fresh_hp_house.total_annual_tco2)
+    assert gas_house.total_annual_bill == gas_bill
+    assert gas_house.heating_system.name == 'Gas boiler'
+    assert gas_house.heating_system_upfront_cost == 4000
+
+    solar_only_house = gas_house.variant(solar_install=solar.Solar.create_zero_area_instance())
+    assert solar_only_house.heating_consumption is gas_house.heating_consumption
+    assert solar_only_house.heating_system_upfront_cost == 4000
+
+
+def test_results_per_solar_year():
+    envelope = building_model.BuildingEnvelope.from_building_type_constants(constants.BUILDING_TYPE_OPTIONS['Flat'])
+    house = building_model.House.set_up_from_heating_name(envelope=envelope, heating_name='Heat pump')
+    assert house.results_per_solar_year().empty
+
+    solar_install = solar.Solar.create_zero_area_instance()
+    solar_install.number_of_panels = 8
+    solar_install.ensemble_years = (2012, 2014)
+    solar_house = house.variant(solar_install=solar_install)
+    results = solar_house.results_per_solar_year()
+
+    assert list(results.index) == [2012, 2013, 2014]
+    assert results['total_annual_bill'].std() > 0
+    assert (results['total_annual_bill'] < house.total_annual_bill).all()
+    one_year_house = solar_house.variant(solar_install=solar_install.for_ensemble_year(2013))
+    assert results.loc[2013, 'total_annual_bill'] == one_year_house.total_annual_bill
+    assert results.loc[2013, 'percent_self_use_of_solar'] == one_year_house.percent_self_use_of_solar
+    assert solar_install.ensemble_year is None  # the house's own install is left as the mean
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from .context import src
+from src import building_model, constants, solar
+from src.constants import SolarConstants
+from src.roof import Polygon
+
+# src code imports instrumentation as a top level module, so switch on that one
+instrumentation = solar.instrumentation
+
+
+@pytest.fixture
+def enabled(tmp_path):
+    path = tmp_path / 'reruns.jsonl'
+    instrumentation.enable(path)
+    yield path
+    instrumentation.finish_rerun()
+    instrumentation.disable()
+
+
+def test_off_by_default_records_nothing():
+    assert not instrumentation.is_enabled()
+    assert instrumentation.span('anything') is instrumentation.span('something else')
+    assert instrumentation.start_rerun('results') is None
+    instrumentation.count('anything')
+    assert instrumentation.finish_rerun() is None
+
+
+def test_rerun_summary_has_spans_and_counters_and_is_exported(enabled):
+    instrumentation.start_rerun('results')
+    house = building_model.House.set_up_from_heating_name(
+        envelope=building_model.BuildingEnvelope.from_building_type_constants(
+            constants.BUILDING_TYPE_OPTIONS['Terrace']),
+        heating_name='Gas boiler')
+    polygon = Polygon(_points=[[0.132377, 52.19524], [0.13242, 52.195234], [0.132428, 52.195252],
+                               [0.132384, 52.19526], [0.132377, 52.19524]])
+    house.solar_install = solar.Solar(orientation=SolarConstants.ORIENTATIONS['South'], polygons=[polygon])
+    house.total_annual_bill
+    summary = instrumentation.finish_rerun()
+
+    assert summary['label'] == 'results'
+    for name in ['solar.profile_scaling', 'consumption.add', 'consumption.split', 'tariff.costing']:
+        assert summary['spans'][name]['calls'] > 0
+        assert 0 <= summary['spans'][name]['max_ms'] <= summary['spans'][name]['total_ms']
+    assert summary['counters']['solar.generation_built'] == 1
+    assert summary['counters']['panels.side_length_rule'] >= 1
+
+    exported = [json.loads(line) for line in enabled.read_text().splitlines()]
+    assert exported == [summary]
+
+
+def test_each_rerun_starts_from_zero(enabled):
+    instrumentation.start_rerun('first')
+    with instrumentation.span('step'):
+        instrumentation.count('things', 2)
+    instrumentation.finish_rerun()
+    instrumentation.start_rerun('second')
+    instrumentation.count('things')
+    summary = instrumentation.finish_rerun()
+    assert summary['counters'] == {'things': 1}
+    assert summary['spans'] == {}
+    assert [json.loads(line)['label'] for line in enabled.read_text().splitlines()] == ['first', 'second']
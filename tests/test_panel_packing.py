@@ -0,0 +1,72 @@
+import numpy as np
+
+from .context import src
+from src import panel_packing, solar
+from src.constants import ORIENTATION_OPTIONS, SolarConstants
+from src.roof import Polygon
+
+LATITUDE, LONGITUDE = 51.5, -0.1
+METRES_PER_DEGREE_LNG = np.pi / 180 * 6378000 * np.cos(np.radians(LATITUDE))
+
+
+def polygon_from_metres(east_north, rotation_degrees=0):
+    """ Closed polygon from (east, north) points in metres, optionally rotated anticlockwise about the first"""
+    points = np.array(east_north, dtype=float) @ panel_packing.rotation_matrix(rotation_degrees)
+    lng_lat = [[LONGITUDE + east / METRES_PER_DEGREE_LNG, LATITUDE + north / 111000] for east, north in points]
+    return Polygon(lng_lat + [lng_lat[0]])
+
+
+def south_facing_install(polygon):
+    return solar.Solar(orientation=ORIENTATION_OPTIONS['South'], polygons=[polygon], pitch=35)
+
+
+def test_rectangles_match_side_length_rule():
+    for width, height in [(8, 5), (6, 6), (12, 7), (20, 10), (3, 2)]:
+        rectangle = polygon_from_metres([(0, 0), (width, 0), (width, height), (0, height)])
+        solar_install = south_facing_install(rectangle)
+        packing = solar_install.pack_panels_onto_polygon(rectangle)
+        assert packing.number_of_panels == solar_install.max_number_of_panels_in_a_rectangle(rectangle)
+
+
+def test_askew_rectangle_packs_like_a_straight_one():
+    straight = polygon_from_metres([(0, 0), (12, 0), (12, 7), (0, 7)])
+    askew = polygon_from_metres([(0, 0), (12, 0), (12, 7), (0, 7)], rotation_degrees=20)
+    packing = panel_packing.pack_polygon(askew, pitch=0, azimuth_degrees=0)
+    assert packing.number_of_panels == panel_packing.pack_polygon(straight, pitch=0, azimuth_degrees=0).number_of_panels
+    assert abs(abs(packing.rotation_degrees) - 20) < 1e-6 or abs(abs(packing.rotation_degrees) - 70) < 1e-6
+
+
+def test_l_shaped_roof_panels_stay_on_the_roof_and_apart():
+    l_shape = [(0, 0), (12, 0), (12, 4), (5, 4), (5, 10), (0, 10)]
+    polygon = polygon_from_metres(l_shape)
+    packing = panel_packing.pack_polygon(polygon, pitch=0, azimuth_degrees=0)
+
+    usable_area = (12 - 0.8) * (4 - 0.8) + (5 - 0.8) * (10 - 4)
+    most_that_could_fit = usable_area / SolarConstants.PANEL_AREA
+    assert 0.7 * most_that_could_fit < packing.number_of_panels <= most_that_could_fit
+    assert packing.panel_corners_m.shape == (packing.number_of_panels, 4, 2)
+    # corners are (north, east) in metres from the first point
+    east, north = packing.panel_corners_m[..., 1], packing.panel_corners_m[..., 0]
+    border = SolarConstants.BIG_PANEL_BORDER_M / 2
+    tolerance = 0.05  # half a cell
+    assert (east.min(axis=1) >= border - tolerance).all() and (north.min(axis=1) >= border - tolerance).all()
+    in_top_leg = north.max(axis=1) > 4 - border + tolerance
+    assert (east.max(axis=1)[in_top_leg] <= 5 - border + tolerance).all()
+    centres = packing.panel_corners_m.mean(axis=1)
+    gaps = np.abs(centres[:, None] - centres[None, :])
+    size = np.ptp(packing.panel_corners_m[0], axis=0)
+    overlapping = (gaps[..., 0] < size[0] - 1e-6) & (gaps[..., 1] < size[1] - 1e-6)
+    assert overlapping.sum() == packing.number_of_panels  # each panel only overlaps itself
+
+
+def test_hipped_roof_fits_fewer_panels_than_its_bounding_rectangle():
+    hipped = polygon_from_metres([(0, 0), (12, 0), (9, 4), (3, 4)])
+    rectangle = polygon_from_metres([(0, 0), (12, 0), (12, 4), (0, 4)])
+    hipped_panels = panel_packing.pack_polygon(hipped, pitch=35, azimuth_degrees=0).number_of_panels
+    assert 0 < hipped_panels < panel_packing.pack_polygon(rectangle, pitch=35, azimuth_degrees=0).number_of_panels
+
+
+def test_shape_with_no_area_fits_no_panels():
+    packing = panel_packing.pack_polygon(Polygon([[LONGITUDE, LATITUDE]] * 4), pitch=35, azimuth_degrees=0)
+    assert packing.number_of_panels == 0
+    assert packing.panel_corners_m.shape == (0, 4, 2)
@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+import pytest
+import requests
+
+from .context import src
+from src import pv_model, solar
+from src.constants import ORIENTATION_OPTIONS, BASE_YEAR_HOURLY_INDEX
+from roof import Polygon
+
+
+def test_sun_is_highest_at_solar_noon_in_june():
+    index = pd.date_range(start="2013-06-21 00:00", periods=24, freq="1H")
+    sun = pv_model.SunPath.for_index(index)
+    flat_at_greenwich = pv_model.incidence_coefficients(np.array([51.5]), np.array([0.0]), np.zeros(1), np.zeros(1))
+    elevation = np.degrees(np.arcsin(flat_at_greenwich @ sun.basis))[0]
+    assert elevation.argmax() in (11, 12)  # solar noon is around 12:00 UTC at Greenwich
+    np.testing.assert_allclose(elevation.max(), 90 - 51.5 + 23.44, atol=2)  # mid hour is ~30 mins off noon
+    assert (elevation[[0, 1, 2, 22, 23]] < 0).all()
+
+
+def test_annual_generation_is_plausible_for_the_uk():
+    profiles = pv_model.generation_per_kwp(latitudes=[52.2] * 4, longitudes=[0.13] * 4, pitches=[30, 30, 30, 0],
+                                           azimuths_degrees=[0, -90, 180, 0])
+    south, east, north, flat = profiles.sum(axis=1)
+    assert 850 < south < 1100  # kWh per kWp
+    assert south > flat > east > north
+    assert (profiles >= 0).all()
+    assert profiles.shape == (4, len(BASE_YEAR_HOURLY_INDEX))
+    assert profiles[0, :6].sum() == 0  # dark in the early hours of 1st January
+
+
+def test_vectorised_over_installs_matches_one_at_a_time():
+    rng = np.random.default_rng(0)
+    n = 150  # more than one chunk
+    sites = (rng.uniform(50, 58, n), rng.uniform(-5, 1, n), rng.uniform(0, 50, n), rng.uniform(-180, 180, n))
+    profiles = pv_model.generation_per_kwp(*sites)
+    for i in (0, 77, n - 1):
+        single = pv_model.generation_per_kwp(*[[values[i]] for values in sites])
+        np.testing.assert_allclose(profiles[i], single[0])
+
+
+def test_measured_weather_round_trips_through_clearness_index():
+    weather = pv_model.Weather.climatology()
+    sun = weather.sun_path
+    horizontal = pv_model.incidence_coefficients(np.array([52.5]), np.array([-1.5]), np.zeros(1), np.zeros(1))
+    sin_elevation = np.maximum((horizontal @ sun.basis)[0], 0)
+    ghi = weather.clearness_index * sun.extraterrestrial_w_per_m2 * sin_elevation
+    measured = pv_model.Weather.from_measurements(index=weather.index, ghi=ghi, dhi=ghi * weather.diffuse_fraction,
+                                                  air_temperature_c=weather.air_temperature_c,
+                                                  latitude=52.5, longitude=-1.5)
+    sun_up = sin_elevation > 0.05
+    np.testing.assert_allclose(measured.clearness_index[sun_up], weather.clearness_index[sun_up])
+
+
+def test_solar_falls_back_to_local_model_when_pvgis_unavailable(monkeypatch):
+    def unavailable(*args):
+        raise requests.ConnectionError("PVGIS down")
+    monkeypatch.setattr(solar, 'get_hourly_generation_per_kwp_from_eu_api', unavailable)
+    solar_install = solar.Solar(orientation=ORIENTATION_OPTIONS['South'],
+                                polygons=[Polygon(_points=[[0.13, 52.2]] * 4)], pitch=30)
+    solar_install.number_of_panels = 10
+
+    expected = pv_model.generation_per_kwp([52.2], [0.13], [30], [0])[0] * solar_install.capacity_kwp
+    np.testing.assert_allclose(solar_install.generation.exported.hourly_profile_kwh.to_numpy(), expected)
+    # the weather file isn't shipped, so this is flagged for the Results page to warn about
+    assert solar_install.generation_uses_synthetic_weather == pv_model.get_default_weather().synthetic
+    assert pv_model.Weather.climatology().synthetic
+
+    solar_install.number_of_panels = 0
+    assert not solar_install.generation_uses_synthetic_weather
+
+
+def refused_with(status_code: int):
+    response = requests.Response()
+    response.status_code = status_code
+
+    def refused(*args):
+        raise requests.ConnectionError(f"PVGIS returned {status_code}", response=response)
+    return refused
+
+
+def test_only_an_unavailable_pvgis_falls_back_and_is_counted(monkeypatch):
+    instrumentation = solar.instrumentation  # src code imports it as a top level module
+    instrumentation.enable()
+    recorder = instrumentation.start_rerun('fallback')
+    try:
+        monkeypatch.setattr(solar, 'get_hourly_generation_per_kwp_from_eu_api', refused_with(503))
+        fallback_weather = []
+        fallback = solar.get_hourly_generation_per_kwp(52.2, 0.13, 30, 0, fallback_weather=fallback_weather)
+        np.testing.assert_allclose(fallback, pv_model.generation_per_kwp([52.2], [0.13], [30], [0])[0])
+        assert [weather is solar.pv_model.get_default_weather() for weather in fallback_weather] == [True]
+        assert recorder.counters == {'pvgis.fallback': 1}
+
+        monkeypatch.setattr(solar, 'get_hourly_generation_per_kwp_from_eu_api', refused_with(400))
+        with pytest.raises(requests.ConnectionError):
+            solar.get_hourly_generation_per_kwp(52.2, 0.13, 30, 0)
+        assert recorder.counters == {'pvgis.fallback': 1}
+    finally:
+        instrumentation.finish_rerun()
+        instrumentation.disable()
@@ -0,0 +1,108 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+import pytest
+import requests
+
+from .context import src
+from src import pvgis
+
+RESPONSE = {'outputs': {'hourly': [{'P': 1500.0}, {'P': 0.0}]}}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # so connections can be kept alive
+
+    def do_GET(self):
+        server = self.server
+        status = server.statuses.pop(0) if server.statuses else 200
+        server.requests.append((self.client_address, self.path))
+        body = json.dumps(RESPONSE if status == 200 else {'message': 'busy'}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.statuses = []
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_client(server, **kwargs) -> pvgis.PVGISClient:
+    sleeps = []
+    client = pvgis.PVGISClient(api_url=f'http://127.0.0.1:{server.server_port}/api/v5_2/seriescalc',
+                               rate_limiter=pvgis.TokenBucket(rate_per_second=1000), sleep=sleeps.append, **kwargs)
+    client.sleeps = sleeps
+    return client
+
+
+def test_client_retries_busy_responses_then_succeeds(stub_server):
+    stub_server.statuses = [429, 503]
+    client = make_client(stub_server)
+    response_json = client.get_json({'lat': 52.2, 'lon': 0.13})
+
+    assert response_json == RESPONSE
+    assert list(pvgis.hourly_power_kw(response_json)) == [1.5, 0.0]
+    assert len(stub_server.requests) == 3
+    assert 'lat=52.2' in stub_server.requests[0][1]
+    assert len({client_address for client_address, _ in stub_server.requests}) == 1  # one kept-alive connection
+    assert len(client.sleeps) == 2
+    assert 0 <= client.sleeps[0] <= client.backoff_seconds and 0 <= client.sleeps[1] <= 2 * client.backoff_seconds
+    summary = client.metrics.summary()
+    assert (summary['requests'], summary['retries'], summary['failures']) == (3, 2, 0)
+    assert summary['statuses'] == {200: 1, 429: 1, 503: 1}
+    assert summary['latency_max_seconds'] >= summary['latency_p50_seconds'] > 0
+
+
+def test_client_gives_up_after_max_retries(stub_server):
+    stub_server.statuses = [500] * 10
+    client = make_client(stub_server, max_retries=2)
+    with pytest.raises(requests.ConnectionError):
+        client.get_json({})
+    assert len(stub_server.requests) == 3
+    assert client.metrics.summary()['failures'] == 1
+
+
+def test_client_does_not_retry_bad_requests(stub_server):
+    stub_server.statuses = [400]
+    client = make_client(stub_server)
+    with pytest.raises(requests.ConnectionError, match='400.*busy'):  # PVGIS's explanation is kept
+        client.get_json({})
+    assert len(stub_server.requests) == 1
+    assert client.metrics.summary()['statuses'] == {400: 1}
+    assert client.sleeps == []
+
+
+def test_token_bucket_spaces_out_bursts():
+    now = [0.0]
+    waits = []
+    bucket = pvgis.TokenBucket(rate_per_second=10, burst=2, clock=lambda: now[0], sleep=waits.append)
+    assert [bucket.acquire() for _ in range(4)] == pytest.approx([0, 0, 0.1, 0.2])
+    now[0] = 1.0  # refills up to the burst size only
+    assert [bucket.acquire() for _ in range(3)] == pytest.approx([0, 0, 0.1])
+    assert waits == pytest.approx([0.1, 0.2, 0.1])
+
+
+def test_hourly_power_per_year_drops_29th_february():
+    times = pd.date_range(start="2012-01-01 00:10", end="2013-12-31 23:10", freq="1H")
+    response_json = {'outputs': {'hourly': [{'time': time.strftime('%Y%m%d:%H%M'), 'P': float(time.month)}
+                                            for time in times]}}
+    per_year = pvgis.hourly_power_kw_per_year(response_json)
+    assert per_year.shape == (2, 8760)
+    assert per_year.dtype == np.float32
+    np.testing.assert_array_equal(per_year[0], per_year[1])
@@ -0,0 +1,107 @@
+import asyncio
+import contextlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pytest
+
+from .context import src
+from src import pvgis, pvgis_bulk, pvgis_cache, pvgis_tiles
+from src.constants import ORIENTATION_OPTIONS
+from roof import Polygon
+
+FAILING_LATITUDE = 51.0
+
+
+class FakePVGISHandler(BaseHTTPRequestHandler):
+    """ Flat output of latitude W per kWp, so results show which request they came from"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        params = {name: float(values[0]) for name, values in parse_qs(urlparse(self.path).query).items()
+                  if name in ('lat', 'lon', 'peakpower')}
+        self.server.requests.append(params)
+        if params['lat'] == FAILING_LATITUDE:
+            status, body = 400, {'message': 'location over the sea'}
+        else:
+            status, body = 200, {'outputs': {'hourly': [{'P': params['lat'] * params['peakpower']}] * 8760}}
+        body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_pvgis(monkeypatch, tmp_path):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakePVGISHandler)
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv(pvgis.API_URL_ENVIRONMENT_VARIABLE, f'http://127.0.0.1:{server.server_port}/seriescalc')
+    monkeypatch.setenv(pvgis_cache.PATH_ENVIRONMENT_VARIABLE, str(tmp_path / 'cache.sqlite'))
+    # pvgis_bulk.solar is the module the fetcher calls, which may not be the same object as src.solar
+    pvgis_bulk.solar.get_hourly_generation_per_kwp_from_eu_api.cache_clear()
+    yield server
+    pvgis_bulk.solar.get_hourly_generation_per_kwp_from_eu_api.cache_clear()
+    server.shutdown()
+    server.server_close()
+
+
+def test_bulk_fetch_dedupes_and_reports_failures_per_item(fake_pvgis):
+    sites = [(52.2, 0.13, 30, 0), (52.3, 0.13, 30, 0), (52.2, 0.13, 30.0, 0), (FAILING_LATITUDE, 0.13, 30, 0)]
+    results = pvgis_bulk.fetch_generation_all(sites, max_concurrency=4)
+
+    assert len(fake_pvgis.requests) == 3  # the repeated site was only requested once
+    assert [result.index for result in results] == [0, 1, 2, 3]
+    np.testing.assert_allclose(results[0].profile_kw, 52.2 / 1000)
+    np.testing.assert_allclose(results[1].profile_kw, 52.3 / 1000)
+    assert results[2].profile_kw is results[0].profile_kw
+    assert all(result.ok for result in results[:3])
+    assert not results[3].ok and results[3].profile_kw is None
+
+
+def test_stopping_after_the_first_result_cancels_the_rest(fake_pvgis):
+    sites = [(52.0 + i / 100, 0.13, 30, 0) for i in range(20)]
+
+    async def first_only():
+        async with contextlib.aclosing(pvgis_bulk.fetch_generation(sites, max_concurrency=1)) as results:
+            async for result in results:
+                break
+        return result, asyncio.all_tasks() - {asyncio.current_task()}
+    first, still_running = asyncio.run(first_only())
+
+    assert first.ok
+    assert not still_running
+    assert len(fake_pvgis.requests) < len(sites)
+
+
+def test_bulk_fetch_of_installs_matches_fetching_one_at_a_time(fake_pvgis):
+    installs = []
+    for latitude in (52.19, 52.1937, 52.2011):
+        install = pvgis_bulk.solar.Solar(orientation=ORIENTATION_OPTIONS['South'],
+                                         polygons=[Polygon(_points=[[0.1322, latitude]] * 4)], pitch=30)
+        install.number_of_panels = 10
+        installs.append(install)
+    installs[1].tile_grid = pvgis_tiles.TileGrid(size_degrees=0.01, tolerance_degrees=0)  # blend of 4 nodes
+    installs[2].tile_grid = pvgis_tiles.DEFAULT_GRID
+
+    async def stream():
+        return [result async for result in pvgis_bulk.fetch_generation(installs, tile_grid=None)]
+    results = asyncio.run(stream())
+
+    assert sorted(result.index for result in results) == [0, 1, 2]
+    for result in results:
+        assert result.ok
+        np.testing.assert_allclose(result.profile_kw, installs[result.index].get_hourly_radiation_from_eu_api())
+    assert len(fake_pvgis.requests) == 1 + 4  # the third install snaps to a node the second is blended from
+
+    # installs without a grid of their own are tiled in bulk by default
+    [tiled] = pvgis_bulk.fetch_generation_all(installs[:1])
+    installs[0].tile_grid = pvgis_tiles.DEFAULT_GRID
+    np.testing.assert_allclose(tiled.profile_kw, installs[0].get_hourly_radiation_from_eu_api())
@@ -0,0 +1,93 @@
+import sqlite3
+
+import numpy as np
+import pytest
+import requests
+
+from .context import src
+from src import pvgis_cache, solar
+from src.constants import ORIENTATION_OPTIONS
+from roof import Polygon
+
+PARAMS = {'lat': 52.19524, 'lon': 0.132377, 'angle': 30, 'aspect': 45, 'peakpower': 4.0, 'loss': 14,
+          'startyear': 2013, 'endyear': 2013}
+
+
+def test_equivalent_requests_share_a_key():
+    noisy_params = dict(PARAMS, angle=30.0, peakpower=10 * 0.4, lat=52.1952400000001)
+    assert pvgis_cache.make_key(noisy_params) == pvgis_cache.make_key(PARAMS)
+    assert pvgis_cache.make_key(dict(PARAMS, aspect=-45)) != pvgis_cache.make_key(PARAMS)
+
+
+def test_cache_persists_across_instances_and_evicts_least_recently_used(tmp_path):
+    profile = np.arange(8760, dtype=np.float64)
+    cache = pvgis_cache.PVGISCache(tmp_path / 'cache.sqlite', max_bytes=2 * profile.nbytes)
+    assert cache.get(PARAMS) is None
+    cache.put(PARAMS, profile)
+
+    restarted = pvgis_cache.PVGISCache(tmp_path / 'cache.sqlite', max_bytes=2 * profile.nbytes)
+    np.testing.assert_array_equal(restarted.get(PARAMS), profile)
+
+    restarted.put(dict(PARAMS, aspect=0), profile)
+    restarted.get(PARAMS)  # now more recently used than aspect=0
+    restarted.put(dict(PARAMS, aspect=90), profile)
+    assert restarted.get(dict(PARAMS, aspect=0)) is None
+    assert restarted.get(PARAMS) is not None
+
+    stats = restarted.stats()
+    assert (stats.hits, stats.misses, stats.writes, stats.evictions) == (3, 1, 2, 1)
+    assert stats.entries == 2
+    assert stats.size_bytes == 2 * profile.nbytes
+
+
+def test_every_connection_is_closed(tmp_path, monkeypatch):
+    connections = []
+    connect = pvgis_cache.PVGISCache._connect
+
+    def recording_connect(cache):
+        connections.append(connect(cache))
+        return connections[-1]
+    monkeypatch.setattr(pvgis_cache.PVGISCache, '_connect', recording_connect)
+
+    cache = pvgis_cache.PVGISCache(tmp_path / 'cache.sqlite')
+    cache.put(PARAMS, np.zeros(8760))
+    cache.get(PARAMS)
+    cache.stats()
+    assert len(connections) == 4
+    for connection in connections:
+        with pytest.raises(sqlite3.ProgrammingError):  # raised for a closed connection
+            connection.execute("SELECT 1")
+
+
+class FakeResponse:
+    status_code = 200
+
+    def json(self):
+        return {'outputs': {'hourly': [{'P': 500.0}] * 8760}}
+
+
+def test_solar_generation_served_from_disk_cache_after_restart(tmp_path, monkeypatch):
+    monkeypatch.setenv(pvgis_cache.PATH_ENVIRONMENT_VARIABLE, str(tmp_path / 'cache.sqlite'))
+    solar_install = solar.Solar(orientation=ORIENTATION_OPTIONS['South'],
+                                polygons=[Polygon.make_zero_area_instance()], pitch=30)
+    solar_install.number_of_panels = 10
+
+    monkeypatch.setattr(requests.Session, 'get', lambda *args, **kwargs: FakeResponse())
+    solar.get_hourly_generation_per_kwp_from_eu_api.cache_clear()
+    assert solar_install.get_hourly_radiation_from_eu_api().sum() == 0.5 * 8760 * solar_install.capacity_kwp
+
+    def fail(*args, **kwargs):
+        raise AssertionError("should be served from the disk cache")
+    monkeypatch.setattr(requests.Session, 'get', fail)
+    solar.get_hourly_generation_per_kwp_from_eu_api.cache_clear()  # as if the process had restarted
+    assert solar_install.get_hourly_radiation_from_eu_api().sum() == 0.5 * 8760 * solar_install.capacity_kwp
+
+
+def test_cache_keeps_float32_ensembles_compact(tmp_path):
+    ensemble = np.linspace(0, 1, 3 * 8760, dtype=np.float32).reshape(3, 8760)
+    cache = pvgis_cache.PVGISCache(tmp_path / 'cache.sqlite')
+    cache.put(PARAMS, ensemble)
+    restored = cache.get(PARAMS)
+    assert restored.dtype == np.float32
+    np.testing.assert_array_equal(restored.reshape(3, 8760), ensemble)
+    assert cache.stats().size_bytes == ensemble.nbytes
@@ -0,0 +1,65 @@
+import time
+
+import numpy as np
+import pytest
+import requests
+
+from .context import src
+from src import pvgis, pvgis_stub
+
+PARAMS = {'lat': 52.2, 'lon': 0.13, 'startyear': 2013, 'endyear': 2013, 'pvcalculation': 1, 'peakpower': 1,
+          'mountingplace': 'building', 'loss': 14, 'angle': 30, 'aspect': 0, 'outputformat': 'json'}
+
+
+def make_client(url: str) -> pvgis.PVGISClient:
+    return pvgis.PVGISClient(api_url=url, rate_limiter=pvgis.TokenBucket(rate_per_second=1000), max_retries=0)
+
+
+def test_synthesized_output_is_plausible_and_repeatable():
+    server = pvgis_stub.PVGISStubServer().start()
+    try:
+        client = make_client(server.url)
+        south_kw = pvgis.hourly_power_kw(client.get_json(PARAMS))
+        east_kw = pvgis.hourly_power_kw(client.get_json(dict(PARAMS, aspect=-90)))
+        double_kw = pvgis.hourly_power_kw(client.get_json(dict(PARAMS, peakpower=2)))
+    finally:
+        server.stop()
+    assert len(south_kw) == 8760
+    assert 700 < south_kw.sum() < 1100  # kWh per kWp, typical for the south of the UK
+    assert east_kw.sum() < south_kw.sum()
+    assert south_kw[:6].sum() == 0  # dark in the early hours of 1st January
+    np.testing.assert_allclose(double_kw, 2 * south_kw, atol=1e-5)
+    np.testing.assert_array_equal(pvgis.hourly_power_kw({'outputs': {'hourly': pvgis_stub.synthesize_hourly(
+        pvgis_stub.parse_params('lat=52.2&lon=0.13&angle=30&aspect=0&peakpower=1&loss=14'))}}), south_kw)
+
+
+def test_record_then_replay(tmp_path):
+    upstream = pvgis_stub.PVGISStubServer().start()
+    recorder = pvgis_stub.PVGISStubServer(mode='record', recordings_dir=tmp_path, upstream_url=upstream.url).start()
+    replayer = pvgis_stub.PVGISStubServer(mode='replay', recordings_dir=tmp_path).start()
+    try:
+        recorded = make_client(recorder.url).get_json(PARAMS)
+        assert upstream.request_count == 1
+        assert len(list(tmp_path.glob('*.json'))) == 1
+
+        replayed = make_client(replayer.url).get_json(dict(PARAMS, angle=30.0))  # same request, spelt differently
+        assert replayed == recorded
+        assert upstream.request_count == 1
+        with pytest.raises(requests.ConnectionError):
+            make_client(replayer.url).get_json(dict(PARAMS, aspect=90))  # never recorded
+    finally:
+        for server in (upstream, recorder, replayer):
+            server.stop()
+
+
+def test_latency_injection():
+    server = pvgis_stub.PVGISStubServer(latency_seconds=0.2, latency_jitter_seconds=0.05).start()
+    try:
+        client = make_client(server.url)
+        start = time.perf_counter()
+        client.get_json(dict(PARAMS, pvcalculation=0, startyear=2013, endyear=2013))
+        elapsed = time.perf_counter() - start
+    finally:
+        server.stop()
+    assert elapsed >= 0.2
+    assert client.metrics.summary()['latency_max_seconds'] >= 0.2
@@ -0,0 +1,45 @@
+import numpy as np
+
+from .context import src
+from src import pvgis_tiles
+
+
+def make_fetch(calls: list):
+    """ Made up profiles that vary smoothly with location, recording which nodes were requested"""
+    def fetch(latitude, longitude, pitch, azimuth_degrees):
+        calls.append((latitude, longitude, pitch, azimuth_degrees))
+        return np.full(8760, latitude + 10 * longitude)
+    return fetch
+
+
+def test_sites_near_a_node_share_its_profile():
+    grid = pvgis_tiles.TileGrid(size_degrees=0.01, tolerance_degrees=0.002)
+    calls = []
+    for latitude, longitude in [(52.19, 0.13), (52.1912, 0.1288), (52.1899, 0.13)]:
+        profile = grid.profile_per_kwp(latitude, longitude, pitch=30, azimuth_degrees=0, fetch=make_fetch(calls))
+        np.testing.assert_allclose(profile, 52.19 + 10 * 0.13)
+    assert set(calls) == {(52.19, 0.13, 30, 0)}
+
+
+def test_sites_between_nodes_are_blended_bilinearly():
+    grid = pvgis_tiles.TileGrid(size_degrees=0.01, tolerance_degrees=0.001)
+    calls = []
+    profile = grid.profile_per_kwp(52.1925, 0.1375, pitch=30, azimuth_degrees=0, fetch=make_fetch(calls))
+    np.testing.assert_allclose(profile, 52.1925 + 10 * 0.1375)  # exact for a profile linear in location
+    assert sorted(calls) == [(52.19, 0.13, 30, 0), (52.19, 0.14, 30, 0), (52.2, 0.13, 30, 0), (52.2, 0.14, 30, 0)]
+
+    weights = grid.weights(52.1925, 0.1375)
+    np.testing.assert_allclose(sum(weight for _, weight in weights), 1)
+    assert len(grid.weights(52.19, 0.1375)) == 2  # on a line of nodes only needs the two either side
+
+
+def test_profiles_for_sites_dedupes_requests():
+    grid = pvgis_tiles.TileGrid(size_degrees=0.01, tolerance_degrees=0.005)  # always snap to nearest
+    calls = []
+    latitudes = [52.1901, 52.1902, 52.2101, 52.1901]
+    longitudes = [0.1301, 0.1299, 0.1301, 0.1301]
+    profiles, site_index = grid.profiles_for_sites(latitudes, longitudes, pitches=[30, 30, 30, 45],
+                                                   azimuths_degrees=[0, 0, 0, 0], fetch=make_fetch(calls))
+    assert profiles.shape == (3, 8760)
+    assert list(site_index) == [0, 0, 1, 2]
+    assert len(calls) == 3
@@ -1,5 +1,7 @@
 import math
 
+import numpy as np
+
 from .context import src
 from src import roof
 
@@ -35,4 +37,30 @@ def test_make_zero_area_instance():
     no_area = roof.Polygon.make_zero_area_instance()
     assert no_area.area == 0
     assert no_area.average_width == 0
-    assert no_area.average_plan_height == 0
\ No newline at end of file
+    assert no_area.average_plan_height == 0
+
+
+def test_stacked_polygons_match_one_at_a_time():
+    rng = np.random.default_rng(0)
+    corners = rng.normal(0, 3e-4, size=(50, 4, 2)) + [[[-0.1, 51.5]]]
+    stacked = np.concatenate([corners, corners[:, :1]], axis=1)  # close each shape
+    polygons = roof.Polygon(stacked)
+    assert polygons.is_batch
+    assert polygons.area.shape == polygons.average_width.shape == (50,)
+    assert polygons.side_lengths.shape == (50, 4)
+    for i in (0, 17, 49):
+        polygon = roof.Polygon(stacked[i].tolist())
+        assert polygons.area[i] == polygon.area
+        assert list(polygons.side_lengths[i]) == polygon.side_lengths
+        assert polygons.average_plan_height[i] == polygon.average_plan_height
+        assert polygons.average_width[i] == polygon.average_width
+
+
+def test_polygon_projects_points_once_and_compares_by_value():
+    points = [[-0.106671, 51.453278], [-0.106848, 51.453054], [-0.106194, 51.452852], [-0.106014, 51.453074],
+              [-0.106671, 51.453278]]
+    polygon = roof.Polygon(points)
+    assert polygon.metres is polygon.metres
+    assert polygon.dimensions == [tuple(point) for point in polygon.metres]
+    assert polygon == roof.Polygon(np.array(points))
+    assert polygon != roof.Polygon.make_zero_area_instance()
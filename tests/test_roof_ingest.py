@@ -0,0 +1,81 @@
+import io
+import json
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from .context import src
+from src import roof_ingest, solar
+from src.constants import Orientation
+from src.roof import Polygon
+
+RECTANGLE = [[-0.106671, 51.453278], [-0.106848, 51.453054], [-0.106194, 51.452852], [-0.106014, 51.453074],
+             [-0.106671, 51.453278]]
+L_SHAPE = [[0.132377, 52.19524], [0.13262, 52.19524], [0.13262, 52.19528], [0.13250, 52.19528], [0.13250, 52.19535],
+           [0.132377, 52.19535], [0.132377, 52.19524]]
+SMALL_RECTANGLE = [[0.1, 52.0], [0.10004, 52.0], [0.10004, 52.00003], [0.1, 52.00003], [0.1, 52.0]]
+
+
+def feature(feature_id, geometry, **properties):
+    return {'type': 'Feature', 'id': feature_id, 'properties': properties, 'geometry': geometry}
+
+
+FEATURES = [feature('rectangle', {'type': 'Polygon', 'coordinates': [RECTANGLE]}, pitch=30, azimuth_degrees=-45),
+            feature('l_shape', {'type': 'Polygon', 'coordinates': [L_SHAPE]}),
+            feature('two_parts', {'type': 'MultiPolygon', 'coordinates': [[RECTANGLE], [L_SHAPE]]}, pitch=40),
+            feature('point', {'type': 'Point', 'coordinates': [0.1, 52.0]})]
+
+
+def test_geojson_features_streamed_in_small_reads(monkeypatch):
+    monkeypatch.setattr(roof_ingest, 'READ_SIZE', 37)  # every feature is split across reads
+    text = json.dumps({'type': 'FeatureCollection', 'crs': {'type': 'name'}, 'features': FEATURES}, indent=1)
+    assert list(roof_ingest.iter_geojson_features(io.StringIO(text))) == FEATURES
+    assert list(roof_ingest.iter_geojson_features(io.StringIO('{"type": "FeatureCollection", "features": []}'))) == []
+
+
+def test_results_match_building_solar_installs_one_by_one():
+    footprints = [roof_ingest.footprint_from_feature(item, index=i) for i, item in enumerate(FEATURES)]
+    results = roof_ingest.assess_chunk(footprints).set_index('id')
+
+    for footprint in footprints[:3]:
+        solar_install = solar.Solar(orientation=Orientation(azimuth_degrees=footprint.azimuth_degrees, name=''),
+                                    polygons=[Polygon(ring.tolist()) for ring in footprint.rings],
+                                    pitch=footprint.pitch)
+        row = results.loc[footprint.id]
+        assert row['number_of_panels'] == solar_install.number_of_panels > 0
+        np.testing.assert_allclose(row['plan_area_m2'], solar_install.roof_plan_area, atol=0.01)
+        np.testing.assert_allclose(row['roof_area_m2'], solar_install.roof_area, atol=0.01)
+        np.testing.assert_allclose(row['capacity_kwp'], solar_install.capacity_kwp, rtol=1e-6)
+    assert results.loc['point'].tolist() == [0, 0, 0, 0]
+
+
+def test_vectorised_rectangle_rule_matches_solar():
+    rng = np.random.default_rng(0)
+    widths, plan_heights = rng.uniform(0, 15, 500), rng.uniform(0, 8, 500)
+    solar_install = solar.Solar.create_zero_area_instance()
+    # the rule only needs these two measurements of the rectangle
+    expected = [solar_install.max_number_of_panels_in_a_rectangle(SimpleNamespace(average_width=width,
+                                                                                  average_plan_height=plan_height))
+                for width, plan_height in zip(widths, plan_heights)]
+    roof_heights = solar_install.convert_plan_value_to_value_along_pitch(plan_heights)
+    assert roof_ingest.panels_in_rectangles(widths, roof_heights).tolist() == expected
+
+
+def test_csv_of_wkt_written_to_results_table_in_chunks(tmp_path):
+    def wkt(ring):
+        return ', '.join(f'{lng} {lat}' for lng, lat in ring)
+    footprints_path = tmp_path / 'footprints.csv'
+    pd.DataFrame({'id': ['a', 'b', 'c'],
+                  'geometry': [f'POLYGON (({wkt(RECTANGLE)}))',
+                               f'MULTIPOLYGON ((({wkt(RECTANGLE)})), (({wkt(L_SHAPE)})))',
+                               json.dumps({'type': 'Polygon', 'coordinates': [SMALL_RECTANGLE]})],
+                  'pitch': [30, '', 30]}).to_csv(footprints_path, index=False)
+    results_path = tmp_path / 'results.csv'
+
+    assert roof_ingest.write_results(footprints_path, results_path, chunk_size=2) == 3
+    results = pd.read_csv(results_path)
+    assert results.columns.tolist() == ['id', 'plan_area_m2', 'roof_area_m2', 'number_of_panels', 'capacity_kwp']
+    assert results['id'].tolist() == ['a', 'b', 'c']
+    assert (results['roof_area_m2'] > results['plan_area_m2']).all()
+    assert results.loc[1, 'number_of_panels'] > results.loc[0, 'number_of_panels'] > 0
@@ -1,6 +1,7 @@
 import pandas as pd
 import plotly.express as px
 import numpy as np
+import pytest
 
 from .context import src
 import src.solar as solar
@@ -62,15 +63,22 @@ def test_get_hourly_radiation_from_eu_api_returns_expected_annual_sum():
 
     assert solar_install.peak_capacity_kw_out_per_kw_in_per_m2 == 10 * SolarConstants.KW_PEAK_PER_PANEL
     pv_power_kw = solar_install.get_hourly_radiation_from_eu_api()
-    ANNUAL_KWH = 3102.6047200000003
-    np.testing.assert_almost_equal(pv_power_kw.sum(), ANNUAL_KWH)
-    np.testing.assert_almost_equal(solar_install.generation.exported.annual_sum_kwh, ANNUAL_KWH)
-    np.testing.assert_almost_equal(solar_install.generation.overall.annual_sum_kwh, - ANNUAL_KWH)
+    assert pv_power_kw.sum() > 0
+    np.testing.assert_almost_equal(solar_install.generation.exported.annual_sum_kwh, pv_power_kw.sum())
+    np.testing.assert_almost_equal(solar_install.generation.overall.annual_sum_kwh, - pv_power_kw.sum())
     np.testing.assert_almost_equal(solar_install.generation.imported.annual_sum_kwh, 0)
+    assert not solar_install.generation_uses_synthetic_weather
 
     return pv_power_kw
 
 
+@pytest.mark.live
+def test_get_hourly_radiation_from_eu_api_returns_expected_annual_sum_from_live_api():
+    pv_power_kw = test_get_hourly_radiation_from_eu_api_returns_expected_annual_sum()
+    ANNUAL_KWH = 3102.6047200000003  # from a 4kWp request; now scaled from 1kWp, which PVGIS rounds separately
+    np.testing.assert_allclose(pv_power_kw.sum(), ANNUAL_KWH, rtol=1e-4)
+
+
 def test_generation_attributed_to_correct_fuel_and_consumption_stream():
     solar_install = solar.Solar(orientation=ORIENTATION_OPTIONS['South'],
                                 polygons=[TEST_POLYGONS[0]],
@@ -127,7 +135,8 @@ def test_solar_install_polygon_does_not_have_4_vertices():
     solar_install = solar.Solar(orientation=ORIENTATION_OPTIONS['Southwest'],
                                 polygons=[test_polygon],
                                 pitch=30)
-    assert solar_install.number_of_panels == solar_install.get_number_of_panels_from_polygon_area(test_polygon)
+    assert solar_install.number_of_panels == solar_install.pack_panels_onto_polygon(test_polygon).number_of_panels
+    assert 0 < solar_install.number_of_panels <= solar_install.roof_area / SolarConstants.PANEL_AREA
 
 
 def test_cache_on_get_hourly_radiation_from_eu_api():
@@ -136,37 +145,96 @@ def test_cache_on_get_hourly_radiation_from_eu_api():
                                 pitch=30)
 
     # check works when getting property
-    solar.Solar.get_hourly_radiation_from_eu_api.cache_clear()
+    solar.get_hourly_generation_per_kwp_from_eu_api.cache_clear()
     solar_install.generation.overall.annual_sum_kwh
     solar_install.generation.imported.annual_sum_kwh
     solar_install.generation.exported.days_in_year
     solar_install.generation.fuel.name
-    print(solar.Solar.get_hourly_radiation_from_eu_api.cache_info())
-    assert solar.Solar.get_hourly_radiation_from_eu_api.cache_info().hits == 3
-    assert solar.Solar.get_hourly_radiation_from_eu_api.cache_info().misses == 1
-    assert solar.Solar.get_hourly_radiation_from_eu_api.cache_info().currsize == 1
+    print(solar.get_hourly_generation_per_kwp_from_eu_api.cache_info())
+    # generation is kept on the install, so only the first access looks the profile up
+    assert solar.get_hourly_generation_per_kwp_from_eu_api.cache_info().hits == 0
+    assert solar.get_hourly_generation_per_kwp_from_eu_api.cache_info().misses == 1
+    assert solar.get_hourly_generation_per_kwp_from_eu_api.cache_info().currsize == 1
 
-    # check also works on copy - should hit
+    # check also works on copy - reuses the generation already built
     solar_install_two = solar_install
     solar_install_two.generation.overall.annual_sum_kwh
     assert hash(solar_install) == hash(solar_install_two)
-    print(solar.Solar.get_hourly_radiation_from_eu_api.cache_info())
-    assert solar.Solar.get_hourly_radiation_from_eu_api.cache_info().hits == 4
-    assert solar.Solar.get_hourly_radiation_from_eu_api.cache_info().misses == 1
-    assert solar.Solar.get_hourly_radiation_from_eu_api.cache_info().currsize == 1
-
-    # Change number of panels - should miss
+    print(solar.get_hourly_generation_per_kwp_from_eu_api.cache_info())
+    assert solar.get_hourly_generation_per_kwp_from_eu_api.cache_info().hits == 0
+    assert solar.get_hourly_generation_per_kwp_from_eu_api.cache_info().misses == 1
+    assert solar.get_hourly_generation_per_kwp_from_eu_api.cache_info().currsize == 1
+
+    # Change number of panels - should hit, as generation is fetched per kWp and scaled
+    annual_kwh = solar_install_two.generation.overall.annual_sum_kwh
+    number_of_panels = solar_install_two.number_of_panels
     solar_install_two.number_of_panels = 1
-    solar_install_two.generation.overall.annual_sum_kwh
-    print(solar.Solar.get_hourly_radiation_from_eu_api.cache_info())
-    assert solar.Solar.get_hourly_radiation_from_eu_api.cache_info().hits == 4
-    assert solar.Solar.get_hourly_radiation_from_eu_api.cache_info().misses == 2
-    assert solar.Solar.get_hourly_radiation_from_eu_api.cache_info().currsize == 2
+    np.testing.assert_allclose(solar_install_two.generation.overall.annual_sum_kwh, annual_kwh / number_of_panels)
+    print(solar.get_hourly_generation_per_kwp_from_eu_api.cache_info())
+    assert solar.get_hourly_generation_per_kwp_from_eu_api.cache_info().hits == 1
+    assert solar.get_hourly_generation_per_kwp_from_eu_api.cache_info().misses == 1
+    assert solar.get_hourly_generation_per_kwp_from_eu_api.cache_info().currsize == 1
 
     # Change orientation - should miss
     solar_install.orientation = ORIENTATION_OPTIONS['South']
     solar_install.generation.overall.annual_sum_kwh
-    print(solar.Solar.get_hourly_radiation_from_eu_api.cache_info())
-    assert solar.Solar.get_hourly_radiation_from_eu_api.cache_info().hits == 4
-    assert solar.Solar.get_hourly_radiation_from_eu_api.cache_info().misses == 3
-    assert solar.Solar.get_hourly_radiation_from_eu_api.cache_info().currsize == 3
+    print(solar.get_hourly_generation_per_kwp_from_eu_api.cache_info())
+    assert solar.get_hourly_generation_per_kwp_from_eu_api.cache_info().hits == 1
+    assert solar.get_hourly_generation_per_kwp_from_eu_api.cache_info().misses == 2
+    assert solar.get_hourly_generation_per_kwp_from_eu_api.cache_info().currsize == 2
+
+
+def test_ensemble_years_fetched_in_one_request(pvgis_api):
+    solar_install = solar.Solar(orientation=ORIENTATION_OPTIONS['South'],
+                                polygons=[TEST_POLYGONS[0]],
+                                pitch=30)
+    solar_install.ensemble_years = (2011, 2013)  # 2012 is a leap year
+    requests_before = pvgis_api.request_count if pvgis_api is not None else 0
+
+    per_year = solar_install.get_hourly_generation_per_kwp_per_year()
+    assert per_year.shape == (3, 8760)
+    assert per_year.dtype == np.float32
+    annual_kwh = solar_install.annual_generation_per_year_kwh
+    assert list(annual_kwh.index) == [2011, 2012, 2013]
+    assert annual_kwh.std() > 0
+    np.testing.assert_allclose(solar_install.generation.exported.annual_sum_kwh, annual_kwh.mean(), rtol=1e-6)
+
+    solar_install.ensemble_year = 2012
+    np.testing.assert_allclose(solar_install.generation.exported.annual_sum_kwh, annual_kwh[2012], rtol=1e-6)
+    if pvgis_api is not None:
+        assert pvgis_api.request_count == requests_before + 1
+
+
+def test_generation_reused_until_an_input_changes():
+    solar_install = solar.Solar(orientation=ORIENTATION_OPTIONS['South'],
+                                polygons=[TEST_POLYGONS[0]],
+                                pitch=30)
+    generation = solar_install.generation
+    built = solar.Solar.generations_built
+    assert solar_install.generation is generation
+    solar_install.upfront_cost = 5000  # doesn't change generation
+    solar_install.number_of_panels = solar_install.number_of_panels
+    assert solar_install.generation is generation
+    assert solar.Solar.generations_built == built
+
+    solar_install.number_of_panels += 2
+    more_panels = solar_install.generation
+    assert more_panels is not generation
+    assert more_panels.overall.annual_sum_kwh < generation.overall.annual_sum_kwh  # negative as generation
+    solar_install.kwp_per_panel = 0.5
+    solar_install.orientation = ORIENTATION_OPTIONS['East']
+    solar_install.pitch = 40
+    solar_install.polygons = [TEST_POLYGONS[1]]
+    assert solar_install.generation is not more_panels
+    assert solar.Solar.generations_built == built + 2
+
+
+def test_ensemble_year_copy_keeps_its_own_generation():
+    solar_install = solar.Solar(orientation=ORIENTATION_OPTIONS['South'],
+                                polygons=[TEST_POLYGONS[0]],
+                                pitch=30)
+    solar_install.ensemble_years = (2012, 2013)
+    mean_year = solar_install.generation
+    one_year = solar_install.for_ensemble_year(2012).generation
+    assert one_year is not mean_year
+    assert solar_install.generation is mean_year
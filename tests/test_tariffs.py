@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from .context import src
+from src import batch, building_model, constants, tariffs
+
+
+def make_house(heating_name: str = 'Heat pump') -> 'building_model.House':
+    envelope = building_model.BuildingEnvelope.from_building_type_constants(constants.BUILDING_TYPE_OPTIONS['Terrace'])
+    return building_model.House.set_up_from_heating_name(envelope=envelope, heating_name=heating_name)
+
+
+def test_flat_hourly_prices_cost_the_same_as_flat_tariff():
+    house = make_house()
+    flat_bill = house.annual_bill_per_fuel['electricity']
+    rate = constants.STANDARD_TARIFF
+    house.tariffs['electricity'].hourly_prices = tariffs.economy_7(day_p=rate.p_per_kwh_elec_import,
+                                                                   night_p=rate.p_per_kwh_elec_import,
+                                                                   export_p=rate.p_per_kwh_elec_export)
+    np.testing.assert_allclose(house.annual_bill_per_fuel['electricity'], flat_bill)
+
+
+def test_economy_7_costs_night_and_day_units_at_their_rates():
+    house = make_house()
+    house.tariffs['electricity'].hourly_prices = tariffs.economy_7(day_p=40.0, night_p=10.0)
+    imported = house.consumption_per_fuel['electricity'].imported.hourly_profile_kwh
+    at_night = imported.index.hour < 7
+    expected = (365 * constants.STANDARD_TARIFF.p_per_day_elec
+                + imported[at_night].sum() * 10.0 + imported[~at_night].sum() * 40.0) / 100
+    np.testing.assert_allclose(house.annual_bill_import_and_export_per_fuel['electricity']['imported'], expected)
+
+
+def test_prices_are_read_only_and_compared_by_identity():
+    prices = tariffs.flux()
+    assert prices.import_p_per_unit[17] == tariffs.FLUX_IMPORT_P_PER_KWH['peak']
+    assert prices.export_p_per_unit[3] == tariffs.FLUX_EXPORT_P_PER_KWH['off_peak']
+    with pytest.raises(ValueError):
+        prices.import_p_per_unit[0] = 0.0
+    first = building_model.Tariff(fuel=constants.ELECTRICITY, p_per_day=46.0, p_per_unit_import=34.0,
+                                  hourly_prices=prices)
+    second = building_model.Tariff(fuel=constants.ELECTRICITY, p_per_day=46.0, p_per_unit_import=34.0,
+                                   hourly_prices=tariffs.flux())
+    assert first == building_model.Tariff(fuel=constants.ELECTRICITY, p_per_day=46.0, p_per_unit_import=34.0,
+                                          hourly_prices=prices)
+    assert first != second
+
+
+def test_half_hourly_price_file_is_loaded_once_and_costs_hourly_consumption(tmp_path):
+    index = pd.date_range(start="2020-01-01", end="2021-01-01", freq="30min", inclusive="left")  # leap year
+    prices = pd.DataFrame({'import_p_per_kwh': np.where(index.minute == 0, 10.0, 20.0)}, index=index)
+    path = tmp_path / 'agile_2020.csv'
+    prices.to_csv(path)
+
+    loaded = tariffs.load_price_file(path)
+    assert loaded is tariffs.load_price_file(str(path))
+    assert loaded.name == 'agile_2020'
+    assert loaded.steps_per_hour == constants.HALF_HOURLY
+    assert len(loaded.import_p_per_unit) == 2 * 8760
+    np.testing.assert_array_equal(loaded.export_p_per_unit, 0.0)
+    hourly = loaded.at_resolution(constants.HOURLY)
+    assert hourly is loaded.at_resolution(constants.HOURLY)
+    np.testing.assert_array_equal(hourly.import_p_per_unit, 15.0)  # hourly demand is split evenly over the hour
+
+    house = make_house()
+    house.tariffs['electricity'].hourly_prices = loaded
+    imported_kwh = house.consumption_per_fuel['electricity'].imported.annual_sum_kwh
+    np.testing.assert_allclose(house.annual_bill_import_and_export_per_fuel['electricity']['imported'],
+                               (365 * constants.STANDARD_TARIFF.p_per_day_elec + 15.0 * imported_kwh) / 100)
+
+
+def test_batch_costs_many_houses_against_one_hourly_tariff():
+    prices = tariffs.flux()
+    houses = [make_house(heating_name) for heating_name in constants.DEFAULT_HEATING_CONSTANTS]
+    for house in houses:
+        house.tariffs['electricity'].hourly_prices = prices
+
+    results = batch.evaluate(batch.Scenarios.from_houses(houses), chunk_size=2)
+
+    for i, house in enumerate(houses):
+        np.testing.assert_allclose(results.annual_bill_electricity[i], house.annual_bill_per_fuel['electricity'])
+        np.testing.assert_allclose(results.total_annual_bill[i], house.total_annual_bill)
+
+    houses[0].tariffs['electricity'].hourly_prices = None
+    with pytest.raises(ValueError):
+        batch.Scenarios.from_houses(houses)